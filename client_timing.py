@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM Client Timing
+~~~~~~~~~~~~~~~~~~~~~~~~
+
+Client-side clock and overhead instrumentation for the performance tester.
+
+`clock()` is a monotonic high-resolution clock (perf_counter) anchored to
+the wall clock once at import, so timestamps never jump with NTP
+adjustments but can still be compared across worker processes and written
+to result files as epoch seconds.
+
+LoopLagMonitor measures how late the event loop wakes up compared with a
+fixed tick: any lag delays every timestamp taken by in-flight requests, so
+the accumulated lag between two points tells how much of a measured
+interval was spent waiting for the client itself.
+
+StreamWatchdog enforces per-phase deadlines on one streaming request
+(first token, inter-token stall, total) and cancels the request task when
+one expires. Chunks only record their arrival time; the single timer is
+re-armed lazily when it fires early, so the per-chunk cost stays at one
+loop.time() call.
+
+SamplingProfiler periodically samples the stack of the event loop thread
+and counts the stacks that run inside `process_single_request`, showing
+where the client spends its time (SDK parsing, tokenization, ...). The
+output is in the collapsed-stack format read by flame graph tools.
+
+License: Apache License 2.0
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+from latency_stats import LatencyHistogram
+
+# 单调时钟与墙上时钟的偏移，进程启动时确定一次
+_WALL_ANCHOR = time.time() - time.perf_counter()
+
+
+def clock() -> float:
+    """单调递增的高精度时间戳 (秒)，数值与time.time()相同量级，可跨进程比较"""
+    return _WALL_ANCHOR + time.perf_counter()
+
+
+class LoopLagMonitor:
+    """按固定间隔唤醒，统计事件循环的唤醒延迟 (毫秒)
+
+    total_lag为累计延迟，请求在两个时刻分别读取，差值即为期间客户端事件循环阻塞的时间
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.histogram: Optional[LatencyHistogram] = None
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            expected = clock() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, (clock() - expected) * 1000)
+            self.total_lag += lag
+            self.max_lag = max(self.max_lag, lag)
+            if self.histogram is not None:
+                self.histogram.record(lag)
+
+    def start(self, histogram: LatencyHistogram = None):
+        """在事件循环中开始监控，histogram用于记录每次唤醒的延迟"""
+        self.histogram = histogram
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+class StreamWatchdog:
+    """按阶段超时取消当前请求任务：首个chunk (ttft)、chunk间停顿 (stall) 及总时长 (total)，单位为秒
+
+    到期时expired记录超时的阶段并取消任务，请求在捕获CancelledError后据此区分超时与外部取消
+    """
+
+    def __init__(self, ttft: float = None, stall: float = None, total: float = None):
+        self.timeouts = {'ttft': ttft, 'stall': stall, 'total': total}
+        self.loop = asyncio.get_running_loop()
+        self.task = asyncio.current_task()
+        self.start = self.loop.time()
+        # 最近一个chunk的到达时刻，收到第一个chunk之前为None
+        self.last: Optional[float] = None
+        self.expired: Optional[str] = None
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._arm()
+
+    def _deadline(self) -> Optional[Tuple[float, str]]:
+        deadlines = []
+        if self.timeouts['total'] is not None:
+            deadlines.append((self.start + self.timeouts['total'], 'total'))
+        if self.last is None and self.timeouts['ttft'] is not None:
+            deadlines.append((self.start + self.timeouts['ttft'], 'ttft'))
+        if self.last is not None and self.timeouts['stall'] is not None:
+            deadlines.append((self.last + self.timeouts['stall'], 'stall'))
+        return min(deadlines) if deadlines else None
+
+    def _arm(self):
+        deadline = self._deadline()
+        self._handle = self.loop.call_at(deadline[0], self._check) if deadline else None
+
+    def _check(self):
+        deadline = self._deadline()
+        if deadline is None:
+            self._handle = None
+        elif self.loop.time() >= deadline[0]:
+            self._handle = None
+            self.expired = deadline[1]
+            self.task.cancel()
+        else:
+            # 期间收到了新的chunk，按新的截止时刻重新设置定时器
+            self._handle = self.loop.call_at(deadline[0], self._check)
+
+    def touch(self):
+        """收到一个chunk"""
+        self.last = self.loop.time()
+        if self._handle is None and self.expired is None:
+            # 只设置了stall超时时，收到第一个chunk后才开始计时
+            self._arm()
+
+    def timeout(self) -> float:
+        return self.timeouts[self.expired]
+
+    def stop(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+
+class SamplingProfiler:
+    """后台线程定期采样事件循环线程的调用栈，统计process_single_request内部的热点"""
+
+    def __init__(self, interval: float = 0.005, target: str = 'process_single_request'):
+        self.interval = interval
+        self.target = target
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._thread_id: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """在事件循环线程中调用，开始采样当前线程"""
+        self._thread_id = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            self.samples += 1
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            # 只保留目标函数及其调用的部分，其余采样 (空闲、调度等) 只计数
+            names = [entry.rsplit(':', 1)[1] for entry in stack]
+            if self.target in names:
+                self.stacks[';'.join(reversed(stack[:names.index(self.target) + 1]))] += 1
+
+    def summary(self) -> Dict:
+        in_target = sum(self.stacks.values())
+        return {
+            'samples': self.samples,
+            'in_request': in_target,
+            'in_request_ratio': in_target / self.samples if self.samples else 0.0,
+        }
+
+    def save(self, path: str):
+        """以折叠栈格式保存采样结果，每行为 "栈;帧 次数"，可直接用flamegraph.pl或speedscope查看"""
+        with open(path, 'w', encoding='utf-8') as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
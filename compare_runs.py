@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM Run Comparison
+~~~~~~~~~~~~~~~~~~~~~~~~
+
+Statistical regression check between stored test runs.
+
+The first result file is the baseline, every following file is compared
+against it. For each metric the relative change of its percentiles comes
+with a bootstrap confidence interval, and a Mann-Whitney U test tells
+whether the two distributions differ at all. A change is reported as a
+regression only when it is significant and the whole confidence interval
+lies beyond the threshold in the worse direction, so noise between runs
+does not fail the gate; the command exits with status 1 on regressions
+and can gate server upgrades in CI.
+
+Latency metrics use the per-request values of successful, non-warm-up
+requests (ITL is the per-request median ITL). Throughput metrics use the
+per-second rates of the steady-state window of each run.
+
+Everything is vectorized: result files are read in chunks, the bootstrap
+samples order statistics directly from a Beta distribution on the sorted
+sample (exact for percentiles, O(1) per resample), and the Mann-Whitney
+ranks are computed with a single sort.
+
+License: Apache License 2.0
+"""
+
+import argparse
+import math
+import os
+import sys
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from latency_stats import ThroughputTimeline
+from result_store import iter_result_chunks
+
+# 对比的指标：方向 (lower为越低越好) 及对比的分位数
+COMPARE_METRICS = {
+    'ttft': ('lower', (50, 90, 99)),
+    'tpot': ('lower', (50, 90, 99)),
+    'itl_p50': ('lower', (50, 90, 99)),
+    'latency': ('lower', (50, 90, 99)),
+    # 稳态区间内逐秒的吞吐率，低分位数反映吞吐量的下沿
+    'output_tps': ('higher', (10, 50)),
+    'rps': ('higher', (10, 50)),
+}
+THROUGHPUT_METRICS = ('output_tps', 'rps')
+
+
+def load_run(path: str, metrics: Sequence[str]) -> Dict[str, np.ndarray]:
+    """分块读取结果文件，返回成功且非预热请求的各指标样本及稳态区间的逐秒吞吐率"""
+    latency_metrics = [metric for metric in metrics if metric not in THROUGHPUT_METRICS]
+    columns = ['status', 'warmup', 'start_time', 'end_time', 'input_tokens', 'output_tokens',
+               'ttft', *[metric for metric in latency_metrics if metric != 'ttft']]
+    samples = {metric: [] for metric in latency_metrics}
+    timeline = ThroughputTimeline()
+    for chunk in iter_result_chunks(path, columns=columns):
+        if 'warmup' in chunk.columns:
+            # 非预热请求的warmup为NaN
+            chunk = chunk[chunk['warmup'].ne(True)]
+        successful = chunk[chunk['status'] == 'success']
+        for metric in latency_metrics:
+            if metric in successful.columns:
+                values = successful[metric].to_numpy(dtype=float)
+                samples[metric].append(values[~np.isnan(values)])
+        timeline.add_frame(chunk)
+
+    run = {metric: np.sort(np.concatenate(parts)) if parts else np.empty(0) for metric, parts in samples.items()}
+    if any(metric in THROUGHPUT_METRICS for metric in metrics):
+        rates = timeline.rates()
+        window = timeline.steady_window()
+        if window is not None:
+            rates = rates[(rates.index >= window[0]) & (rates.index < window[1])]
+        for metric in THROUGHPUT_METRICS:
+            if metric in metrics:
+                run[metric] = np.sort(rates[metric].to_numpy(dtype=float))
+    return run
+
+
+def order_statistic_index(n: int, q: float) -> int:
+    """q分位数对应的顺序统计量序号 (从1开始)，即inverted_cdf定义的分位数"""
+    return min(n, max(1, math.ceil(q / 100 * n)))
+
+
+def bootstrap_percentiles(sorted_values: np.ndarray, qs: Sequence[float], resamples: int,
+                          rng: np.random.Generator) -> np.ndarray:
+    """对已排序样本的各分位数做bootstrap，返回 (resamples, len(qs)) 的重采样分位数
+
+    有放回重采样n个点后，第m个顺序统计量等于原样本的第ceil(n * U)个，其中U为n个均匀分布
+    随机数的第m个顺序统计量，服从Beta(m, n - m + 1)；直接采样U即可得到精确的bootstrap分布，
+    不需要生成重采样样本
+    """
+    n = len(sorted_values)
+    result = np.empty((resamples, len(qs)))
+    for column, q in enumerate(qs):
+        m = order_statistic_index(n, q)
+        u = rng.beta(m, n - m + 1, size=resamples)
+        indices = np.clip(np.ceil(u * n).astype(np.int64), 1, n) - 1
+        result[:, column] = sorted_values[indices]
+    return result
+
+
+def mann_whitney(baseline: np.ndarray, candidate: np.ndarray) -> Tuple[float, float]:
+    """双侧Mann-Whitney U检验 (正态近似，含结值修正及连续性修正)
+
+    返回 (p值, P(candidate > baseline) + 0.5 * P(相等))
+    """
+    n1, n2 = len(candidate), len(baseline)
+    values = np.concatenate([candidate, baseline])
+    order = np.argsort(values, kind='mergesort')
+    ordered = values[order]
+    # 相同取值的样本取平均秩
+    new_group = np.empty(len(ordered), dtype=bool)
+    new_group[0] = True
+    np.not_equal(ordered[1:], ordered[:-1], out=new_group[1:])
+    groups = np.cumsum(new_group) - 1
+    counts = np.bincount(groups).astype(float)
+    average_ranks = np.cumsum(counts) - (counts - 1) / 2
+    ranks = np.empty(len(values))
+    ranks[order] = average_ranks[groups]
+
+    u = ranks[:n1].sum() - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    mean = n1 * n2 / 2
+    ties = (counts ** 3 - counts).sum()
+    variance = n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0, u / (n1 * n2)
+    z = (abs(u - mean) - 0.5) / math.sqrt(variance)
+    p_value = min(1.0, math.erfc(max(z, 0.0) / math.sqrt(2)))
+    return p_value, u / (n1 * n2)
+
+
+def compare(baseline: Dict[str, np.ndarray], candidate: Dict[str, np.ndarray], metrics: Sequence[str],
+            threshold: float = 5.0, confidence: float = 0.95, alpha: float = 0.05, resamples: int = 2000,
+            seed: int = None) -> List[Dict]:
+    """对比两次运行的各指标分位数
+
+    change为候选相对基线的变化 (%)，置信区间由两次运行分别bootstrap得到；
+    变化显著 (p < alpha) 且整个置信区间都在劣化方向上超过threshold (%) 时判定为回归
+    """
+    rng = np.random.default_rng(seed)
+    tail = (1 - confidence) / 2 * 100
+    rows = []
+    for metric in metrics:
+        direction, qs = COMPARE_METRICS[metric]
+        base, cand = baseline.get(metric), candidate.get(metric)
+        if base is None or cand is None or len(base) < 2 or len(cand) < 2:
+            print(f"Warning: {metric} 样本不足，跳过")
+            continue
+        p_value, superiority = mann_whitney(base, cand)
+        base_boot = bootstrap_percentiles(base, qs, resamples, rng)
+        cand_boot = bootstrap_percentiles(cand, qs, resamples, rng)
+        for column, q in enumerate(qs):
+            base_value = base[order_statistic_index(len(base), q) - 1]
+            cand_value = cand[order_statistic_index(len(cand), q) - 1]
+            if base_value == 0:
+                continue
+            # 吞吐率样本中可能有为0的时间桶，这些重采样的相对变化没有意义
+            base_samples = base_boot[:, column]
+            valid = base_samples > 0
+            if not valid.any():
+                continue
+            changes = (cand_boot[valid, column] / base_samples[valid] - 1) * 100
+            low, high = np.percentile(changes, [tail, 100 - tail])
+            change = (cand_value / base_value - 1) * 100
+            # 劣化方向上置信区间的下沿：越低越好的指标取下界，越高越好的指标取上界的相反数
+            worse = low if direction == 'lower' else -high
+            significant = p_value < alpha
+            rows.append({
+                'metric': metric,
+                'percentile': f"p{q:g}",
+                'baseline': base_value,
+                'candidate': cand_value,
+                'change_pct': change,
+                'ci_low_pct': low,
+                'ci_high_pct': high,
+                'p_value': p_value,
+                'prob_candidate_greater': superiority,
+                'baseline_samples': len(base),
+                'candidate_samples': len(cand),
+                'regression': bool(significant and worse > threshold),
+                'improvement': bool(significant and (-high if direction == 'lower' else low) > threshold),
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比多次测试运行的延迟和吞吐量，出现超过阈值的回归时以非零状态退出")
+    parser.add_argument('baseline', help="基线运行的逐请求结果文件 (JSONL或CSV)")
+    parser.add_argument('candidates', nargs='+', help="与基线对比的结果文件")
+    parser.add_argument('--metrics', default=','.join(COMPARE_METRICS),
+                        help=f"对比的指标，用逗号分隔 (可选: {', '.join(COMPARE_METRICS)})")
+    parser.add_argument('--threshold', type=float, default=5.0, help="判定为回归的劣化幅度 (%%)")
+    parser.add_argument('--confidence', type=float, default=0.95, help="bootstrap置信水平")
+    parser.add_argument('--alpha', type=float, default=0.05, help="Mann-Whitney检验的显著性水平")
+    parser.add_argument('--resamples', type=int, default=2000, help="bootstrap重采样次数")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--output', default='./output/run_comparison.csv', help="对比结果保存路径")
+    args = parser.parse_args()
+
+    metrics = [metric.strip() for metric in args.metrics.split(',') if metric.strip()]
+    unknown = [metric for metric in metrics if metric not in COMPARE_METRICS]
+    if unknown:
+        parser.error(f"不支持的指标: {', '.join(unknown)}")
+
+    baseline = load_run(args.baseline, metrics)
+    rows = []
+    for candidate_file in args.candidates:
+        candidate = load_run(candidate_file, metrics)
+        for row in compare(baseline, candidate, metrics, threshold=args.threshold, confidence=args.confidence,
+                           alpha=args.alpha, resamples=args.resamples, seed=args.seed):
+            rows.append({'run': candidate_file, **row})
+    if not rows:
+        print("没有可对比的指标")
+        sys.exit(2)
+
+    result = pd.DataFrame(rows)
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    result.to_csv(args.output, index=False)
+
+    print(f"基线: {args.baseline}")
+    columns = ['metric', 'percentile', 'baseline', 'candidate', 'change_pct', 'ci_low_pct', 'ci_high_pct',
+               'p_value', 'regression']
+    for candidate_file, group in result.groupby('run', sort=False):
+        print(f"\n候选: {candidate_file}")
+        with pd.option_context('display.max_rows', None, 'display.width', 200):
+            print(group[columns].round(4).to_string(index=False))
+    print(f"\n对比结果已保存至: {args.output}")
+
+    regressions = result[result['regression']]
+    if len(regressions):
+        print(f"\n检测到 {len(regressions)} 项超过 {args.threshold}% 的回归:")
+        for row in regressions.itertuples(index=False):
+            print(f"  {row.run}: {row.metric} {row.percentile} {row.change_pct:+.2f}% "
+                  f"(CI {row.ci_low_pct:+.2f}% ~ {row.ci_high_pct:+.2f}%, p={row.p_value:.2g})")
+        sys.exit(1)
+    print(f"\n未检测到超过 {args.threshold}% 的回归")
+
+
+if __name__ == "__main__":
+    main()
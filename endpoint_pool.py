@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM Endpoint Pool
+~~~~~~~~~~~~~~~~~~~~~~~~
+
+Client-side load balancing across several inference endpoints.
+
+Each endpoint is a (base_url, model) pair with a weight and its own
+transport, so one test can fan requests out to several replicas and/or
+several models. The pool picks an endpoint for every request with one of
+the routing policies below and tracks the number of outstanding requests
+per endpoint.
+
+Policies:
+    1. round_robin       - smooth weighted round-robin (as in nginx)
+    2. least_outstanding - the endpoint with the fewest outstanding requests
+                           per unit of weight
+    3. power_of_two      - sample two endpoints with probability proportional
+                           to weight and take the less loaded one
+
+Endpoints are configured in a JSON file holding a list of objects with
+`base_url`, `model` and optional `weight`, `api_key` and `name` fields.
+
+License: Apache License 2.0
+"""
+
+import json
+import random
+from typing import Dict, List
+from urllib.parse import urlparse
+
+from transports import create_transport
+
+ROUTING_POLICIES = ('round_robin', 'least_outstanding', 'power_of_two')
+
+
+class Endpoint:
+    """一个推理端点：base_url、模型、权重及独立的传输层"""
+
+    def __init__(self, base_url: str, model: str, weight: float = 1.0, api_key: str = None, name: str = None):
+        if weight <= 0:
+            raise ValueError(f"端点权重必须大于0: {base_url}")
+        self.base_url = base_url
+        self.model = model
+        self.weight = weight
+        self.api_key = api_key
+        # 结果文件和报告中使用的端点名称
+        self.name = name or (f"{model}@{urlparse(base_url).netloc}" if base_url else model)
+        self.transport = None
+        # 在途请求数
+        self.outstanding = 0
+        # 平滑加权轮询的当前权重
+        self.current_weight = 0.0
+
+    def load(self) -> float:
+        """按权重归一化的负载"""
+        return self.outstanding / self.weight
+
+
+def load_endpoints(path: str) -> List[Dict]:
+    """读取端点配置文件，返回端点参数列表"""
+    with open(path, encoding='utf-8') as file:
+        endpoints = json.load(file)
+    if not isinstance(endpoints, list) or not endpoints:
+        raise ValueError("端点配置必须是非空的列表")
+    for endpoint in endpoints:
+        if not endpoint.get('base_url') or not endpoint.get('model'):
+            raise ValueError(f"端点必须指定base_url和model: {endpoint}")
+    names = [Endpoint(**endpoint).name for endpoint in endpoints]
+    if len(set(names)) != len(names):
+        raise ValueError("端点名称重复，请为相同base_url和model的端点指定name")
+    return endpoints
+
+
+class EndpointPool:
+    """按路由策略在多个端点之间分配请求"""
+
+    def __init__(self,
+                 endpoints: List[Dict],
+                 policy: str = 'round_robin',
+                 transport: str = 'openai',
+                 api_key: str = None,
+                 http_options: Dict = None,
+                 seed: int = None,
+                 connect_timeout: float = None):
+        if policy not in ROUTING_POLICIES:
+            raise ValueError(f"不支持的路由策略: {policy}，可选: {', '.join(ROUTING_POLICIES)}")
+        if not endpoints:
+            raise ValueError("至少需要一个端点")
+        self.policy = policy
+        self.endpoints = [Endpoint(**endpoint) for endpoint in endpoints]
+        for endpoint in self.endpoints:
+            endpoint.transport = create_transport(transport, api_key=endpoint.api_key or api_key,
+                                                  base_url=endpoint.base_url, http_options=http_options,
+                                                  connect_timeout=connect_timeout)
+        self.transport_name = transport
+        self.total_weight = sum(endpoint.weight for endpoint in self.endpoints)
+        self.rng = random.Random(seed)
+        self._cum_weights = []
+        total = 0.0
+        for endpoint in self.endpoints:
+            total += endpoint.weight
+            self._cum_weights.append(total)
+        # least_outstanding在负载相同的端点之间轮流选择，避免总是落到第一个
+        self._next = 0
+
+    def __len__(self) -> int:
+        return len(self.endpoints)
+
+    def describe(self) -> str:
+        return f"{self.policy} over " + ", ".join(f"{endpoint.name} (w={endpoint.weight:g})"
+                                                  for endpoint in self.endpoints)
+
+    def _round_robin(self) -> Endpoint:
+        # 每次所有端点的当前权重加上各自权重，选出当前权重最大的端点并减去总权重，
+        # 各端点按权重比例被选中，且同一端点的请求在序列中尽量分散
+        best = None
+        for endpoint in self.endpoints:
+            endpoint.current_weight += endpoint.weight
+            if best is None or endpoint.current_weight > best.current_weight:
+                best = endpoint
+        best.current_weight -= self.total_weight
+        return best
+
+    def _least_outstanding(self) -> Endpoint:
+        count = len(self.endpoints)
+        best = None
+        for offset in range(count):
+            endpoint = self.endpoints[(self._next + offset) % count]
+            if best is None or endpoint.load() < best.load():
+                best = endpoint
+        self._next = (self._next + 1) % count
+        return best
+
+    def _power_of_two(self) -> Endpoint:
+        if len(self.endpoints) == 1:
+            return self.endpoints[0]
+        first, second = self.rng.choices(self.endpoints, cum_weights=self._cum_weights, k=2)
+        while second is first:
+            second = self.rng.choices(self.endpoints, cum_weights=self._cum_weights)[0]
+        return first if first.load() <= second.load() else second
+
+    def acquire(self) -> Endpoint:
+        """为一个请求选择端点并计入其在途请求数"""
+        if self.policy == 'round_robin':
+            endpoint = self._round_robin()
+        elif self.policy == 'least_outstanding':
+            endpoint = self._least_outstanding()
+        else:
+            endpoint = self._power_of_two()
+        endpoint.outstanding += 1
+        return endpoint
+
+    def release(self, endpoint: Endpoint):
+        endpoint.outstanding -= 1
+
+    async def close(self):
+        for endpoint in self.endpoints:
+            await endpoint.transport.close()
@@ -0,0 +1,491 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM Latency Statistics
+~~~~~~~~~~~~~~~~~~~~~~~~
+
+Streaming latency aggregation for the performance tester.
+
+LatencyHistogram is an HDR-style log-bucketed histogram: every sample is
+mapped to a bucket whose width is a fixed fraction of its value, so memory
+stays constant regardless of the number of samples while percentiles keep
+a bounded relative error. Histograms can be merged and serialized, which
+lets independent runs and worker processes be combined afterwards.
+Failed requests can be added as right-censored samples: their true value
+is unknown, so they rank above every observed sample and a percentile that
+falls on them is infinite.
+
+RunningStats and ResultSummary keep mean/std/min/max of per-request
+metrics incrementally, so result files never need to be loaded into memory
+at once.
+
+ThroughputTimeline buckets request start/end times into fixed-width time
+bins, from which the in-flight count and aggregate (system-wide) request,
+token and goodput throughput over time are derived, and detects the
+steady-state plateau of a run.
+
+License: Apache License 2.0
+"""
+
+import math
+from typing import TYPE_CHECKING, Dict, Iterable, List, Sequence
+
+import numpy as np
+
+# pandas只用于输出表格，在用到的函数内导入，负载进程无需加载
+if TYPE_CHECKING:
+    import pandas as pd
+
+DEFAULT_PERCENTILES = (50, 90, 99, 99.9)
+
+
+class LatencyHistogram:
+    """对数分桶的在线直方图，用于在不保存全部样本的情况下计算延迟分位数"""
+
+    def __init__(self, precision: float = 0.01, min_value: float = 0.001):
+        # precision为分位数的相对误差上限，min_value以下的样本归入第0个桶
+        self.precision = precision
+        self.min_value = min_value
+        self._log_base = math.log1p(precision)
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        # 删失样本数：未得到观测值的请求 (如失败、超时)，视为大于所有观测值
+        self.censored = 0
+
+    def _index(self, value: float) -> int:
+        if value <= self.min_value:
+            return 0
+        return int(math.log(value / self.min_value) / self._log_base) + 1
+
+    def _bucket_value(self, index: int) -> float:
+        """返回桶的代表值 (桶区间的几何中点)"""
+        if index == 0:
+            return self.min_value
+        return self.min_value * math.exp((index - 0.5) * self._log_base)
+
+    def record(self, value: float):
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def record_many(self, values: Iterable[float]):
+        values = np.asarray(values, dtype=float)
+        if values.size == 0:
+            return
+        clipped = np.maximum(values, self.min_value)
+        indices = np.floor(np.log(clipped / self.min_value) / self._log_base).astype(np.int64) + 1
+        indices[values <= self.min_value] = 0
+        for index, count in zip(*np.unique(indices, return_counts=True)):
+            index = int(index)
+            self.counts[index] = self.counts.get(index, 0) + int(count)
+        self.count += int(values.size)
+        self.total += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def record_censored(self, count: int = 1):
+        """记录没有观测值的样本 (如失败请求)，计算分位数时排在所有观测值之后"""
+        self.censored += count
+
+    def merge(self, other: 'LatencyHistogram'):
+        """合并另一个直方图 (两者的precision和min_value必须相同)"""
+        if other.precision != self.precision or other.min_value != self.min_value:
+            raise ValueError("只能合并分桶参数相同的直方图")
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.censored += other.censored
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else math.nan
+
+    def percentile(self, q: float) -> float:
+        """返回第q百分位数 (0-100)，落在删失样本上时为inf"""
+        if self.count + self.censored == 0:
+            return math.nan
+        rank = max(1, math.ceil(q / 100 * (self.count + self.censored)))
+        if rank > self.count:
+            return math.inf
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(max(self._bucket_value(index), self.min), self.max)
+        return self.max
+
+    def percentiles(self, qs: Sequence[float] = DEFAULT_PERCENTILES) -> Dict[str, float]:
+        return {f"p{q:g}": self.percentile(q) for q in qs}
+
+    def summary(self, qs: Sequence[float] = DEFAULT_PERCENTILES) -> Dict[str, float]:
+        return {
+            'count': self.count,
+            'censored': self.censored,
+            'mean': self.mean,
+            **self.percentiles(qs),
+            'max': self.max if self.count else math.nan,
+        }
+
+    def to_dict(self) -> Dict:
+        return {
+            'precision': self.precision,
+            'min_value': self.min_value,
+            'counts': {str(index): count for index, count in self.counts.items()},
+            'count': self.count,
+            'total': self.total,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+            'censored': self.censored,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'LatencyHistogram':
+        histogram = cls(precision=data['precision'], min_value=data['min_value'])
+        histogram.counts = {int(index): count for index, count in data['counts'].items()}
+        histogram.count = data['count']
+        histogram.total = data['total']
+        histogram.censored = data.get('censored', 0)
+        if histogram.count:
+            histogram.min = data['min']
+            histogram.max = data['max']
+        return histogram
+
+
+class RunningStats:
+    """增量计算均值、标准差、最小值和最大值 (Welford / Chan合并算法)"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def update_many(self, values: Iterable[float]):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+        other = RunningStats()
+        other.count = int(values.size)
+        other.mean = float(values.mean())
+        other.m2 = float(((values - other.mean) ** 2).sum())
+        other.min = float(values.min())
+        other.max = float(values.max())
+        self.merge(other)
+
+    def merge(self, other: 'RunningStats'):
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def std(self) -> float:
+        # 与pandas一致，使用样本标准差 (ddof=1)
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else math.nan
+
+    def get(self, stat: str) -> float:
+        if self.count == 0:
+            return math.nan
+        return getattr(self, stat)
+
+    def to_dict(self) -> Dict:
+        return {'count': self.count, 'mean': self.mean, 'm2': self.m2,
+                'min': self.min if self.count else None, 'max': self.max if self.count else None}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'RunningStats':
+        stats = cls()
+        stats.count = data['count']
+        stats.mean = data['mean']
+        stats.m2 = data['m2']
+        if stats.count:
+            stats.min = data['min']
+            stats.max = data['max']
+        return stats
+
+
+class ResultSummary:
+    """逐请求结果的增量汇总：请求计数、成功请求各指标的统计量、按错误类型的失败计数及部分失败样例"""
+
+    def __init__(self, metrics: Sequence[str], max_failures: int = 20):
+        self.metrics = list(metrics)
+        self.max_failures = max_failures
+        self.total = 0
+        self.succeeded = 0
+        self.stats = {metric: RunningStats() for metric in self.metrics}
+        self.failures: List[Dict] = []
+        # 错误类型 -> 失败请求数，没有记录错误类型的结果 (旧版本的结果文件) 计为other
+        self.error_types: Dict[str, int] = {}
+
+    @property
+    def failed(self) -> int:
+        return self.total - self.succeeded
+
+    def add(self, result: Dict):
+        self.total += 1
+        if result['status'] != 'success':
+            error_type = result.get('error_type') or 'other'
+            self.error_types[error_type] = self.error_types.get(error_type, 0) + 1
+            if len(self.failures) < self.max_failures:
+                self.failures.append(result)
+            return
+        self.succeeded += 1
+        for metric in self.metrics:
+            value = result.get(metric)
+            if value is not None:
+                self.stats[metric].update(value)
+
+    def add_frame(self, df: 'pd.DataFrame'):
+        """汇总一批分块读取的结果"""
+        import pandas as pd
+        self.total += len(df)
+        successful = df[df['status'] == 'success']
+        self.succeeded += len(successful)
+        if len(successful) < len(df):
+            failed = df[df['status'] != 'success']
+            error_types = failed['error_type'].fillna('other') if 'error_type' in failed.columns else \
+                pd.Series('other', index=failed.index)
+            for error_type, count in error_types.value_counts().items():
+                self.error_types[error_type] = self.error_types.get(error_type, 0) + int(count)
+        if len(self.failures) < self.max_failures:
+            failed = df[df['status'] != 'success'].head(self.max_failures - len(self.failures))
+            self.failures.extend(failed.to_dict('records'))
+        for metric in self.metrics:
+            if metric in successful.columns:
+                self.stats[metric].update_many(successful[metric])
+
+    def merge(self, other: 'ResultSummary'):
+        self.total += other.total
+        self.succeeded += other.succeeded
+        for error_type, count in other.error_types.items():
+            self.error_types[error_type] = self.error_types.get(error_type, 0) + count
+        for metric, stats in other.stats.items():
+            self.stats.setdefault(metric, RunningStats()).merge(stats)
+        self.failures.extend(other.failures[:max(0, self.max_failures - len(self.failures))])
+
+    def table(self, stats: Sequence[str] = ('mean', 'min', 'max')) -> 'pd.DataFrame':
+        """返回与DataFrame.agg相同布局的统计表 (行为统计量，列为指标)"""
+        import pandas as pd
+        return pd.DataFrame({
+            metric: [self.stats[metric].get(stat) for stat in stats]
+            for metric in self.metrics if self.stats[metric].count
+        }, index=list(stats))
+
+    def to_dict(self) -> Dict:
+        return {
+            'metrics': self.metrics,
+            'total': self.total,
+            'succeeded': self.succeeded,
+            'stats': {metric: stats.to_dict() for metric, stats in self.stats.items()},
+            'failures': self.failures,
+            'error_types': self.error_types,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ResultSummary':
+        summary = cls(data['metrics'])
+        summary.total = data['total']
+        summary.succeeded = data['succeeded']
+        summary.stats = {metric: RunningStats.from_dict(stats) for metric, stats in data['stats'].items()}
+        summary.failures = data['failures']
+        summary.error_types = data.get('error_types', {})
+        return summary
+
+
+class ThroughputTimeline:
+    """按时间分桶统计在途请求数和完成量，用于计算整体吞吐量及检测稳态区间
+
+    指定ttft_slo/tpot_slo (毫秒) 时，同时统计满足SLO的请求数，用于计算goodput
+    """
+
+    def __init__(self, bin_width: float = 1.0, ttft_slo: float = None, tpot_slo: float = None):
+        self.bin_width = bin_width
+        self.ttft_slo = ttft_slo
+        self.tpot_slo = tpot_slo
+        # 以绝对时间分桶，分块、乱序加入的结果可以直接累加
+        self.started: Dict[int, int] = {}
+        self.ended: Dict[int, int] = {}
+        self.completed: Dict[int, int] = {}
+        self.failed: Dict[int, int] = {}
+        self.good: Dict[int, int] = {}
+        self.input_tokens: Dict[int, float] = {}
+        self.output_tokens: Dict[int, float] = {}
+        # 跨越多个时间桶的请求在中间各桶内的输出token数，以差分形式保存
+        self.decode_rate: Dict[int, float] = {}
+
+    @property
+    def has_slo(self) -> bool:
+        return self.ttft_slo is not None or self.tpot_slo is not None
+
+    @staticmethod
+    def _accumulate(target: Dict[int, float], bins: np.ndarray, weights: np.ndarray = None):
+        if bins.size == 0:
+            return
+        unique, inverse = np.unique(bins, return_inverse=True)
+        sums = np.bincount(inverse, weights=weights)
+        for index, value in zip(unique.tolist(), sums.tolist()):
+            target[index] = target.get(index, 0) + value
+
+    def add_frame(self, df: 'pd.DataFrame'):
+        """加入一批请求的结果，包括失败和超时的请求
+
+        需要start_time、end_time列，所有发出的请求都计入在途请求数；
+        有status列时失败的请求只计入在途请求数和失败数，完成数、token数和goodput只统计成功的请求
+        (需要input_tokens、output_tokens列)。
+        有ttft列时输入token计入首个token到达的时间桶 (prefill完成)，
+        输出token按解码区间均匀分摊到首个token到结束之间的各个时间桶
+        """
+        width = self.bin_width
+        # 未发送的请求 (如会话中途失败后跳过的轮次) 没有开始和结束时间
+        df = df.dropna(subset=['start_time', 'end_time'])
+        start = df['start_time'].to_numpy(dtype=float)
+        end = df['end_time'].to_numpy(dtype=float)
+        start_bins = np.floor(start / width).astype(np.int64)
+        end_bins = np.floor(end / width).astype(np.int64)
+        # 请求在其开始到结束的各个时间桶内均计为在途
+        self._accumulate(self.started, start_bins)
+        self._accumulate(self.ended, end_bins + 1)
+
+        if 'status' in df.columns:
+            success = (df['status'] == 'success').to_numpy()
+            self._accumulate(self.failed, end_bins[~success])
+            df, start, end, end_bins = df[success], start[success], end[success], end_bins[success]
+        # 全部失败时结果中可能没有token列
+        if df.empty:
+            return
+        first = start + df['ttft'].to_numpy(dtype=float) / 1000 if 'ttft' in df.columns else start
+        first = np.clip(first, start, end)
+        first_bins = np.floor(first / width).astype(np.int64)
+        self._accumulate(self.completed, end_bins)
+        self._accumulate(self.input_tokens, first_bins, df['input_tokens'].to_numpy(dtype=float))
+
+        tokens = df['output_tokens'].to_numpy(dtype=float)
+        same = first_bins == end_bins
+        self._accumulate(self.output_tokens, end_bins[same], tokens[same])
+        span = ~same
+        if span.any():
+            rate = tokens[span] / (end[span] - first[span])
+            first_bins, end_bins = first_bins[span], end_bins[span]
+            # 首尾两个时间桶按实际重叠时长计入，中间的时间桶各计入rate * width
+            self._accumulate(self.output_tokens, first_bins, rate * ((first_bins + 1) * width - first[span]))
+            self._accumulate(self.output_tokens, end_bins, rate * (end[span] - end_bins * width))
+            self._accumulate(self.decode_rate, first_bins + 1, rate * width)
+            self._accumulate(self.decode_rate, end_bins, -rate * width)
+
+        if self.has_slo:
+            good = np.ones(len(df), dtype=bool)
+            if self.ttft_slo is not None:
+                good &= df['ttft'].to_numpy(dtype=float) <= self.ttft_slo
+            if self.tpot_slo is not None:
+                good &= df['tpot'].to_numpy(dtype=float) <= self.tpot_slo
+            self._accumulate(self.good, np.floor(end[good] / width).astype(np.int64))
+
+    def frame(self) -> 'pd.DataFrame':
+        """返回连续时间桶的时间线，索引为相对第一个时间桶的秒数"""
+        import pandas as pd
+        columns = ['in_flight', 'completed', 'failed', *(['good'] if self.has_slo else []),
+                   'input_tokens', 'output_tokens']
+        if not self.started:
+            return pd.DataFrame(columns=columns)
+        first = min(self.started)
+        last = max(self.ended) - 1
+        bins = np.arange(first, last + 1)
+
+        def series(values: Dict[int, float]) -> np.ndarray:
+            return np.array([values.get(index, 0) for index in bins.tolist()], dtype=float)
+
+        timeline = pd.DataFrame({
+            'in_flight': np.cumsum(series(self.started) - series(self.ended)),
+            'completed': series(self.completed),
+            'failed': series(self.failed),
+            'good': series(self.good),
+            'input_tokens': series(self.input_tokens),
+            'output_tokens': series(self.output_tokens) + np.cumsum(series(self.decode_rate)),
+        }, index=pd.Index((bins - first) * self.bin_width, name='time'))
+        return timeline[columns]
+
+    def rates(self) -> 'pd.DataFrame':
+        """返回各时间桶内的吞吐率 (每秒)，用于绘制吞吐量随时间的变化"""
+        import pandas as pd
+        timeline = self.frame()
+        rates = pd.DataFrame({
+            'in_flight': timeline['in_flight'],
+            'rps': timeline['completed'] / self.bin_width,
+            'failed_rps': timeline['failed'] / self.bin_width,
+            'input_tps': timeline['input_tokens'] / self.bin_width,
+            'output_tps': timeline['output_tokens'] / self.bin_width,
+        }, index=timeline.index)
+        if self.has_slo:
+            rates['goodput'] = timeline['good'] / self.bin_width
+        return rates
+
+    def steady_window(self, threshold: float = 0.9, smoothing: int = 5):
+        """检测稳态区间，返回 (开始, 结束) 相对时间 (秒)，无法识别时返回None
+
+        稳态要求平滑后的在途请求数不低于其高位水平 (90分位) 的threshold倍，
+        且平滑后的完成速率不低于这些时间桶内完成速率中位数的threshold倍；
+        取第一个到最后一个满足条件的时间桶，排除爬坡阶段和结束时在途请求排空的尾部
+        """
+        timeline = self.frame()
+        if len(timeline) < smoothing:
+            return None
+        in_flight = timeline['in_flight'].rolling(smoothing, center=True, min_periods=1).mean()
+        completed = timeline['completed'].rolling(smoothing, center=True, min_periods=1).mean()
+        loaded = in_flight >= threshold * np.percentile(in_flight, 90)
+        steady = loaded & (completed >= threshold * completed[loaded].median())
+        if steady.sum() < smoothing:
+            return None
+        times = timeline.index[steady.to_numpy()]
+        return float(times[0]), float(times[-1] + self.bin_width)
+
+    def throughput(self, window=None) -> Dict[str, float]:
+        """计算整个测试或指定窗口 (相对时间) 内的整体吞吐量"""
+        timeline = self.frame()
+        if window is not None:
+            start, end = window
+            timeline = timeline[(timeline.index >= start) & (timeline.index < end)]
+        duration = len(timeline) * self.bin_width
+        if duration == 0:
+            result = {'duration': 0.0, 'requests': 0, 'failed': 0, 'rps': math.nan, 'input_tps': math.nan,
+                      'output_tps': math.nan}
+            if self.has_slo:
+                result['goodput'] = math.nan
+            return result
+        result = {
+            'duration': duration,
+            'requests': int(timeline['completed'].sum()),
+            'failed': int(timeline['failed'].sum()),
+            'rps': float(timeline['completed'].sum() / duration),
+            'input_tps': float(timeline['input_tokens'].sum() / duration),
+            'output_tps': float(timeline['output_tokens'].sum() / duration),
+        }
+        if self.has_slo:
+            # goodput：每秒完成的、满足TTFT和TPOT目标的请求数
+            result['goodput'] = float(timeline['good'].sum() / duration)
+        return result
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM Live Metrics
+~~~~~~~~~~~~~~~~~~~~~~~~
+
+Real-time metrics of a running test.
+
+LiveMetrics keeps the requests completed in the last few seconds in a
+rolling window. Recording a request only appends to a deque; percentiles,
+throughput and error rate are computed from the window when a snapshot is
+taken (about once per second), so the request hot path stays cheap. Worker
+processes forward their new samples to the main process, which merges them
+into a single view.
+
+MetricsServer exposes the live metrics on a local `/metrics` endpoint in
+the Prometheus text format, so that client-side metrics can be scraped and
+overlaid on server-side dashboards.
+
+License: Apache License 2.0
+"""
+
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+import numpy as np
+from aiohttp import web
+
+from client_timing import clock
+
+
+class LiveMetrics:
+    """测试过程中的实时指标：在途请求数、累计计数及最近window秒内的延迟分位数、吞吐量和错误率
+
+    forward为True时 (负载进程中) 保留新产生的样本，由drain()取出转发给主进程
+    """
+
+    def __init__(self, window: float = 10.0, forward: bool = False):
+        self.window = window
+        self.forward = forward
+        # 第一个请求发送的时刻
+        self.start_time: Optional[float] = None
+        self.in_flight = 0
+        # 各负载进程最近上报的在途请求数
+        self.worker_in_flight: Dict[int, int] = {}
+        # 累计计数，Prometheus据此计算任意区间的速率
+        self.requests_total = {'success': 0, 'failed': 0}
+        # 按错误类型的失败请求累计数
+        self.errors_total: Dict[str, int] = {}
+        self.input_tokens_total = 0
+        self.output_tokens_total = 0
+        # 最近完成的请求：(结束时间, 是否成功, 输入token数, 输出token数, TTFT, ITL样本, 错误类型)
+        self._events = deque()
+        self._pending: List[tuple] = []
+        # 主进程中测试线程写入、事件循环读取，需要加锁
+        self._lock = threading.Lock()
+
+    def started(self):
+        if self.start_time is None:
+            self.start_time = clock()
+        self.in_flight += 1
+
+    def finished(self, ttft: float, itls: np.ndarray, input_tokens: int, output_tokens: int):
+        """记录一个成功完成的请求 (TTFT和ITL单位为毫秒)"""
+        self.in_flight -= 1
+        self._add((clock(), True, input_tokens, output_tokens, ttft, itls, None))
+
+    def failed(self, error_type: str = 'other'):
+        self.in_flight -= 1
+        self._add((clock(), False, 0, 0, None, None, error_type))
+
+    def _add(self, event: tuple):
+        with self._lock:
+            self._events.append(event)
+            if self.forward:
+                self._pending.append(event)
+        self.requests_total['success' if event[1] else 'failed'] += 1
+        if not event[1]:
+            self.errors_total[event[6]] = self.errors_total.get(event[6], 0) + 1
+        self.input_tokens_total += event[2]
+        self.output_tokens_total += event[3]
+
+    def drain(self) -> Dict:
+        """取出上次调用之后新完成的请求，供负载进程发送给主进程"""
+        with self._lock:
+            events, self._pending = self._pending, []
+        return {'in_flight': self.in_flight, 'start_time': self.start_time, 'events': events}
+
+    def ingest(self, worker_id: int, delta: Dict):
+        """合并负载进程发送的新样本"""
+        self.worker_in_flight[worker_id] = delta['in_flight']
+        self.in_flight = sum(self.worker_in_flight.values())
+        if delta['start_time'] is not None:
+            self.start_time = min(self.start_time or delta['start_time'], delta['start_time'])
+        for event in delta['events']:
+            self._add(tuple(event))
+
+    def snapshot(self) -> Dict:
+        """根据最近window秒内完成的请求计算实时指标"""
+        now = clock()
+        with self._lock:
+            while self._events and self._events[0][0] < now - self.window:
+                self._events.popleft()
+            events = list(self._events)
+        # 测试刚开始时按实际经过的时间计算速率
+        elapsed = max(min(self.window, now - (self.start_time or now)), 1e-3)
+        successful = [event for event in events if event[1]]
+        ttfts = np.array([event[4] for event in successful], dtype=float)
+        itl_arrays = [event[5] for event in successful if event[5] is not None and len(event[5])]
+        itls = np.concatenate(itl_arrays) if itl_arrays else np.empty(0)
+
+        def percentile(values: np.ndarray, q: float) -> float:
+            return float(np.percentile(values, q)) if values.size else float('nan')
+
+        return {
+            'in_flight': self.in_flight,
+            'rps': len(successful) / elapsed,
+            'input_tps': sum(event[2] for event in successful) / elapsed,
+            'output_tps': sum(event[3] for event in successful) / elapsed,
+            'error_rate': (len(events) - len(successful)) / len(events) if events else 0.0,
+            'ttft_p50': percentile(ttfts, 50),
+            'ttft_p99': percentile(ttfts, 99),
+            'itl_p50': percentile(itls, 50),
+            'itl_p99': percentile(itls, 99),
+        }
+
+    def postfix(self) -> str:
+        """进度条后缀中显示的实时指标"""
+        snapshot = self.snapshot()
+        return (f"inflight={snapshot['in_flight']} "
+                f"ttft p50/p99={snapshot['ttft_p50']:.0f}/{snapshot['ttft_p99']:.0f}ms "
+                f"itl p50/p99={snapshot['itl_p50']:.1f}/{snapshot['itl_p99']:.1f}ms "
+                f"out={snapshot['output_tps']:.0f}tok/s err={snapshot['error_rate']:.1%}")
+
+    def prometheus(self) -> str:
+        """Prometheus文本格式的指标"""
+        snapshot = self.snapshot()
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str, samples: Dict[str, float]):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples.items():
+                lines.append(f"{name}{labels} {value}")
+
+        metric('llm_test_in_flight_requests', 'gauge', 'Requests currently in flight.',
+               {'': snapshot['in_flight']})
+        metric('llm_test_requests_total', 'counter', 'Completed requests by status.',
+               {f'{{status="{status}"}}': count for status, count in self.requests_total.items()})
+        metric('llm_test_errors_total', 'counter', 'Failed requests by error type.',
+               {f'{{type="{error_type}"}}': count for error_type, count in self.errors_total.items()})
+        metric('llm_test_input_tokens_total', 'counter', 'Input tokens of successful requests.',
+               {'': self.input_tokens_total})
+        metric('llm_test_output_tokens_total', 'counter', 'Output tokens of successful requests.',
+               {'': self.output_tokens_total})
+        metric('llm_test_requests_per_second', 'gauge', f'Completed requests per second over the last {self.window:g}s.',
+               {'': snapshot['rps']})
+        metric('llm_test_output_tokens_per_second', 'gauge', f'Output tokens per second over the last {self.window:g}s.',
+               {'': snapshot['output_tps']})
+        metric('llm_test_error_rate', 'gauge', f'Fraction of failed requests over the last {self.window:g}s.',
+               {'': snapshot['error_rate']})
+        # 延迟以秒为单位导出，符合Prometheus的命名约定
+        for name, label in (('ttft', 'Time to first token'), ('itl', 'Inter-token latency')):
+            metric(f'llm_test_{name}_seconds', 'gauge', f'{label} quantiles over the last {self.window:g}s.',
+                   {f'{{quantile="{q}"}}': snapshot[f'{name}_p{int(q * 100)}'] / 1000 for q in (0.5, 0.99)})
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    """在本地端口上以Prometheus格式提供/metrics接口"""
+
+    def __init__(self, live: LiveMetrics, port: int, host: str = '0.0.0.0'):
+        self.live = live
+        self.port = port
+        self.host = host
+        self._runner: Optional[web.AppRunner] = None
+
+    async def _metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.live.prometheus(), content_type='text/plain', charset='utf-8')
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/metrics', self._metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        print(f"实时指标: http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
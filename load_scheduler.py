@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM Load Scheduler
+~~~~~~~~~~~~~~~~~~~~~~~~
+
+Request arrival schedules used by the performance tester.
+
+Schedules:
+    1. ArrivalSchedule      - open-loop arrivals at a target rate
+                              (constant / poisson / gamma)
+    2. ConcurrencySchedule  - closed-loop sliding window that keeps N
+                              requests in flight, with optional ramp-up
+                              and ramp-down
+    3. TraceSchedule        - replay of the arrival times recorded in a
+                              request trace, optionally time-scaled
+
+License: Apache License 2.0
+"""
+
+import asyncio
+from typing import Optional
+
+import numpy as np
+
+ARRIVAL_PROCESSES = ('constant', 'poisson', 'gamma')
+
+
+def split_count(total: int, workers: int, worker_id: int) -> int:
+    """将total尽量平均地分给workers个进程，返回第worker_id个进程的份额"""
+    if total < workers:
+        raise ValueError(f"{total}无法分配给{workers}个进程，每个进程至少需要1个")
+    return total // workers + (1 if worker_id < total % workers else 0)
+
+
+class ArrivalSchedule:
+    """开环到达调度：按目标速率发送请求，与请求完成情况无关"""
+
+    def __init__(self,
+                 request_rate: float,
+                 arrival_process: str = 'poisson',
+                 burstiness: float = 1.0,
+                 seed: Optional[int] = None,
+                 max_concurrency: Optional[int] = None,
+                 start_offset: float = 0.0):
+        if request_rate <= 0:
+            raise ValueError("request_rate必须大于0")
+        if arrival_process not in ARRIVAL_PROCESSES:
+            raise ValueError(f"不支持的到达过程: {arrival_process}，可选: {', '.join(ARRIVAL_PROCESSES)}")
+        if burstiness <= 0:
+            raise ValueError("burstiness必须大于0")
+        if max_concurrency is not None and max_concurrency <= 0:
+            raise ValueError("max_concurrency必须大于0")
+
+        self.request_rate = request_rate
+        self.arrival_process = arrival_process
+        self.burstiness = burstiness
+        self.seed = seed
+        # 客户端并发上限，达到上限后新到达的请求在客户端排队 (计入排队延迟)
+        self.max_concurrency = max_concurrency
+        # 第一个请求相对测试开始时间的偏移 (秒)，多进程拆分时用于错开各进程的发送时刻
+        self.start_offset = start_offset
+
+    def intervals(self, count: int) -> np.ndarray:
+        """生成count个请求的到达间隔 (秒)"""
+        mean_interval = 1.0 / self.request_rate
+        rng = np.random.default_rng(self.seed)
+
+        if self.arrival_process == 'constant':
+            return np.full(count, mean_interval)
+        if self.arrival_process == 'poisson':
+            return rng.exponential(mean_interval, size=count)
+
+        # gamma分布：shape=burstiness，均值保持为1/rate
+        # burstiness < 1 时流量更突发，> 1 时更均匀
+        return rng.gamma(self.burstiness, mean_interval / self.burstiness, size=count)
+
+    def offsets(self, count: int) -> np.ndarray:
+        """生成每个请求相对测试开始时间的计划发送时刻 (秒)"""
+        intervals = self.intervals(count)
+        # 第一个请求在测试开始时立即发送
+        intervals[0] = 0.0
+        return np.cumsum(intervals) + self.start_offset
+
+    def split(self, workers: int, worker_id: int) -> 'ArrivalSchedule':
+        """拆分为workers个子调度之一，各子调度速率之和等于原速率"""
+        max_concurrency = None
+        if self.max_concurrency is not None:
+            max_concurrency = split_count(self.max_concurrency, workers, worker_id)
+        return ArrivalSchedule(
+            request_rate=self.request_rate / workers,
+            arrival_process=self.arrival_process,
+            burstiness=self.burstiness,
+            seed=None if self.seed is None else self.seed + worker_id,
+            max_concurrency=max_concurrency,
+            # 错开各进程的起始时刻，使合并后的constant到达保持均匀
+            start_offset=self.start_offset + worker_id / self.request_rate
+        )
+
+    def describe(self) -> str:
+        description = f"rate={self.request_rate}/s, process={self.arrival_process}, burstiness={self.burstiness}"
+        if self.max_concurrency is not None:
+            description += f", max_concurrency={self.max_concurrency}"
+        return description
+
+
+class ConcurrencySchedule:
+    """滑动窗口并发调度：任一请求完成后立即补发新请求，保持在途请求数恒定"""
+
+    def __init__(self,
+                 concurrency: int,
+                 ramp_up: float = 0.0,
+                 hold: Optional[float] = None,
+                 ramp_down: float = 0.0,
+                 start_concurrency: int = 1):
+        if concurrency <= 0:
+            raise ValueError("concurrency必须大于0")
+        if ramp_up < 0 or ramp_down < 0:
+            raise ValueError("ramp_up和ramp_down不能为负数")
+        if hold is None and ramp_down > 0:
+            raise ValueError("设置ramp_down时必须同时设置hold")
+
+        self.concurrency = concurrency
+        self.ramp_up = ramp_up
+        # 稳态保持时长 (秒)，为None时保持到所有请求发送完毕
+        self.hold = hold
+        self.ramp_down = ramp_down
+        self.start_concurrency = max(1, min(start_concurrency, concurrency))
+
+    def limit_at(self, elapsed: float) -> int:
+        """返回测试开始后elapsed秒时的并发上限"""
+        low, high = self.start_concurrency, self.concurrency
+
+        if elapsed < self.ramp_up:
+            return int(round(low + (high - low) * elapsed / self.ramp_up))
+        if self.hold is None or elapsed < self.ramp_up + self.hold:
+            return high
+
+        down_elapsed = elapsed - self.ramp_up - self.hold
+        if down_elapsed < self.ramp_down:
+            return int(round(high - (high - low) * down_elapsed / self.ramp_down))
+        return low
+
+    def split(self, workers: int, worker_id: int) -> 'ConcurrencySchedule':
+        """拆分为workers个子调度之一，各子调度并发数之和等于原并发数"""
+        return ConcurrencySchedule(
+            concurrency=split_count(self.concurrency, workers, worker_id),
+            ramp_up=self.ramp_up,
+            hold=self.hold,
+            ramp_down=self.ramp_down,
+            start_concurrency=max(1, self.start_concurrency // workers)
+        )
+
+    def describe(self) -> str:
+        description = f"concurrency={self.concurrency}"
+        if self.ramp_up or self.ramp_down:
+            description += f", ramp_up={self.ramp_up}s, hold={self.hold}s, ramp_down={self.ramp_down}s"
+        return description
+
+
+class TraceSchedule:
+    """轨迹回放调度：按轨迹中记录的到达时刻发送请求，time_scale大于1时加速回放"""
+
+    def __init__(self,
+                 time_scale: float = 1.0,
+                 max_concurrency: Optional[int] = None,
+                 workers: int = 1,
+                 worker_id: int = 0):
+        if time_scale <= 0:
+            raise ValueError("time_scale必须大于0")
+        if max_concurrency is not None and max_concurrency <= 0:
+            raise ValueError("max_concurrency必须大于0")
+
+        self.time_scale = time_scale
+        self.max_concurrency = max_concurrency
+        # 多进程回放时每个进程读取完整轨迹，只发送序号对进程数取模等于worker_id的请求
+        self.workers = workers
+        self.worker_id = worker_id
+
+    def offset(self, arrival: float) -> float:
+        """将轨迹中的到达时刻换算为相对回放开始时间的发送时刻 (秒)"""
+        return arrival / self.time_scale
+
+    def owns(self, index: int) -> bool:
+        return index % self.workers == self.worker_id
+
+    def split(self, workers: int, worker_id: int) -> 'TraceSchedule':
+        """拆分为workers个子调度之一，各子调度共同回放完整轨迹"""
+        max_concurrency = None
+        if self.max_concurrency is not None:
+            max_concurrency = split_count(self.max_concurrency, workers, worker_id)
+        return TraceSchedule(
+            time_scale=self.time_scale,
+            max_concurrency=max_concurrency,
+            workers=workers,
+            worker_id=worker_id
+        )
+
+    def describe(self) -> str:
+        description = f"trace replay, time_scale={self.time_scale}x"
+        if self.max_concurrency is not None:
+            description += f", max_concurrency={self.max_concurrency}"
+        return description
+
+
+class ConcurrencyLimiter:
+    """上限可动态调整的信号量，用于实现并发爬坡"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def release(self):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    async def set_limit(self, limit: int):
+        async with self._condition:
+            self.limit = limit
+            self._condition.notify_all()
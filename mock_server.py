@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM Mock Server
+~~~~~~~~~~~~~~~~~~~~~~~~
+
+A local OpenAI-compatible streaming server for testing the harness itself.
+
+The server answers `/v1/chat/completions` with SSE chunks after a
+configurable time to first token, then streams one token per chunk with a
+fixed per-token delay. Output lengths follow a LengthDistribution (capped
+by `max_tokens`), and a concurrency limit (queueing or rejecting with 429),
+injected 5xx errors, mid-stream disconnects and mid-stream stalls are
+supported. The delays
+the server actually produced are kept in histograms and exposed on
+`/mock/stats` as ground truth.
+
+Commands:
+    serve     - run the mock server
+    calibrate - run BatchProcessor against the mock server under several
+                scenarios, compare the measured metrics with the server-side
+                ground truth, and measure the maximum client throughput
+
+License: Apache License 2.0
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import sys
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import numpy as np
+from aiohttp import ClientSession, web
+
+from client_timing import clock
+from latency_stats import LatencyHistogram
+from prompt_generator import LengthDistribution
+
+# 模拟服务进程不需要pandas，只有校准汇总结果时导入
+if TYPE_CHECKING:
+    import pandas as pd
+
+# 逐chunk输出的单词，在常见tokenizer中均为单个token
+MOCK_WORDS = (' the', ' of', ' and', ' to', ' in', ' is', ' that', ' for', ' it', ' as')
+
+
+class MockServer:
+    """模拟流式推理服务，按配置的TTFT、逐token延迟和输出长度分布返回SSE响应"""
+
+    def __init__(self,
+                 ttft: float = 0.2,
+                 token_delay: float = 0.02,
+                 output_lengths: LengthDistribution = None,
+                 max_concurrency: int = None,
+                 reject_overflow: bool = False,
+                 error_rate: float = 0.0,
+                 disconnect_rate: float = 0.0,
+                 stall_rate: float = 0.0,
+                 stall_duration: float = 5.0,
+                 seed: int = None):
+        # ttft和token_delay单位为秒
+        self.ttft = ttft
+        self.token_delay = token_delay
+        self.output_lengths = output_lengths or LengthDistribution('fixed', value=128)
+        # 超过max_concurrency的请求排队等待 (计入TTFT)，reject_overflow为True时直接返回429
+        self.max_concurrency = max_concurrency
+        self.reject_overflow = reject_overflow
+        self.error_rate = error_rate
+        self.disconnect_rate = disconnect_rate
+        # stall_rate比例的请求在输出中途停顿stall_duration秒
+        self.stall_rate = stall_rate
+        self.stall_duration = stall_duration
+        self.rng = np.random.default_rng(seed)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.reset()
+
+    def reset(self):
+        """清空服务端统计"""
+        self.histograms = {metric: LatencyHistogram() for metric in ('ttft', 'itl', 'queue')}
+        self.counts = {'requests': 0, 'completed': 0, 'errors': 0, 'disconnects': 0, 'rejected': 0,
+                       'stalls': 0, 'aborted': 0, 'output_tokens': 0}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def config(self) -> Dict:
+        return {
+            'ttft': self.ttft,
+            'token_delay': self.token_delay,
+            'output_lengths': self.output_lengths.describe(),
+            'max_concurrency': self.max_concurrency,
+            'reject_overflow': self.reject_overflow,
+            'error_rate': self.error_rate,
+            'disconnect_rate': self.disconnect_rate,
+            'stall_rate': self.stall_rate,
+            'stall_duration': self.stall_duration,
+        }
+
+    @staticmethod
+    def _chunk(model: str, delta: Dict = None, usage: Dict = None) -> bytes:
+        event = {
+            'id': 'chatcmpl-mock',
+            'object': 'chat.completion.chunk',
+            'created': 0,
+            'model': model,
+            'choices': [] if delta is None else [{'index': 0, 'delta': delta, 'finish_reason': None}],
+        }
+        if usage is not None:
+            event['usage'] = usage
+        return f"data: {json.dumps(event)}\n\n".encode()
+
+    @staticmethod
+    def _error(status: int, message: str) -> web.Response:
+        return web.json_response({'error': {'message': message, 'type': 'mock_error', 'code': status}},
+                                 status=status)
+
+    async def handle_chat(self, request: web.Request) -> web.StreamResponse:
+        arrival = clock()
+        self.counts['requests'] += 1
+        try:
+            body = await request.json()
+        except ConnectionResetError:
+            # 客户端在发送请求体时已取消请求
+            self.counts['aborted'] += 1
+            return web.Response(status=499)
+
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.counts['errors'] += 1
+            return self._error(500, 'injected server error')
+
+        if self._semaphore is None and self.max_concurrency:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        if self._semaphore is not None:
+            if self.reject_overflow and self._semaphore.locked():
+                self.counts['rejected'] += 1
+                return self._error(429, 'too many concurrent requests')
+            await self._semaphore.acquire()
+        try:
+            return await self._stream(request, body, arrival)
+        finally:
+            if self._semaphore is not None:
+                self._semaphore.release()
+
+    async def _stream(self, request: web.Request, body: Dict, arrival: float) -> web.StreamResponse:
+        start = clock()
+        self.histograms['queue'].record((start - arrival) * 1000)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            model = body.get('model', 'mock')
+            length = int(self.output_lengths.sample(self.rng, 1)[0])
+            if body.get('max_tokens'):
+                length = min(length, int(body['max_tokens']))
+            disconnect_at = None
+            if self.disconnect_rate and self.rng.random() < self.disconnect_rate:
+                disconnect_at = length // 2
+            stall_at = None
+            if self.stall_rate and self.rng.random() < self.stall_rate:
+                stall_at = length // 2
+
+            response = web.StreamResponse(headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache'})
+            await response.prepare(request)
+
+            # 按相对开始时刻的绝对时间安排每个token，sleep的误差不会累积
+            last_write = None
+            for index in range(length):
+                if index == stall_at:
+                    self.counts['stalls'] += 1
+                    start += self.stall_duration
+                delay = start + self.ttft + index * self.token_delay - clock()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if index == disconnect_at:
+                    self.counts['disconnects'] += 1
+                    request.transport.close()
+                    return response
+                delta = {'content': MOCK_WORDS[index % len(MOCK_WORDS)]}
+                if index == 0:
+                    delta['role'] = 'assistant'
+                try:
+                    await response.write(self._chunk(model, delta))
+                except ConnectionResetError:
+                    # 客户端已取消请求并关闭连接
+                    self.counts['aborted'] += 1
+                    return response
+                now = clock()
+                if last_write is None:
+                    self.histograms['ttft'].record((now - arrival) * 1000)
+                else:
+                    self.histograms['itl'].record((now - last_write) * 1000)
+                last_write = now
+
+            if (body.get('stream_options') or {}).get('include_usage'):
+                prompt_tokens = sum(len(str(message.get('content', '')).split()) for message in body.get('messages', []))
+                await response.write(self._chunk(model, usage={
+                    'prompt_tokens': prompt_tokens,
+                    'completion_tokens': length,
+                    'total_tokens': prompt_tokens + length,
+                }))
+            await response.write(b"data: [DONE]\n\n")
+            await response.write_eof()
+            self.counts['completed'] += 1
+            self.counts['output_tokens'] += length
+            return response
+        finally:
+            self.in_flight -= 1
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            'config': self.config(),
+            'counts': self.counts,
+            'max_in_flight': self.max_in_flight,
+            'histograms': {metric: histogram.to_dict() for metric, histogram in self.histograms.items()},
+        })
+
+    async def handle_reset(self, request: web.Request) -> web.Response:
+        self.reset()
+        return web.json_response({'status': 'ok'})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post('/v1/chat/completions', self.handle_chat)
+        app.router.add_get('/mock/stats', self.handle_stats)
+        app.router.add_post('/mock/reset', self.handle_reset)
+        return app
+
+
+def serve(server_kwargs: Dict, host: str = '127.0.0.1', port: int = 8000):
+    """运行模拟服务 (阻塞)"""
+    server = MockServer(**server_kwargs)
+    web.run_app(server.app(), host=host, port=port, print=None, access_log=None)
+
+
+# 校准场景：注入的服务端行为及客户端负载
+CALIBRATION_SCENARIOS = [
+    {'name': 'latency', 'concurrency': 8,
+     'server': {'ttft': 0.2, 'token_delay': 0.02, 'output_lengths': LengthDistribution('fixed', value=64)}},
+    {'name': 'length_distribution', 'concurrency': 16,
+     'server': {'ttft': 0.05, 'token_delay': 0.01,
+                'output_lengths': LengthDistribution('normal', mean=128, std=32, max_value=256)}},
+    {'name': 'errors', 'concurrency': 16,
+     'server': {'ttft': 0.05, 'token_delay': 0.01, 'output_lengths': LengthDistribution('fixed', value=32),
+                'error_rate': 0.05, 'disconnect_rate': 0.05}},
+    {'name': 'concurrency_limit', 'concurrency': 16,
+     'server': {'ttft': 0.05, 'token_delay': 0.01, 'output_lengths': LengthDistribution('fixed', value=32),
+                'max_concurrency': 4}},
+    # 被拒绝的请求立即被下一个请求替代，成功请求很少，延迟只作记录
+    {'name': 'overload', 'concurrency': 16, 'check_latency': False,
+     'server': {'ttft': 0.05, 'token_delay': 0.01, 'output_lengths': LengthDistribution('fixed', value=32),
+                'max_concurrency': 4, 'reject_overflow': True}},
+    # 停顿超过客户端的stall超时，客户端取消请求并记为timeout
+    {'name': 'stalls', 'concurrency': 16, 'timeouts': {'stall': 0.3},
+     'server': {'ttft': 0.05, 'token_delay': 0.01, 'output_lengths': LengthDistribution('fixed', value=32),
+                'stall_rate': 0.05, 'stall_duration': 1.0}},
+    # 服务端不引入延迟，测得的是客户端能够处理的最大吞吐量
+    {'name': 'client_capacity', 'concurrency': 64, 'check': False,
+     'server': {'ttft': 0.0, 'token_delay': 0.0, 'output_lengths': LengthDistribution('fixed', value=256)}},
+]
+
+
+def _histogram(data: Dict) -> LatencyHistogram:
+    return LatencyHistogram.from_dict(data)
+
+
+async def _wait_ready(base: str, timeout: float = 30.0):
+    deadline = clock() + timeout
+    async with ClientSession() as session:
+        while True:
+            try:
+                async with session.get(f"{base}/mock/stats") as response:
+                    if response.status == 200:
+                        return
+            except OSError:
+                pass
+            if clock() > deadline:
+                raise RuntimeError("模拟服务启动超时")
+            await asyncio.sleep(0.1)
+
+
+async def _fetch_stats(base: str) -> Dict:
+    async with ClientSession() as session:
+        async with session.get(f"{base}/mock/stats") as response:
+            return await response.json()
+
+
+def _check(rows: List[Dict], scenario: str, metric: str, measured: float, expected: float,
+           abs_tolerance: float, rel_tolerance: float, check: bool = True):
+    """比较测得值与服务端真实值，误差在max(绝对容差, 相对容差)以内为通过；check为False时只记录"""
+    error = measured - expected
+    tolerance = max(abs_tolerance, abs(expected) * rel_tolerance) if check else np.nan
+    rows.append({
+        'scenario': scenario,
+        'metric': metric,
+        'measured': measured,
+        'expected': expected,
+        'error': error,
+        'tolerance': tolerance,
+        'passed': bool(abs(error) <= tolerance) if check else None,
+    })
+
+
+async def run_calibration(requests: int = 200, port: int = 18900, transport: str = 'http',
+                          output_dir: str = './output/calibration') -> 'pd.DataFrame':
+    """在各个校准场景下运行BatchProcessor，与模拟服务记录的真实值对比"""
+    import pandas as pd
+    from load_scheduler import ConcurrencySchedule
+    from performance_test import BatchProcessor, build_timeline
+
+    os.makedirs(output_dir, exist_ok=True)
+    input_file = os.path.join(output_dir, 'calibration_prompts.csv')
+    pd.DataFrame({'prompt': [f"calibration request {index}" for index in range(requests)]}).to_csv(
+        input_file, index=False)
+
+    base = f"http://127.0.0.1:{port}"
+    rows = []
+    ctx = mp.get_context('spawn')
+    for scenario in CALIBRATION_SCENARIOS:
+        name = scenario['name']
+        check = scenario.get('check', True)
+        print(f"\n校准场景: {name} (并发 {scenario['concurrency']})")
+        # 模拟服务运行在独立进程中，不与客户端争用事件循环
+        process = ctx.Process(target=serve, args=(scenario['server'], '127.0.0.1', port), daemon=True)
+        process.start()
+        try:
+            await _wait_ready(base)
+            processor = BatchProcessor(
+                api_key='mock', base_url=f"{base}/v1", model='mock',
+                schedule=ConcurrencySchedule(concurrency=scenario['concurrency']),
+                transport=transport, keep_response=False, timeouts=scenario.get('timeouts'),
+            )
+            output_file = os.path.join(output_dir, f"calibration_{name}.jsonl")
+            await processor.process_all(input_file, output_file)
+            stats = await _fetch_stats(base)
+        finally:
+            process.terminate()
+            process.join()
+
+        monitor = processor.performance_monitor
+        server = {metric: _histogram(data) for metric, data in stats['histograms'].items()}
+        counts = stats['counts']
+        summary = processor.summary
+        for metric in ('ttft', 'itl'):
+            # 客户端TTFT额外包含建立连接和本机回环网络的时间，中位数允许5ms的绝对误差；
+            # 尾部分位数受连接建立和客户端调度抖动影响较大，只作记录
+            _check(rows, name, f"{metric}_p50_ms", monitor.histograms[metric].percentile(50),
+                   server[metric].percentile(50), 5.0, 0.05, check and scenario.get('check_latency', True))
+            _check(rows, name, f"{metric}_p99_ms", monitor.histograms[metric].percentile(99),
+                   server[metric].percentile(99), 5.0, 0.05, False)
+        if summary.succeeded:
+            _check(rows, name, 'output_tokens_mean', summary.stats['output_tokens'].get('mean'),
+                   counts['output_tokens'] / counts['completed'], 0.0, 0.01, check)
+        failures = counts['errors'] + counts['disconnects'] + counts['rejected'] + counts['stalls']
+        _check(rows, name, 'failure_rate', summary.failed / summary.total, failures / counts['requests'],
+               0.0, 0.0, check)
+        # 客户端的错误分类与服务端注入的故障一一对应
+        for error_type, injected in (('server_error', 'errors'), ('disconnect', 'disconnects'),
+                                     ('rate_limited', 'rejected'), ('timeout', 'stalls')):
+            if counts[injected] or summary.error_types.get(error_type):
+                _check(rows, name, f"{error_type}_rate", summary.error_types.get(error_type, 0) / summary.total,
+                       counts[injected] / counts['requests'], 0.0, 0.0, check)
+        if name == 'concurrency_limit':
+            _check(rows, name, 'server_max_in_flight', stats['max_in_flight'],
+                   scenario['server']['max_concurrency'], 0.0, 0.0, check)
+
+        # 客户端吞吐量和事件循环延迟没有对应的真实值，只作记录
+        throughput = build_timeline(output_file).throughput()
+        _check(rows, name, 'output_tps', throughput['output_tps'], np.nan, 0.0, 0.0, False)
+        _check(rows, name, 'loop_lag_p99_ms', monitor.histograms['loop_lag'].percentile(99), np.nan, 0.0, 0.0, False)
+
+    result = pd.DataFrame(rows)
+    result.to_csv(os.path.join(output_dir, 'calibration.csv'), index=False)
+    return result
+
+
+def main():
+    import pandas as pd
+    parser = argparse.ArgumentParser(description="OpenAI兼容的模拟流式推理服务及测试工具校准")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help="运行模拟服务")
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8000)
+    serve_parser.add_argument('--ttft', type=float, default=0.2, help="首个token延迟 (秒)")
+    serve_parser.add_argument('--token-delay', type=float, default=0.02, help="逐token延迟 (秒)")
+    serve_parser.add_argument('--output-length', type=int, default=128, help="输出token数 (正态分布时为均值)")
+    serve_parser.add_argument('--output-std', type=float, default=0.0, help="输出token数的标准差，0为固定长度")
+    serve_parser.add_argument('--max-concurrency', type=int, default=None)
+    serve_parser.add_argument('--reject-overflow', action='store_true', help="超过并发上限时返回429而不是排队")
+    serve_parser.add_argument('--error-rate', type=float, default=0.0, help="返回500错误的请求比例")
+    serve_parser.add_argument('--disconnect-rate', type=float, default=0.0, help="输出中途断开连接的请求比例")
+    serve_parser.add_argument('--stall-rate', type=float, default=0.0, help="输出中途停顿的请求比例")
+    serve_parser.add_argument('--stall-duration', type=float, default=5.0, help="输出中途停顿的时长 (秒)")
+    serve_parser.add_argument('--seed', type=int, default=None)
+
+    calibrate_parser = subparsers.add_parser('calibrate', help="对比测试工具测得的指标与注入的真实值")
+    calibrate_parser.add_argument('--requests', type=int, default=200, help="每个场景的请求数")
+    calibrate_parser.add_argument('--port', type=int, default=18900)
+    calibrate_parser.add_argument('--transport', default='http', choices=('openai', 'http'))
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        if args.output_std > 0:
+            output_lengths = LengthDistribution('normal', mean=args.output_length, std=args.output_std)
+        else:
+            output_lengths = LengthDistribution('fixed', value=args.output_length)
+        print(f"模拟服务: http://{args.host}:{args.port}/v1 (统计: /mock/stats)")
+        serve({
+            'ttft': args.ttft,
+            'token_delay': args.token_delay,
+            'output_lengths': output_lengths,
+            'max_concurrency': args.max_concurrency,
+            'reject_overflow': args.reject_overflow,
+            'error_rate': args.error_rate,
+            'disconnect_rate': args.disconnect_rate,
+            'stall_rate': args.stall_rate,
+            'stall_duration': args.stall_duration,
+            'seed': args.seed,
+        }, host=args.host, port=args.port)
+        return
+
+    result = asyncio.run(run_calibration(requests=args.requests, port=args.port, transport=args.transport))
+    print("\n校准结果：")
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        print(result.round(3).to_string(index=False))
+    capacity = result[(result['scenario'] == 'client_capacity') & (result['metric'] == 'output_tps')]
+    if len(capacity):
+        print(f"\n客户端最大吞吐量 (服务端无延迟): {capacity['measured'].iloc[0]:.0f} output tokens/s")
+    failed = result[result['passed'].eq(False)]
+    if len(failed):
+        print(f"\n{len(failed)} 项校准未通过")
+        sys.exit(1)
+    print("\n所有校准项均通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,13 +11,163 @@ License: Apache License 2.0
 
 import asyncio
 import csv
+import functools
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import queue
+import re
 import time
-from typing import List, Dict
-import aiohttp
-from openai import AsyncOpenAI
-import pandas as pd
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, List, Dict, Set, Union
+import numpy as np
 from tqdm import tqdm
-import tiktoken
+from dotenv import load_dotenv
+from load_scheduler import (
+    ARRIVAL_PROCESSES,
+    ArrivalSchedule,
+    ConcurrencyLimiter,
+    ConcurrencySchedule,
+    TraceSchedule,
+    split_count,
+)
+from client_timing import LoopLagMonitor, SamplingProfiler, StreamWatchdog, clock
+from endpoint_pool import ROUTING_POLICIES, EndpointPool, load_endpoints
+from latency_stats import LatencyHistogram, ResultSummary, ThroughputTimeline
+from live_metrics import LiveMetrics, MetricsServer
+from result_store import (
+    ResultWriter,
+    RunManifest,
+    concat_result_files,
+    iter_result_chunks,
+    read_completed_indices,
+    repair_result_file,
+)
+from tokenizer_cache import load_encoding
+from trace_replay import PromptSynthesizer, TraceReader
+from transports import TIMEOUT_PHASES, TRANSPORTS, EmptyResponseError, RequestTimeoutError, classify_error
+
+# pandas导入约需0.3秒，只在读写结果文件、生成报告的函数内导入，负载进程发送请求时不需要
+if TYPE_CHECKING:
+    import pandas as pd
+
+# 使用在线直方图统计分位数的延迟指标 (毫秒)
+# *_censored为包含失败请求的分布：失败请求作为删失样本排在所有成功请求之后，分位数落在其上时为inf
+LATENCY_METRICS = ('ttft', 'itl', 'tpot', 'latency', 'queue_delay', 'loop_lag', 'ttft_censored', 'latency_censored')
+# 统计均值/标准差/最小值/最大值的逐请求指标
+# 系统整体的请求/token吞吐量由ThroughputTimeline按时间桶计算，不在此列
+SUMMARY_METRICS = ('input_tokens', 'output_tokens', 'ttft', 'tpot', 'latency', 'decode_tps', 'queue_delay',
+                   'itl_p50', 'itl_max', 'first_byte_ms', 'client_overhead_ms')
+
+
+# 按请求属性分组统计TTFT分布的维度，如共享前缀请求是否命中前缀缓存
+BREAKDOWN_DIMENSIONS = ('prefix_cache', 'turn', 'context_bin')
+# 多轮会话按累计上下文长度分组的区间边界 (token)
+CONTEXT_BIN_EDGES = (1024, 2048, 4096, 8192, 16384, 32768, 65536, 131072)
+
+
+# 扫描测试的进度清单 (位于输出目录下)，用于中断后继续
+MANIFEST_FILE = 'run_manifest.json'
+# 进度清单中记录的扫描配置，配置相同时才能从中断处继续
+SWEEP_CONFIG_KEYS = ('model', 'base_url', 'input_file', 'workers', 'transport', 'keep_response', 'think_time',
+                     'warmup_requests', 'warmup_seconds', 'ttft_slo', 'tpot_slo', 'max_requests',
+                     'endpoints', 'timeouts')
+
+
+def context_bin(tokens: int) -> str:
+    """返回上下文长度所在的区间标签，如 2k-4k"""
+    lower = 0
+    for edge in CONTEXT_BIN_EDGES:
+        if tokens < edge:
+            return f"{lower // 1024}k-{edge // 1024}k"
+        lower = edge
+    return f"{lower // 1024}k+"
+
+
+def result_path(output_file: str, suffix: str, extension: str = '.csv') -> str:
+    """根据逐请求结果文件名生成关联文件名，如 xxx.jsonl -> xxx_stats.csv"""
+    return f"{os.path.splitext(output_file)[0]}_{suffix}{extension}"
+
+
+def measured_results(chunk: 'pd.DataFrame') -> 'pd.DataFrame':
+    """去掉预热阶段的请求，预热请求写入结果文件但不计入统计"""
+    if 'warmup' in chunk.columns:
+        # 只有预热请求带warmup字段，其他行 (包括恢复前写入的行) 读出为NaN，ne(True)将其保留
+        return chunk[chunk['warmup'].ne(True)]
+    return chunk
+
+
+def count_client_bound(output_file: str) -> int:
+    """统计客户端开销超过阈值 (标记为client_bound) 的计入统计的请求数"""
+    count = 0
+    for chunk in iter_result_chunks(output_file, columns=['warmup', 'client_bound']):
+        if 'client_bound' in chunk.columns:
+            count += int(measured_results(chunk)['client_bound'].eq(True).sum())
+    return count
+
+
+def build_timeline(output_file: str, bin_width: float = 1.0,
+                   ttft_slo: float = None, tpot_slo: float = None) -> ThroughputTimeline:
+    """根据结果文件中各请求的开始/结束时间构建吞吐量时间线，失败的请求只计入在途请求数和失败数"""
+    timeline = ThroughputTimeline(bin_width=bin_width, ttft_slo=ttft_slo, tpot_slo=tpot_slo)
+    columns = ['status', 'warmup', 'start_time', 'end_time', 'ttft', 'tpot', 'input_tokens', 'output_tokens']
+    for chunk in iter_result_chunks(output_file, columns=columns):
+        timeline.add_frame(measured_results(chunk))
+    return timeline
+
+
+def endpoint_table(output_file: str) -> 'pd.DataFrame':
+    """多端点测试中按端点汇总请求数、错误率、延迟分位数和吞吐量"""
+    import pandas as pd
+    groups = {}
+    columns = ['status', 'warmup', 'endpoint', 'start_time', 'end_time', 'ttft', 'tpot', 'latency',
+               'input_tokens', 'output_tokens']
+    for chunk in iter_result_chunks(output_file, columns=columns):
+        chunk = measured_results(chunk)
+        if 'endpoint' not in chunk.columns:
+            continue
+        for name, group in chunk.groupby('endpoint'):
+            entry = groups.setdefault(name, {
+                'requests': 0,
+                'failed': 0,
+                'timeline': ThroughputTimeline(),
+                'histograms': {metric: LatencyHistogram() for metric in ('ttft', 'tpot', 'latency')},
+            })
+            successful = group[group['status'] == 'success']
+            entry['requests'] += len(group)
+            entry['failed'] += len(group) - len(successful)
+            for metric, histogram in entry['histograms'].items():
+                if metric in successful.columns:
+                    histogram.record_many(successful[metric].dropna())
+            entry['timeline'].add_frame(group)
+    
+    rows = {}
+    for name in sorted(groups):
+        entry = groups[name]
+        histograms = entry['histograms']
+        throughput = entry['timeline'].throughput()
+        rows[name] = {
+            'requests': entry['requests'],
+            'error_rate': entry['failed'] / entry['requests'],
+            'ttft_p50': histograms['ttft'].percentile(50),
+            'ttft_p99': histograms['ttft'].percentile(99),
+            'tpot_p50': histograms['tpot'].percentile(50),
+            'tpot_p99': histograms['tpot'].percentile(99),
+            'latency_p99': histograms['latency'].percentile(99),
+            'rps': throughput['rps'],
+            'output_tps': throughput['output_tps'],
+        }
+    return pd.DataFrame(rows).T
+
+
+def timeline_bin_width(median_latency: float) -> float:
+    """时间桶宽度取1秒与请求延迟中位数 (毫秒) 的较大者，使每个桶内都有请求完成"""
+    if median_latency is None or np.isnan(median_latency):
+        return 1.0
+    return max(1.0, median_latency / 1000)
+
 
 class PerformanceMonitor:
     def __init__(self):
@@ -27,16 +177,25 @@ class PerformanceMonitor:
             'ttft': 0,        # Time To First Token
             'tpot': 0,        # Time Per Output Token
             'latency': 0,     # Overall Latency
-            'tps': 0,         # Tokens Per Second
-            'rps': 0          # Requests Per Second
+            'decode_tps': 0   # 单个请求的解码速度 (tokens/s)
         }
+        # 整个测试的延迟分布，逐请求在线更新，不保存原始样本
+        self.histograms = {metric: LatencyHistogram() for metric in LATENCY_METRICS}
+        # 分组的TTFT分布：维度 -> 分组 -> 直方图
+        self.breakdowns: Dict[str, Dict[str, LatencyHistogram]] = {}
+    
+    @staticmethod
+    def inter_token_latencies(chunk_times: array) -> np.ndarray:
+        """根据各个输出chunk的到达时间戳计算token间延迟 (毫秒)"""
+        return np.diff(np.frombuffer(chunk_times, dtype=np.float64)) * 1000
     
     def calculate_metrics(self, 
                          start_time: float,
                          first_token_time: float,
                          end_time: float,
                          input_tokens: int,
-                         output_tokens: int) -> Dict:
+                         output_tokens: int,
+                         chunk_times: array = None) -> Dict:
         """计算所有性能指标"""
         # 基础时间计算
         total_time = end_time - start_time
@@ -51,11 +210,13 @@ class PerformanceMonitor:
         # 3. Latency (Total Response Time)
         latency = total_time * 1000  # 转换为毫秒
         
-        # 4. TPS (Tokens Per Second)
-        tps = output_tokens / total_time if total_time > 0 else 0
+        # 4. 解码速度：单个请求首个token之后每秒生成的token数，并非系统整体吞吐量
+        decode_tps = output_tokens / generation_time if generation_time > 0 else 0
         
-        # 5. RPS (Requests Per Second)
-        rps = 1 / total_time if total_time > 0 else 0
+        # 5. ITL (Inter-Token Latency)，用最大值暴露抢占、KV cache换出等造成的解码停顿
+        itls = self.inter_token_latencies(chunk_times) if chunk_times is not None else np.empty(0)
+        itl_p50 = float(np.median(itls)) if itls.size else 0
+        itl_max = float(itls.max()) if itls.size else 0
         
         return {
             'input_tokens': input_tokens,
@@ -63,60 +224,296 @@ class PerformanceMonitor:
             'ttft': ttft,
             'tpot': tpot,
             'latency': latency,
-            'tps': tps,
-            'rps': rps
+            'decode_tps': decode_tps,
+            'itl_p50': itl_p50,
+            'itl_max': itl_max,
+            'itls': itls
         }
+    
+    def record(self, metrics: Dict):
+        """将单个请求的指标计入延迟分布直方图"""
+        for metric in ('ttft', 'tpot', 'latency', 'queue_delay'):
+            self.histograms[metric].record(metrics[metric])
+        self.histograms['itl'].record_many(metrics['itls'])
+        self.histograms['ttft_censored'].record(metrics['ttft'])
+        self.histograms['latency_censored'].record(metrics['latency'])
+    
+    def record_failure(self, count: int = 1):
+        """将失败请求作为删失样本计入包含失败请求的TTFT和延迟分布"""
+        self.histograms['ttft_censored'].record_censored(count)
+        self.histograms['latency_censored'].record_censored(count)
+    
+    def record_breakdown(self, dimension: str, group: str, ttft: float):
+        """将单个请求的TTFT计入某个维度下的分组分布"""
+        group = str(group)
+        groups = self.breakdowns.setdefault(dimension, {})
+        if group not in groups:
+            groups[group] = LatencyHistogram()
+        groups[group].record(ttft)
+    
+    def to_dict(self) -> Dict:
+        data = {metric: histogram.to_dict() for metric, histogram in self.histograms.items()}
+        if self.breakdowns:
+            data['breakdowns'] = {
+                dimension: {group: histogram.to_dict() for group, histogram in groups.items()}
+                for dimension, groups in self.breakdowns.items()
+            }
+        return data
+    
+    def merge(self, histograms: Dict):
+        """合并其他进程序列化后的延迟分布"""
+        for metric, data in histograms.items():
+            if metric == 'breakdowns':
+                for dimension, groups in data.items():
+                    for group, group_data in groups.items():
+                        target = self.breakdowns.setdefault(dimension, {})
+                        if group not in target:
+                            target[group] = LatencyHistogram()
+                        target[group].merge(LatencyHistogram.from_dict(group_data))
+                continue
+            self.histograms[metric].merge(LatencyHistogram.from_dict(data))
+    
+    def save(self, path: str):
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.to_dict(), file)
+    
+    def load(self, path: str):
+        with open(path, encoding='utf-8') as file:
+            self.merge(json.load(file))
+    
+    def percentile_table(self) -> 'pd.DataFrame':
+        """返回各延迟指标的分位数统计表"""
+        import pandas as pd
+        return pd.DataFrame({
+            metric: histogram.summary() for metric, histogram in self.histograms.items()
+        }).T.round(2)
+    
+    def breakdown_table(self, dimension: str) -> 'pd.DataFrame':
+        """返回某个维度下各分组的TTFT分位数统计表"""
+        import pandas as pd
+        groups = self.breakdowns.get(dimension, {})
+        
+        def sort_key(group: str):
+            # 数值型分组 (轮次、上下文区间) 按数值排序
+            match = re.match(r'\d+', group)
+            return (0, int(match.group()), group) if match else (1, 0, group)
+        
+        return pd.DataFrame({
+            group: groups[group].summary() for group in sorted(groups, key=sort_key)
+        }).T.round(2)
 
 
 class BatchProcessor:
-    def __init__(self, api_key: str, base_url: str = None, model: str = "gpt-3.5-turbo", batch_size: int = 5):
-        # 配置OpenAI客户端
-        client_params = {
-            "api_key": api_key,
-        }
-        if base_url:
-            client_params["base_url"] = base_url
-            
-        self.client = AsyncOpenAI(**client_params)
+    def __init__(self, api_key: str, base_url: str = None, model: str = "gpt-3.5-turbo", batch_size: int = 5,
+                 schedule: Union[ArrivalSchedule, ConcurrencySchedule, TraceSchedule] = None,
+                 use_server_usage: bool = True, tokenizer_threads: int = 4,
+                 transport: str = 'openai', http_options: Dict = None,
+                 keep_response: bool = True, think_time: float = 0.0, max_requests: int = None,
+                 warmup_requests: int = 0, warmup_seconds: float = 0.0,
+                 ttft_slo: float = None, tpot_slo: float = None, live_metrics: LiveMetrics = None,
+                 overhead_threshold: float = 10.0, profile: bool = False,
+                 endpoints: List[Dict] = None, routing: str = 'round_robin', timeouts: Dict = None):
+        # 各阶段的超时 (秒)：connect由传输层限制，ttft/stall/total到期时客户端取消请求并关闭流
+        self.timeouts = {phase: (timeouts or {}).get(phase) for phase in TIMEOUT_PHASES}
+        # 配置客户端传输层：openai SDK或基于aiohttp连接池的原生HTTP；
+        # 指定endpoints时按routing策略将请求分配到多个端点 (副本或模型)，每个端点各自一个传输层
+        self.pool = EndpointPool(endpoints or [{'base_url': base_url, 'model': model}], policy=routing,
+                                 transport=transport, api_key=api_key, http_options=http_options,
+                                 connect_timeout=self.timeouts['connect'])
+        # 多端点时model只用于选择客户端tokenizer
         self.model = model
         self.batch_size = batch_size
         self.base_url = base_url
+        # 为None时使用按batch分批的闭环模式，
+        # ArrivalSchedule为开环速率模式，ConcurrencySchedule为滑动窗口并发模式，
+        # TraceSchedule为轨迹回放模式
+        self.schedule = schedule
         
-        # 初始化tokenizer
-        try:
-            self.encoding = tiktoken.encoding_for_model(model)
-        except KeyError:
-            print(f"Warning: No specific tokenizer found for {model}, using cl100k_base instead")
-            self.encoding = tiktoken.get_encoding("cl100k_base")
+        # tokenizer在第一次计算token数时加载 (见encoding)，输入token数已由主进程算好的负载进程不需要加载
+        self._encoding = None
+        
+        # tokenizer在线程池中运行，避免阻塞事件循环、污染其他在途请求的计时
+        self.token_executor = ThreadPoolExecutor(max_workers=tokenizer_threads, thread_name_prefix='tokenizer')
+        # 以prompt的哈希为键缓存输入token数，每个数据集只计算一次
+        self.prompt_token_cache: Dict[bytes, int] = {}
+        # 通过stream_options.include_usage向服务端获取输出token数，无需在客户端重新分词
+        self.use_server_usage = use_server_usage
+        # 为False时不保留响应文本，只增量统计输出的chunk数和字节数
+        self.keep_response = keep_response
+        # 多轮会话中收到回复后到发送下一轮的平均思考时间 (秒)，按指数分布采样
+        self.think_time = think_time
+        self.think_rng = np.random.default_rng()
+        # 只使用输入文件的前max_requests行，用于短时探测；速率模式下行数不足时循环使用 (见load_requests)
+        self.max_requests = max_requests
+        # 预热阶段：最先发送的warmup_requests个请求及开始发送后warmup_seconds秒内发送的请求，
+        # 结果标记为warmup写入文件，不计入统计
+        self.warmup_requests = warmup_requests
+        self.warmup_seconds = warmup_seconds
+        self.dispatched = 0
+        self.dispatch_start: float = None
+        # 计算goodput的逐请求TTFT/TPOT目标 (毫秒)
+        self.ttft_slo = ttft_slo
+        self.tpot_slo = tpot_slo
             
         self.performance_monitor = PerformanceMonitor()
+        # 逐请求结果的增量汇总，结果本身由writer写入文件，不在内存中保留
+        self.summary = ResultSummary(SUMMARY_METRICS)
+        self.writer: ResultWriter = None
+        # 附加到每条结果上的标签，如多进程模式下的worker_id
+        self.result_tags: Dict = {}
+        # 实时指标，进度条和/metrics接口每秒从中读取
+        self.live = live_metrics or LiveMetrics()
+        # 事件循环延迟监控：请求的客户端开销 (发送前准备 + 等待首个token期间的事件循环延迟)
+        # 超过overhead_threshold毫秒时，结果标记为client_bound
+        self.loop_monitor = LoopLagMonitor()
+        self.overhead_threshold = overhead_threshold
+        # 为True时采样分析process_single_request内部的客户端热点
+        self.profiler = SamplingProfiler() if profile else None
         
+    @property
+    def encoding(self):
+        if self._encoding is None:
+            self._encoding = load_encoding(self.model)
+        return self._encoding
+
     def count_tokens(self, text: str) -> int:
         return len(self.encoding.encode(text))
 
-    async def process_single_request(self, prompt: str) -> Dict:
-        start_time = time.time()
+    @staticmethod
+    def _prompt_key(prompt: str) -> bytes:
+        return hashlib.blake2b(prompt.encode('utf-8'), digest_size=16).digest()
+
+    async def count_tokens_async(self, text: str) -> int:
+        """在线程池中计算token数"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.token_executor, self.count_tokens, text)
+
+    async def precompute_prompt_tokens(self, prompts: List[str]):
+        """发送请求前批量计算所有prompt的token数并缓存"""
+        pending = {}
+        for prompt in prompts:
+            key = self._prompt_key(prompt)
+            if key not in self.prompt_token_cache:
+                pending[key] = prompt
+        if not pending:
+            return
+        
+        loop = asyncio.get_running_loop()
+        token_lists = await loop.run_in_executor(
+            self.token_executor, self.encoding.encode_batch, list(pending.values())
+        )
+        for key, tokens in zip(pending, token_lists):
+            self.prompt_token_cache[key] = len(tokens)
+
+    def cached_prompt_tokens(self, requests: List[Dict]) -> Dict[bytes, int]:
+        """返回requests中各prompt已缓存的输入token数，传给负载进程"""
+        cache = {}
+        for prompt in self.request_prompts(requests):
+            key = self._prompt_key(prompt)
+            if key in self.prompt_token_cache:
+                cache[key] = self.prompt_token_cache[key]
+        return cache
+
+    async def prompt_tokens(self, prompt: str) -> int:
+        """返回prompt的token数，优先使用缓存"""
+        key = self._prompt_key(prompt)
+        tokens = self.prompt_token_cache.get(key)
+        if tokens is None:
+            tokens = await self.count_tokens_async(prompt)
+            self.prompt_token_cache[key] = tokens
+        return tokens
+
+    async def process_single_request(self, prompt: str, scheduled_time: float = None,
+                                     max_tokens: int = None, messages: List[Dict] = None,
+                                     record_metrics: bool = True, input_tokens: int = None) -> Dict:
+        start_time = clock()
         first_token_time = None
+        # 排队延迟：计划发送时刻到实际发送时刻的时间 (毫秒)，与服务端延迟分开统计
+        queue_delay = (start_time - scheduled_time) * 1000 if scheduled_time is not None else 0.0
+        self.live.started()
+        # 传输层记录的各阶段时刻 (连接建立、请求发送完成、收到响应头)
+        phases = {}
+        endpoint = None
+        stream = None
+        watchdog = None
+        # 多端点测试时在结果中记录请求发往的端点
+        tags = {}
         
         try:
-            input_tokens = self.count_tokens(prompt)
+            # messages不为空时发送多轮会话的完整上下文，prompt为其中最后一轮的用户消息，
+            # 此时总是收集回复文本，作为下一轮的上下文
+            keep_text = self.keep_response or messages is not None
+            if messages is None:
+                messages = [{"role": "user", "content": prompt}]
+            # 调用方已知输入token数时 (如回放轨迹中合成的prompt、多轮会话的上下文) 不再重新计算
+            if input_tokens is None:
+                input_tokens = 0
+                for message in messages:
+                    input_tokens += await self.prompt_tokens(message['content'])
             
             # 创建聊天完成请求
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                stream=True
+            request_params = {}
+            if self.use_server_usage:
+                request_params['stream_options'] = {"include_usage": True}
+            if max_tokens is not None:
+                request_params['max_tokens'] = max_tokens
+            # 准备完成后再选择端点，使在途请求数只包含已发往端点的请求
+            endpoint = self.pool.acquire()
+            if len(self.pool) > 1:
+                tags['endpoint'] = endpoint.name
+            stream = endpoint.transport.stream_chat(
+                endpoint.model,
+                messages,
+                phases=phases,
+                **request_params
             )
+            if self.timeouts['ttft'] or self.timeouts['stall'] or self.timeouts['total']:
+                watchdog = StreamWatchdog(ttft=self.timeouts['ttft'], stall=self.timeouts['stall'],
+                                          total=self.timeouts['total'])
+            send_time = clock()
+            lag_at_send = self.loop_monitor.total_lag
+            lag_at_first_token = None
             
-            full_response = ""
-            async for chunk in response:
-                if first_token_time is None:
-                    first_token_time = time.time()
-                if chunk.choices[0].delta.content is not None:
-                    full_response += chunk.choices[0].delta.content
+            # 响应片段先收集到列表中，结束后一次性拼接，避免逐chunk拼接字符串的重复拷贝
+            response_parts = []
+            output_bytes = 0
+            usage = None
+            # 每个输出chunk的到达时间戳，使用紧凑的double数组存储
+            chunk_times = array('d')
+            async for content, chunk_usage in stream:
+                if watchdog is not None:
+                    watchdog.touch()
+                # include_usage时最后一个chunk只携带usage，不含输出内容
+                if chunk_usage is not None:
+                    usage = chunk_usage
+                # 只携带role的首个delta和只携带usage的最后一个chunk都不算输出token
+                if content:
+                    now = clock()
+                    if first_token_time is None:
+                        first_token_time = now
+                        lag_at_first_token = self.loop_monitor.total_lag
+                    chunk_times.append(now)
+                    output_bytes += len(content.encode('utf-8'))
+                    if keep_text:
+                        response_parts.append(content)
             
-            end_time = time.time()
-            output_tokens = self.count_tokens(full_response)
+            end_time = clock()
+            if watchdog is not None:
+                watchdog.stop()
+            if first_token_time is None:
+                # 没有首个token时TTFT、TPOT等指标无定义
+                raise EmptyResponseError(usage)
+            full_response = "".join(response_parts) if keep_text else None
+            if usage is not None and usage.get('completion_tokens') is not None:
+                output_tokens = usage['completion_tokens']
+                output_tokens_source = 'usage'
+            elif keep_text:
+                output_tokens = await self.count_tokens_async(full_response)
+                output_tokens_source = 'tokenizer'
+            else:
+                # 既无usage也未保留文本时，按输出chunk数估算 (多数推理服务每个chunk对应一个token)
+                output_tokens = len(chunk_times)
+                output_tokens_source = 'chunks'
             
             # 计算所有性能指标
             metrics = self.performance_monitor.calculate_metrics(
@@ -124,62 +521,556 @@ class BatchProcessor:
                 first_token_time=first_token_time,
                 end_time=end_time,
                 input_tokens=input_tokens,
-                output_tokens=output_tokens
+                output_tokens=output_tokens,
+                chunk_times=chunk_times
             )
+            metrics['queue_delay'] = queue_delay
+            metrics.update(self.client_timing(start_time, send_time, phases, lag_at_first_token - lag_at_send,
+                                              chunk_times))
+            if record_metrics:
+                self.performance_monitor.record(metrics)
+            self.live.finished(metrics['ttft'], metrics['itls'], input_tokens, output_tokens)
+            # 原始ITL样本已计入直方图，不保留在结果中
+            metrics.pop('itls')
 
+            result = {"prompt": prompt, **tags}
+            if metrics['client_overhead_ms'] > self.overhead_threshold:
+                result["client_bound"] = True
+            if keep_text:
+                result["response"] = full_response
+            if max_tokens is not None:
+                result["max_tokens"] = max_tokens
+            # 服务端开启前缀缓存时，usage中会返回命中缓存的输入token数
+            prompt_details = (usage or {}).get('prompt_tokens_details') or {}
+            if prompt_details.get('cached_tokens') is not None:
+                result["cached_tokens"] = prompt_details['cached_tokens']
             return {
-                "prompt": prompt,
-                "response": full_response,
+                **result,
                 **metrics,
+                "output_bytes": output_bytes,
+                "output_tokens_source": output_tokens_source,
+                "start_time": start_time,
+                "end_time": end_time,
                 "status": "success"
             }
             
-        except Exception as e:
-            return {
+        except (Exception, asyncio.CancelledError) as e:
+            end_time = clock()
+            if isinstance(e, asyncio.CancelledError):
+                # 只处理超时引起的取消，测试被中断等外部取消继续向上传播
+                if watchdog is None or watchdog.expired is None:
+                    raise
+                uncancel = getattr(asyncio.current_task(), 'uncancel', None)
+                if uncancel is not None:
+                    uncancel()
+                e = RequestTimeoutError(watchdog.expired, watchdog.timeout())
+            error_type = classify_error(e, phases)
+            self.live.failed(error_type)
+            result = {
                 "prompt": prompt,
-                "error": str(e),
-                "status": "failed"
+                **tags,
+                "queue_delay": queue_delay,
+                "error": str(e) or type(e).__name__,
+                "error_type": error_type,
             }
+            if isinstance(e, RequestTimeoutError):
+                result["timeout_phase"] = e.phase
+            # 失败前已经过的时间及收到的输出，真实的TTFT/延迟不小于此
+            result["elapsed_ms"] = (end_time - start_time) * 1000
+            if first_token_time is not None:
+                result["first_token_ms"] = (first_token_time - start_time) * 1000
+            return {**result, "start_time": start_time, "end_time": end_time, "status": "failed"}
+        finally:
+            if watchdog is not None:
+                watchdog.stop()
+            if stream is not None:
+                # 取消或出错时关闭流，释放连接
+                await stream.aclose()
+            if endpoint is not None:
+                self.pool.release(endpoint)
+
+    @staticmethod
+    def client_timing(start_time: float, send_time: float, phases: Dict, loop_lag: float,
+                      chunk_times: array) -> Dict:
+        """各阶段相对请求开始的时刻 (毫秒) 及客户端开销，chunk_times为各输出chunk的到达时刻 (不能为空)"""
+        prepare_ms = (send_time - start_time) * 1000
+        timing = {'prepare_ms': prepare_ms}
+        for phase in ('connected', 'sent', 'first_byte'):
+            if phase in phases:
+                name = 'connect_ms' if phase == 'connected' else f'{phase}_ms'
+                timing[name] = (phases[phase] - start_time) * 1000
+        timing['first_content_ms'] = (chunk_times[0] - start_time) * 1000
+        timing['last_token_ms'] = (chunk_times[-1] - start_time) * 1000
+        if 'reused' in phases:
+            timing['connection_reused'] = phases['reused']
+        timing['loop_lag_ms'] = loop_lag
+        # 计入TTFT的客户端时间：发送前的准备 (分词等) 及等待首个token期间事件循环被阻塞的时间
+        timing['client_overhead_ms'] = prepare_ms + loop_lag
+        return timing
+
+    async def _run_request(self, request: Dict, scheduled_time: float = None):
+        """执行单个请求 (或一个多轮会话)，并将结果计入汇总、交给后台任务写入结果文件"""
+        warmup = self._is_warmup()
+        if 'turns' in request:
+            await self._run_session(request, scheduled_time=scheduled_time, warmup=warmup)
+            return
+        result = await self.process_single_request(request['prompt'], scheduled_time=scheduled_time,
+                                                   max_tokens=request.get('max_tokens'),
+                                                   input_tokens=request.get('input_tokens'),
+                                                   record_metrics=not warmup)
+        self._record_result(request, result, warmup=warmup)
+
+    def _is_warmup(self) -> bool:
+        """判断当前发送的请求 (或会话) 是否属于预热阶段"""
+        now = clock()
+        if self.dispatch_start is None:
+            self.dispatch_start = now
+        self.dispatched += 1
+        return self.dispatched <= self.warmup_requests or now - self.dispatch_start < self.warmup_seconds
+
+    async def _run_session(self, session: Dict, scheduled_time: float = None, warmup: bool = False):
+        """依次发送会话的各轮请求，每轮带上之前所有轮次的用户消息和回复"""
+        messages = []
+        # 上下文的输入token数在各轮计时开始前累加，客户端分词不计入TTFT和延迟
+        context_tokens = 0
+        turns = session['turns']
+        for number, turn in enumerate(turns, 1):
+            if number > 1 and self.think_time > 0:
+                await asyncio.sleep(self.think_rng.exponential(self.think_time))
+            messages.append({"role": "user", "content": turn['prompt']})
+            context_tokens += await self.prompt_tokens(turn['prompt'])
+            # 恢复中断的测试时，未完成的会话从头重放以重建上下文，已写入的轮次不再重复记录
+            replayed = turn['prompt_index'] in session['completed']
+            # 调度时刻只对会话的第一轮有意义，后续轮次在上一轮完成后立即发送
+            result = await self.process_single_request(
+                turn['prompt'],
+                scheduled_time=scheduled_time if number == 1 else None,
+                max_tokens=turn.get('max_tokens'),
+                messages=list(messages),
+                record_metrics=not (replayed or warmup),
+                input_tokens=context_tokens
+            )
+            response = result.get('response') if self.keep_response else result.pop('response', None)
+            result['session_id'] = session['session_id']
+            result['turn'] = number
+            if result['status'] == 'success':
+                result['context_bin'] = context_bin(result['input_tokens'])
+            if not replayed:
+                self._record_result(turn, result, warmup=warmup)
+            
+            if result['status'] != 'success':
+                # 后续轮次依赖本轮回复，会话无法继续，剩余轮次记为失败
+                for skipped_number, skipped in enumerate(turns[number:], number + 1):
+                    if skipped['prompt_index'] not in session['completed']:
+                        self._record_result(skipped, {
+                            "prompt": skipped['prompt'],
+                            "queue_delay": 0.0,
+                            "error": f"会话在第{number}轮失败，未发送",
+                            "error_type": "session_aborted",
+                            "status": "failed",
+                            "session_id": session['session_id'],
+                            "turn": skipped_number
+                        }, warmup=warmup)
+                return
+            messages.append({"role": "assistant", "content": response})
+            # 回复不在预先计算的缓存中，在两轮之间计算
+            context_tokens += await self.count_tokens_async(response)
 
-    async def process_batch(self, prompts: List[str]) -> List[Dict]:
-        tasks = [self.process_single_request(prompt) for prompt in prompts]
-        return await asyncio.gather(*tasks)
+    def _record_result(self, request: Dict, result: Dict, warmup: bool = False):
+        result['prompt_index'] = request['prompt_index']
+        if 'prefix_id' in request:
+            result['prefix_id'] = request['prefix_id']
+            if result['status'] == 'success':
+                # 优先使用服务端返回的缓存命中token数，否则按前缀是否已经发送过推断
+                if 'cached_tokens' in result:
+                    result['prefix_cache'] = 'hit' if result['cached_tokens'] > 0 else 'miss'
+                else:
+                    result['prefix_cache'] = request['expected_cache']
+        result.update(self.result_tags)
+        if warmup:
+            result['warmup'] = True
+            if self.writer is not None:
+                self.writer.write(result)
+            return
+        self.summary.add(result)
+        if result['status'] == 'success':
+            for dimension in BREAKDOWN_DIMENSIONS:
+                if dimension in result:
+                    self.performance_monitor.record_breakdown(dimension, result[dimension], result['ttft'])
+        else:
+            self.performance_monitor.record_failure()
+        if self.writer is not None:
+            self.writer.write(result)
 
-    async def process_all(self, input_file: str, output_file: str):
-        df = pd.read_csv(input_file)
-        prompts = df['prompt'].tolist()
+    @staticmethod
+    def request_size(request: Dict) -> int:
+        """请求包含的待记录结果数：普通请求为1，多轮会话为尚未完成的轮数"""
+        if 'turns' in request:
+            return len(request['turns']) - len(request['completed'])
+        return 1
+
+    async def process_batch(self, requests: List[Dict]):
+        tasks = [self._run_request(request) for request in requests]
+        await asyncio.gather(*tasks)
+
+    async def _process_limited(self, limiter: ConcurrencyLimiter, request: Dict,
+                               scheduled_time: float = None, acquired: bool = False):
+        """在并发上限内执行单个请求，完成后释放并发名额"""
+        if not acquired:
+            await limiter.acquire()
+        try:
+            await self._run_request(request, scheduled_time=scheduled_time)
+        finally:
+            await limiter.release()
+
+    async def _follow_ramp(self, limiter: ConcurrencyLimiter, test_start: float):
+        """按并发调度周期性调整并发上限"""
+        while True:
+            await limiter.set_limit(self.schedule.limit_at(clock() - test_start))
+            await asyncio.sleep(0.1)
+
+    @staticmethod
+    def _track(task: asyncio.Task, pending: set, pbar: tqdm, size: int = 1):
+        """记录在途任务，完成后立即释放，避免长时间测试中保留已完成的任务"""
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+        task.add_done_callback(lambda _: pbar.update(size))
+
+    async def process_open_loop(self, requests: List[Dict], pbar: tqdm):
+        """开环模式：按到达调度发送请求，不等待之前的请求完成"""
+        offsets = self.schedule.offsets(len(requests))
+        limiter = None
+        if self.schedule.max_concurrency is not None:
+            limiter = ConcurrencyLimiter(self.schedule.max_concurrency)
+        test_start = clock()
+        
+        pending = set()
+        for request, offset in zip(requests, offsets):
+            scheduled_time = test_start + offset
+            delay = scheduled_time - clock()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if limiter is None:
+                coro = self._run_request(request, scheduled_time=scheduled_time)
+            else:
+                coro = self._process_limited(limiter, request, scheduled_time=scheduled_time)
+            self._track(asyncio.create_task(coro), pending, pbar, self.request_size(request))
         
-        results = []
-        with tqdm(total=len(prompts)) as pbar:
-            for i in range(0, len(prompts), self.batch_size):
-                batch = prompts[i:i + self.batch_size]
-                batch_results = await self.process_batch(batch)
-                results.extend(batch_results)
-                pbar.update(len(batch))
-
-        successful_results = [r for r in results if r["status"] == "success"]
-        if successful_results:
-            df_results = pd.DataFrame(successful_results)
+        await asyncio.gather(*pending)
+
+    async def process_sliding_window(self, requests: List[Dict], pbar: tqdm):
+        """滑动窗口模式：任一请求完成后立即发送下一个请求，保持在途请求数等于并发上限"""
+        test_start = clock()
+        limiter = ConcurrencyLimiter(self.schedule.limit_at(0))
+        ramp_task = asyncio.create_task(self._follow_ramp(limiter, test_start))
+        
+        pending = set()
+        try:
+            for request in requests:
+                # 先获取名额再创建任务，保证请求按输入顺序发送
+                await limiter.acquire()
+                self._track(asyncio.create_task(self._process_limited(limiter, request, acquired=True)),
+                            pending, pbar, self.request_size(request))
+            await asyncio.gather(*pending)
+        finally:
+            ramp_task.cancel()
+
+    async def process_trace(self, trace_file: str, pbar: tqdm, completed: Set[int] = frozenset()):
+        """轨迹回放模式：逐块读取轨迹，按记录的到达时刻 (经time_scale缩放) 发送请求
+
+        轨迹带有prompt时计算其token数，只有长度时合成恰好为该长度的prompt；
+        在途请求之外只保留当前读取的一块轨迹，不会将整个轨迹加载到内存
+        """
+        reader = TraceReader(trace_file)
+        synthesizer = PromptSynthesizer(self.encoding) if reader.input_column else None
+        limiter = None
+        if self.schedule.max_concurrency is not None:
+            limiter = ConcurrencyLimiter(self.schedule.max_concurrency)
+        loop = asyncio.get_running_loop()
+        chunks = reader.chunks()
+        # 第一块轨迹准备完毕后才开始计时
+        test_start = None
+        
+        pending = set()
+        while True:
+            # 在线程中读取下一块，避免阻塞在途请求的计时
+            chunk = await loop.run_in_executor(None, next, chunks, None)
+            if chunk is None:
+                break
+            chunk = [request for request in chunk
+                     if self.schedule.owns(request['prompt_index']) and request['prompt_index'] not in completed]
             
+            texts = [request for request in chunk if 'prompt' in request]
+            if texts:
+                token_lists = await loop.run_in_executor(
+                    self.token_executor, self.encoding.encode_batch, [request['prompt'] for request in texts]
+                )
+                for request, tokens in zip(texts, token_lists):
+                    request['input_tokens'] = len(tokens)
+            synthesized = [request for request in chunk if 'prompt' not in request]
+            if synthesized:
+                prompts = await loop.run_in_executor(None, lambda: [
+                    synthesizer.prompt(request['input_tokens'], request['prompt_index']) for request in synthesized
+                ])
+                for request, prompt in zip(synthesized, prompts):
+                    request['prompt'] = prompt
+            
+            if test_start is None:
+                test_start = clock()
+            for request in chunk:
+                scheduled_time = test_start + self.schedule.offset(request['arrival'])
+                delay = scheduled_time - clock()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if limiter is None:
+                    coro = self._run_request(request, scheduled_time=scheduled_time)
+                else:
+                    coro = self._process_limited(limiter, request, scheduled_time=scheduled_time)
+                self._track(asyncio.create_task(coro), pending, pbar)
+        
+        await asyncio.gather(*pending)
+
+    async def run_requests(self, requests: List[Dict], pbar: tqdm):
+        """按负载模式发送所有请求，结果在完成时逐条计入汇总和结果文件"""
+        if isinstance(self.schedule, ArrivalSchedule):
+            await self.process_open_loop(requests, pbar)
+        elif isinstance(self.schedule, ConcurrencySchedule):
+            await self.process_sliding_window(requests, pbar)
+        else:
+            for i in range(0, len(requests), self.batch_size):
+                batch = requests[i:i + self.batch_size]
+                await self.process_batch(batch)
+                pbar.update(sum(self.request_size(request) for request in batch))
+
+    def load_requests(self, input_file: str, output_file: str = None, resume: bool = False) -> List[Dict]:
+        """读取输入文件中的请求；resume时跳过output_file中已写入的请求，并恢复其统计结果"""
+        import pandas as pd
+        df = pd.read_csv(input_file, nrows=self.max_requests)
+        # 开环速率模式按请求数控制探测时长 (见run_slo_search)：prompt少于max_requests时循环使用，
+        # 否则数据集发完后探测提前结束，延迟还未进入稳态
+        if isinstance(self.schedule, ArrivalSchedule) and self.max_requests and 0 < len(df) < self.max_requests:
+            if 'session_id' in df.columns:
+                print(f"Warning: 输入文件只有 {len(df)} 个prompt，少于所需的 {self.max_requests} 个请求，"
+                      f"多轮会话数据集不循环使用，测试将提前结束")
+            else:
+                print(f"Warning: 输入文件只有 {len(df)} 个prompt，少于所需的 {self.max_requests} 个请求，"
+                      f"循环使用 (重复的prompt可能命中服务端前缀缓存)")
+                df = df.iloc[np.resize(np.arange(len(df)), self.max_requests)].reset_index(drop=True)
+        requests = [
+            {'prompt_index': index, 'prompt': prompt}
+            for index, prompt in enumerate(df['prompt'].tolist())
+        ]
+        # 输入文件带有max_tokens列时 (见prompt_generator的目标长度模式)，按每个prompt的目标输出长度发送
+        if 'max_tokens' in df.columns:
+            for request, max_tokens in zip(requests, df['max_tokens'].tolist()):
+                if pd.notna(max_tokens):
+                    request['max_tokens'] = int(max_tokens)
+        # 共享前缀数据集：每个前缀第一次出现的请求预期未命中缓存，之后的请求预期命中
+        if 'prefix_id' in df.columns:
+            seen_prefixes = set()
+            for request, prefix_id in zip(requests, df['prefix_id'].tolist()):
+                request['prefix_id'] = int(prefix_id)
+                if prefix_id >= 0 and prefix_id in seen_prefixes:
+                    request['expected_cache'] = 'hit'
+                else:
+                    request['expected_cache'] = 'miss'
+                    seen_prefixes.add(prefix_id)
+        # 多轮会话数据集：同一session_id的各轮组成一个会话，以会话为单位调度
+        if 'session_id' in df.columns:
+            sessions = {}
+            order = df['turn'].tolist() if 'turn' in df.columns else range(len(df))
+            for request, session_id, turn in zip(requests, df['session_id'].tolist(), order):
+                sessions.setdefault(session_id, []).append((turn, request))
+            requests = []
+            for session_id, turns in sessions.items():
+                turns = [request for _, request in sorted(turns, key=lambda item: item[0])]
+                requests.append({'prompt_index': turns[0]['prompt_index'], 'session_id': session_id,
+                                 'turns': turns, 'completed': set()})
+        
+        if resume and output_file and os.path.exists(output_file):
+            repair_result_file(output_file)
+            completed = read_completed_indices(output_file)
+            remaining = []
+            for request in requests:
+                if 'turns' in request:
+                    request['completed'] = {turn['prompt_index'] for turn in request['turns']} & completed
+                    if self.request_size(request):
+                        remaining.append(request)
+                elif request['prompt_index'] not in completed:
+                    remaining.append(request)
+            requests = remaining
+            self.restore(output_file)
+            print(f"从 {output_file} 恢复：已完成 {len(completed)} 个请求，"
+                  f"剩余 {sum(self.request_size(request) for request in requests)} 个")
+        return requests
+
+    @staticmethod
+    def request_prompts(requests: List[Dict]) -> List[str]:
+        """返回所有请求 (包括多轮会话各轮) 的prompt，用于预先计算输入token数"""
+        prompts = []
+        for request in requests:
+            if 'turns' in request:
+                prompts.extend(turn['prompt'] for turn in request['turns'])
+            else:
+                prompts.append(request['prompt'])
+        return prompts
+
+    def load_trace(self, output_file: str, resume: bool = False) -> Set[int]:
+        """轨迹回放模式下返回需要跳过的请求序号；resume时为output_file中已写入的请求，并恢复其统计结果"""
+        if not (resume and os.path.exists(output_file)):
+            return set()
+        repair_result_file(output_file)
+        completed = read_completed_indices(output_file)
+        self.restore(output_file)
+        print(f"从 {output_file} 恢复：已完成 {len(completed)} 个请求")
+        return completed
+
+    def restore(self, output_file: str):
+        """从已写入的结果文件及直方图检查点恢复统计状态"""
+        self.summary = ResultSummary(SUMMARY_METRICS)
+        warmup_sent = 0
+        measured = 0
+        for chunk in iter_result_chunks(output_file):
+            chunk_measured = measured_results(chunk)
+            self.summary.add_frame(chunk_measured)
+            measured += len(chunk_measured)
+            warmup_rows = chunk[~chunk.index.isin(chunk_measured.index)]
+            # 预热按发送的请求 (或会话) 计数，多轮会话的各轮只算一次
+            if 'session_id' in warmup_rows.columns:
+                warmup_sent += warmup_rows['session_id'].nunique()
+            else:
+                warmup_sent += len(warmup_rows)
+        # 恢复后不重复预热：已有计入统计的请求时预热阶段已经结束，否则只补足剩余的预热请求
+        if measured:
+            self.warmup_requests = 0
+            self.warmup_seconds = 0.0
+        else:
+            self.warmup_requests = max(0, self.warmup_requests - warmup_sent)
+        
+        checkpoint = result_path(output_file, 'histograms', '.json')
+        self.performance_monitor = PerformanceMonitor()
+        if os.path.exists(checkpoint):
+            self.performance_monitor.load(checkpoint)
+        else:
+            # 没有检查点 (进程被强制终止) 时根据逐请求结果重建，ITL样本无法恢复
+            print(f"Warning: 未找到 {checkpoint}，ITL分位数仅包含恢复后的请求")
+            columns = ['status', 'warmup', 'ttft', 'tpot', 'latency', 'queue_delay']
+            histograms = self.performance_monitor.histograms
+            for chunk in iter_result_chunks(output_file, columns=columns):
+                chunk = measured_results(chunk)
+                successful = chunk[chunk['status'] == 'success']
+                for metric in ('ttft', 'tpot', 'latency', 'queue_delay'):
+                    if metric in successful.columns:
+                        histograms[metric].record_many(successful[metric].dropna())
+                for metric in ('ttft', 'latency'):
+                    if metric in successful.columns:
+                        histograms[f'{metric}_censored'].record_many(successful[metric].dropna())
+                self.performance_monitor.record_failure(len(chunk) - len(successful))
+            for chunk in iter_result_chunks(output_file, columns=['status', 'warmup', 'ttft', *BREAKDOWN_DIMENSIONS]):
+                chunk = measured_results(chunk)
+                successful = chunk[chunk['status'] == 'success']
+                for dimension in BREAKDOWN_DIMENSIONS:
+                    if dimension in successful.columns:
+                        for group, ttft in successful[[dimension, 'ttft']].dropna().itertuples(index=False):
+                            # 含缺失值的整数列读回时为浮点数，还原为整数标签
+                            if isinstance(group, float) and group.is_integer():
+                                group = int(group)
+                            self.performance_monitor.record_breakdown(dimension, group, ttft)
+
+    async def process_all(self, input_file: str, output_file: str, resume: bool = False):
+        trace = isinstance(self.schedule, TraceSchedule)
+        if trace:
+            completed = self.load_trace(output_file, resume=resume)
+            total = TraceReader(input_file).count()
+        else:
+            requests = self.load_requests(input_file, output_file, resume=resume)
+            # 在开始计时前完成输入token计数
+            await self.precompute_prompt_tokens(self.request_prompts(requests))
+            total = self.summary.total + sum(self.request_size(request) for request in requests)
+        
+        self.writer = ResultWriter(output_file, mode='a' if resume else 'w')
+        await self.writer.start()
+        try:
+            with tqdm(total=total, initial=self.summary.total) as pbar:
+                refresh = asyncio.create_task(self.show_live_metrics(pbar))
+                self.start_instrumentation()
+                try:
+                    if trace:
+                        await self.process_trace(input_file, pbar, completed)
+                    else:
+                        await self.run_requests(requests, pbar)
+                finally:
+                    refresh.cancel()
+                    self.stop_instrumentation(output_file)
+        finally:
+            # 中断时同样落盘已完成的结果和直方图检查点，以便恢复
+            await self.writer.close()
+            self.performance_monitor.save(result_path(output_file, 'histograms', '.json'))
+            await self.close()
+        
+        self.report(output_file)
+
+    def start_instrumentation(self):
+        """开始监控事件循环延迟，开启采样分析时同时开始采样"""
+        self.loop_monitor.start(self.performance_monitor.histograms['loop_lag'])
+        if self.profiler is not None:
+            self.profiler.start()
+
+    def stop_instrumentation(self, output_file: str):
+        self.loop_monitor.stop()
+        if self.profiler is not None:
+            self.profiler.stop()
+            profile_file = result_path(output_file, 'profile', '.txt')
+            self.profiler.save(profile_file)
+            summary = self.profiler.summary()
+            print(f"\n采样分析: {summary['samples']} 次采样，其中 {summary['in_request_ratio']:.1%} "
+                  f"位于请求处理中，调用栈已保存至 {profile_file}")
+
+    async def show_live_metrics(self, pbar: tqdm, interval: float = 1.0):
+        """每秒在进度条后缀中刷新实时指标"""
+        while True:
+            await asyncio.sleep(interval)
+            pbar.set_postfix_str(self.live.postfix())
+
+    async def close(self):
+        """关闭各端点传输层的连接池及分词线程池"""
+        await self.pool.close()
+        self.token_executor.shutdown(wait=False)
+
+    def report(self, output_file: str, workers: int = 1):
+        """打印并保存性能统计结果，逐请求结果已在测试过程中写入output_file"""
+        import pandas as pd
+        summary = self.summary
+        if summary.succeeded:
             # 计算性能统计
-            stats = df_results.agg({
-                'input_tokens': ['mean', 'min', 'max'],
-                'output_tokens': ['mean', 'min', 'max'],
-                'ttft': ['mean', 'min', 'max'],
-                'tpot': ['mean', 'min', 'max'],
-                'latency': ['mean', 'min', 'max'],
-                'tps': ['mean', 'min', 'max'],
-                'rps': ['mean', 'min', 'max']
-            }).round(2)
+            stats = summary.table().round(2)
+            percentiles = self.performance_monitor.percentile_table()
             
             # 添加环境信息
             env_info = {
                 'model': self.model,
+                'transport': self.pool.transport_name,
                 'batch_size': self.batch_size,
+                'load_mode': self.schedule.describe() if self.schedule else 'batch',
+                'workers': workers,
                 'base_url': self.base_url or 'default',
-                'total_requests': len(df_results),
-                'success_rate': f"{(len(successful_results) / len(prompts)) * 100:.2f}%"
+                'total_requests': summary.succeeded,
+                'success_rate': f"{(summary.succeeded / summary.total) * 100:.2f}%"
             }
+            if summary.error_types:
+                env_info['errors'] = ", ".join(f"{error_type}={count}" for error_type, count in
+                                               sorted(summary.error_types.items(), key=lambda item: -item[1]))
+            if any(self.timeouts.values()):
+                env_info['timeouts'] = ", ".join(f"{phase}={timeout}s" for phase, timeout in self.timeouts.items()
+                                                 if timeout)
+            if len(self.pool) > 1:
+                env_info['endpoints'] = self.pool.describe()
+            if self.warmup_requests or self.warmup_seconds:
+                env_info['warmup'] = f"{self.warmup_requests} requests / {self.warmup_seconds}s"
+            if self.ttft_slo is not None or self.tpot_slo is not None:
+                env_info['goodput_slo'] = f"TTFT <= {self.ttft_slo} ms, TPOT <= {self.tpot_slo} ms"
+            client_bound = count_client_bound(output_file)
+            env_info['client_bound_requests'] = client_bound
             
             print("\nEnvironment Information:")
             for key, value in env_info.items():
@@ -188,125 +1079,916 @@ class BatchProcessor:
             print("\nPerformance Statistics:")
             print(stats)
             
-            # 保存详细结果
-            df_results.to_csv(output_file, index=False)
+            print("\nLatency Percentiles (ms):")
+            print(percentiles)
+            if summary.failed:
+                print("ttft_censored/latency_censored包含失败请求 (计为比所有成功请求都慢)，"
+                      "分位数为inf表示该分位已落在失败请求上")
+            
+            # 客户端开销过大时，测得的TTFT中有相当一部分耗费在客户端而非服务端
+            if client_bound:
+                print(f"\n警告: {client_bound} 个请求 ({client_bound / summary.succeeded:.1%}) 的客户端开销超过 "
+                      f"{self.overhead_threshold} ms (事件循环延迟 p99: "
+                      f"{self.performance_monitor.histograms['loop_lag'].percentile(99):.2f} ms)，"
+                      f"这些请求已标记为client_bound，建议增加负载进程数或使用http传输层")
             
             # 保存统计结果，包含环境信息
             stats_df = pd.DataFrame(stats)
             stats_df.loc['environment'] = pd.Series(env_info)
-            stats_df.to_csv(output_file.replace('.csv', '_stats.csv'))
+            stats_df.to_csv(result_path(output_file, 'stats'))
+            
+            # 保存分位数统计结果
+            percentiles.to_csv(result_path(output_file, 'percentiles'))
+            
+            for dimension in self.performance_monitor.breakdowns:
+                breakdown = self.performance_monitor.breakdown_table(dimension)
+                print(f"\nTTFT by {dimension} (ms):")
+                print(breakdown)
+                breakdown.to_csv(result_path(output_file, f'ttft_{dimension}'))
+            
+            if len(self.pool) > 1:
+                endpoints = endpoint_table(output_file)
+                print("\nPer-Endpoint Metrics:")
+                print(endpoints.round(3))
+                endpoints.to_csv(result_path(output_file, 'endpoints'))
+            
+            prefix_cache = self.performance_monitor.breakdowns.get('prefix_cache')
+            if prefix_cache and 'hit' in prefix_cache and 'miss' in prefix_cache:
+                hit, miss = prefix_cache['hit'], prefix_cache['miss']
+                print(f"\n前缀缓存命中率: {hit.count / (hit.count + miss.count):.2%}")
+                print(f"命中缓存时TTFT p50降低: {miss.percentile(50) - hit.percentile(50):.2f} ms "
+                      f"({1 - hit.percentile(50) / miss.percentile(50):.2%})")
+            
+            # 系统整体吞吐量：整个测试区间及排除爬坡、排空阶段后的稳态区间
+            timeline = build_timeline(
+                output_file, timeline_bin_width(self.performance_monitor.histograms['latency'].percentile(50)),
+                ttft_slo=self.ttft_slo, tpot_slo=self.tpot_slo
+            )
+            window = timeline.steady_window()
+            throughput = pd.DataFrame({
+                'overall': timeline.throughput(),
+                'steady_state': timeline.throughput(window),
+            }).T.round(2)
+            print("\nAggregate Throughput:")
+            print(throughput)
+            if window is not None:
+                print(f"稳态区间: {window[0]:.1f}s - {window[1]:.1f}s")
+            else:
+                print("未识别到稳态区间，稳态吞吐量按整个测试区间计算")
+            throughput.to_csv(result_path(output_file, 'throughput'))
+            # 逐秒的吞吐率，可用于绘制吞吐量随时间的变化
+            if timeline.bin_width != 1.0:
+                timeline = build_timeline(output_file, ttft_slo=self.ttft_slo, tpot_slo=self.tpot_slo)
+            timeline.rates().round(2).to_csv(result_path(output_file, 'timeline'))
         
-        failed_results = [r for r in results if r["status"] == "failed"]
-        if failed_results:
-            print("\nFailed requests:")
-            for result in failed_results:
+        if summary.failed:
+            # 按错误类型统计，区分限流、服务端错误、超时和中途断开
+            errors = pd.Series(summary.error_types, dtype=int).sort_values(ascending=False)
+            errors = pd.DataFrame({'count': errors, 'rate': (errors / summary.total).round(4)})
+            errors.index.name = 'error_type'
+            print(f"\nErrors by type ({summary.failed} / {summary.total}):")
+            print(errors)
+            errors.to_csv(result_path(output_file, 'errors'))
+            
+            print(f"\nFailed requests ({summary.failed}):")
+            for result in summary.failures:
                 print(f"Prompt: {result['prompt']}")
-                print(f"Error: {result['error']}\n")
+                print(f"Error ({result.get('error_type') or 'other'}): {result['error']}\n")
+            if summary.failed > len(summary.failures):
+                print(f"... 其余 {summary.failed - len(summary.failures)} 个失败请求见 {output_file}")
+
+class _QueueProgress:
+    """负载进程中的进度对象，将进度更新转发给主进程"""
+    
+    def __init__(self, message_queue):
+        self.message_queue = message_queue
+    
+    def update(self, n: int = 1):
+        self.message_queue.put(('progress', n))
+
+
+async def _forward_live_metrics(live: LiveMetrics, worker_id: int, message_queue, interval: float = 1.0):
+    """每秒将负载进程新完成请求的实时样本发送给主进程"""
+    while True:
+        await asyncio.sleep(interval)
+        message_queue.put(('live', worker_id, live.drain()))
+
+
+async def _load_worker(worker_id: int, processor_kwargs: Dict, requests: List[Dict], part_file: str,
+                       barrier, message_queue, trace_file: str = None, completed: Set[int] = frozenset(),
+                       prompt_tokens: Dict[bytes, int] = None):
+    # 负载进程的实时样本定期发送给主进程合并显示
+    processor = BatchProcessor(**processor_kwargs, live_metrics=LiveMetrics(forward=True))
+    processor.result_tags = {'worker_id': worker_id}
+    processor.prompt_token_cache.update(prompt_tokens or {})
+    # 轨迹回放模式下各进程自行读取轨迹，requests为None
+    if requests is not None:
+        await processor.precompute_prompt_tokens(processor.request_prompts(requests))
+    # 运行中仍需分词时 (轨迹回放合成prompt、多轮会话的上下文、不向服务端获取usage时的输出token数)
+    # 在开始发送前加载tokenizer，避免第一次加载的耗时计入请求
+    if requests is None or not processor.use_server_usage or any('turns' in request for request in requests):
+        processor.encoding
+    
+    # 所有进程完成初始化后同时开始发送请求
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, barrier.wait)
+    
+    # 每个进程写入各自的分片文件，由主进程在结束后合并
+    processor.writer = ResultWriter(part_file)
+    await processor.writer.start()
+    forward = asyncio.create_task(_forward_live_metrics(processor.live, worker_id, message_queue))
+    processor.start_instrumentation()
+    try:
+        if trace_file is not None:
+            await processor.process_trace(trace_file, _QueueProgress(message_queue), completed)
+        else:
+            await processor.run_requests(requests, _QueueProgress(message_queue))
+    finally:
+        forward.cancel()
+        processor.stop_instrumentation(part_file)
+        message_queue.put(('live', worker_id, processor.live.drain()))
+        await processor.writer.close()
+        await processor.close()
+    message_queue.put(('result', worker_id, processor.summary.to_dict(), processor.performance_monitor.to_dict()))
+
+
+def _load_worker_main(worker_id: int, processor_kwargs: Dict, requests: List[Dict], part_file: str,
+                      barrier, message_queue, trace_file: str = None, completed: Set[int] = frozenset(),
+                      prompt_tokens: Dict[bytes, int] = None):
+    """负载进程入口，每个进程运行独立的事件循环"""
+    try:
+        asyncio.run(_load_worker(worker_id, processor_kwargs, requests, part_file, barrier, message_queue,
+                                 trace_file, completed, prompt_tokens))
+    except Exception:
+        import traceback
+        # 中止屏障，避免其他进程一直等待
+        barrier.abort()
+        message_queue.put(('error', worker_id, traceback.format_exc()))
+
+
+def run_multiprocess(processor_kwargs: Dict, input_file: str, output_file: str, workers: int,
+                     resume: bool = False, live_metrics: LiveMetrics = None):
+    """将prompt集合拆分到多个进程并行发送，合并各进程的结果和延迟分布"""
+    processor = BatchProcessor(**processor_kwargs, live_metrics=live_metrics)
+    schedule = processor_kwargs.get('schedule')
+    try:
+        trace_file = None
+        completed = frozenset()
+        if isinstance(schedule, TraceSchedule):
+            # 轨迹由各进程自行分块读取，主进程只统计请求总数
+            trace_file = input_file
+            completed = processor.load_trace(output_file, resume=resume)
+            requests = None
+            total = TraceReader(input_file).count()
+        else:
+            requests = processor.load_requests(input_file, output_file, resume=resume)
+            if not requests:
+                processor.report(output_file)
+                return
+            # 剩余请求数少于进程数时 (如恢复一个接近完成的测试) 减少进程数
+            workers = min(workers, len(requests))
+            # 在主进程中一次计算所有prompt的输入token数，负载进程直接使用，不必各自加载tokenizer
+            asyncio.run(processor.precompute_prompt_tokens(processor.request_prompts(requests)))
+            total = processor.summary.total + sum(processor.request_size(request) for request in requests)
+    finally:
+        # 主进程只读取请求、计算输入token数，不发送请求，用完即关闭连接池和分词线程池
+        asyncio.run(processor.close())
+    
+    batch_size = processor_kwargs.get('batch_size', 5)
+    
+    ctx = mp.get_context('spawn')
+    barrier = ctx.Barrier(workers)
+    message_queue = ctx.Queue()
+    processes = []
+    part_files = [result_path(output_file, f'part{worker_id}', '.jsonl') for worker_id in range(workers)]
+    for worker_id in range(workers):
+        worker_kwargs = dict(processor_kwargs)
+        if schedule is not None:
+            worker_kwargs['schedule'] = schedule.split(workers, worker_id)
+        else:
+            worker_kwargs['batch_size'] = split_count(batch_size, workers, worker_id)
+        # 预热请求数按进程平均分配，预热时长各进程相同；恢复时使用restore调整后的剩余预热
+        warmup_requests = processor.warmup_requests
+        worker_kwargs['warmup_requests'] = warmup_requests // workers + (1 if worker_id < warmup_requests % workers else 0)
+        worker_kwargs['warmup_seconds'] = processor.warmup_seconds
+        worker_requests = None if requests is None else requests[worker_id::workers]
+        prompt_tokens = None if requests is None else processor.cached_prompt_tokens(worker_requests)
+        process = ctx.Process(
+            target=_load_worker_main,
+            args=(worker_id, worker_kwargs, worker_requests, part_files[worker_id], barrier, message_queue,
+                  trace_file, completed, prompt_tokens),
+            daemon=True
+        )
+        process.start()
+        processes.append(process)
+    
+    checkpoint = result_path(output_file, 'histograms', '.json')
+    pending = workers
+    try:
+        with tqdm(total=total, initial=processor.summary.total) as pbar:
+            last_refresh = clock()
+            while pending:
+                if clock() - last_refresh >= 1:
+                    pbar.set_postfix_str(processor.live.postfix())
+                    last_refresh = clock()
+                try:
+                    message = message_queue.get(timeout=1)
+                except queue.Empty:
+                    if any(process.exitcode not in (None, 0) for process in processes):
+                        raise RuntimeError("负载进程异常退出")
+                    continue
+                
+                if message[0] == 'progress':
+                    pbar.update(message[1])
+                elif message[0] == 'live':
+                    processor.live.ingest(message[1], message[2])
+                elif message[0] == 'result':
+                    _, worker_id, summary, histograms = message
+                    processor.summary.merge(ResultSummary.from_dict(summary))
+                    processor.performance_monitor.merge(histograms)
+                    pending -= 1
+                else:
+                    _, worker_id, error = message
+                    raise RuntimeError(f"负载进程 {worker_id} 运行失败:\n{error}")
+    finally:
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        # 异常退出时同样合并已写出的分片
+        concat_result_files([part for part in part_files if os.path.exists(part)], output_file, append=resume)
+        # 只有所有进程的直方图都已合并时检查点才完整，否则删除旧检查点，恢复时从结果文件重建
+        if pending == 0:
+            processor.performance_monitor.save(checkpoint)
+        elif os.path.exists(checkpoint):
+            os.remove(checkpoint)
+    
+    processor.report(output_file, workers=workers)
+
+def get_output_file(batch_size: int, request_rate: float = None, sliding_window: bool = False,
+                    trace_scale: float = None, routing: str = None, output_dir: str = './output', **_) -> str:
+    """返回子测试的逐请求结果文件名，多端点测试时文件名中包含路由策略"""
+    prefix = f"{output_dir}/output_performance_metrics_{routing}_" if routing else f"{output_dir}/output_performance_metrics_"
+    if trace_scale is not None:
+        return f"{prefix}trace{trace_scale}.jsonl"
+    if request_rate is not None:
+        return f"{prefix}rate{request_rate}.jsonl"
+    if sliding_window:
+        return f"{prefix}concurrency{batch_size}.jsonl"
+    return f"{prefix}batch{batch_size}.jsonl"
 
 async def run_batch_test(
     api_key: str,
     base_url: str,
     input_file: str,
     batch_size: int,
-    model: str
+    model: str,
+    request_rate: float = None,
+    arrival_process: str = 'poisson',
+    sliding_window: bool = False,
+    ramp_up: float = 0.0,
+    hold: float = None,
+    ramp_down: float = 0.0,
+    workers: int = 1,
+    transport: str = 'openai',
+    keep_response: bool = True,
+    think_time: float = 0.0,
+    trace_scale: float = None,
+    max_requests: int = None,
+    warmup_requests: int = 0,
+    warmup_seconds: float = 0.0,
+    ttft_slo: float = None,
+    tpot_slo: float = None,
+    metrics_port: int = None,
+    overhead_threshold: float = 10.0,
+    profile: bool = False,
+    endpoints: List[Dict] = None,
+    routing: str = 'round_robin',
+    timeouts: Dict = None,
+    output_dir: str = './output',
+    resume: bool = False
 ) -> str:
-    """运行单个batch size的测试"""
-    output_file = f"./output/output_performance_metrics_batch{batch_size}.csv"
-    
-    print(f"\n开始测试 batch_size = {batch_size}")
-    processor = BatchProcessor(
-        api_key=api_key,
-        base_url=base_url,
-        model=model,
-        batch_size=batch_size
-    )
-    
-    await processor.process_all(input_file, output_file)
+    """运行单个batch size (或开环模式下单个请求速率) 的测试
+
+    sliding_window为True时，batch_size作为滑动窗口的并发数使用；
+    workers大于1时由多个进程共同产生负载；
+    输入文件为多轮会话数据集时，以会话为单位调度，think_time为轮次之间的平均思考时间；
+    trace_scale不为None时input_file为请求轨迹，按轨迹中的到达时刻以trace_scale倍速回放；
+    最先发送的warmup_requests个请求及开始后warmup_seconds秒内发送的请求作为预热，不计入统计；
+    ttft_slo/tpot_slo (毫秒) 用于计算goodput；
+    metrics_port不为None时在该端口提供Prometheus格式的实时指标；
+    客户端开销超过overhead_threshold毫秒的请求标记为client_bound，profile为True时采样分析客户端热点；
+    endpoints不为空时按routing策略将请求分配到多个端点，并按端点分别统计；
+    timeouts为各阶段的超时 (秒，键为connect/ttft/stall/total)，超时的请求被取消并记为失败；
+    结果文件写入output_dir；resume为True时跳过输出文件中已完成的请求，继续之前中断的测试
+    """
+    schedule = None
+    output_file = get_output_file(batch_size, request_rate=request_rate, sliding_window=sliding_window,
+                                  trace_scale=trace_scale, routing=routing if endpoints else None,
+                                  output_dir=output_dir)
+    if trace_scale is not None:
+        schedule = TraceSchedule(time_scale=trace_scale)
+        print(f"\n开始回放轨迹 {input_file} (time_scale = {trace_scale}x)")
+    elif request_rate is not None:
+        schedule = ArrivalSchedule(request_rate=request_rate, arrival_process=arrival_process)
+        print(f"\n开始测试 request_rate = {request_rate} req/s ({arrival_process})")
+    elif sliding_window:
+        schedule = ConcurrencySchedule(concurrency=batch_size, ramp_up=ramp_up, hold=hold, ramp_down=ramp_down)
+        print(f"\n开始测试 concurrency = {batch_size} (滑动窗口)")
+    else:
+        print(f"\n开始测试 batch_size = {batch_size}")
+    if endpoints:
+        print(f"路由策略: {routing} ({len(endpoints)} 个端点)")
+    
+    processor_kwargs = {
+        'api_key': api_key,
+        'base_url': base_url,
+        'model': model,
+        'batch_size': batch_size,
+        'schedule': schedule,
+        'transport': transport,
+        'keep_response': keep_response,
+        'think_time': think_time,
+        'max_requests': max_requests,
+        'warmup_requests': warmup_requests,
+        'warmup_seconds': warmup_seconds,
+        'ttft_slo': ttft_slo,
+        'tpot_slo': tpot_slo,
+        'overhead_threshold': overhead_threshold,
+        'profile': profile,
+        'endpoints': endpoints,
+        'routing': routing,
+        'timeouts': timeouts
+    }
+    
+    live = LiveMetrics()
+    server = MetricsServer(live, metrics_port) if metrics_port else None
+    if server is not None:
+        await server.start()
+    try:
+        if workers > 1:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(
+                None, functools.partial(run_multiprocess, processor_kwargs, input_file, output_file, workers, resume,
+                                        live)
+            )
+        else:
+            processor = BatchProcessor(**processor_kwargs, live_metrics=live)
+            await processor.process_all(input_file, output_file, resume=resume)
+    finally:
+        if server is not None:
+            await server.stop()
     return output_file
 
-async def run_comparative_analysis(output_files: List[str]):
-    """对不同batch size的结果进行对比分析"""
+def evaluate_slo(output_file: str, ttft_slo: float, tpot_slo: float) -> Dict:
+    """根据子测试的结果文件和分位数统计，判断p99 TTFT/TPOT是否满足SLO并计算goodput
+
+    TTFT使用包含失败请求的删失分布：失败请求计为比所有成功请求都慢，
+    因此少量偶发错误不会使探测失败，失败比例超过1%时p99为inf，判定为违反SLO
+    """
+    import pandas as pd
+    total = succeeded = good = 0
+    first_start, last_end = np.inf, -np.inf
+    for chunk in iter_result_chunks(output_file, columns=['status', 'warmup', 'ttft', 'tpot', 'start_time', 'end_time']):
+        chunk = measured_results(chunk)
+        total += len(chunk)
+        successful = chunk[chunk['status'] == 'success']
+        succeeded += len(successful)
+        good += int(((successful['ttft'] <= ttft_slo) & (successful['tpot'] <= tpot_slo)).sum())
+        if len(successful):
+            first_start = min(first_start, successful['start_time'].min())
+            last_end = max(last_end, successful['end_time'].max())
+    
+    duration = last_end - first_start if succeeded else 0
+    ttft_p99 = tpot_p99 = np.nan
+    # 所有请求都失败时不会生成分位数统计
+    if succeeded:
+        percentiles = pd.read_csv(result_path(output_file, 'percentiles'), index_col=0)
+        ttft_p99 = percentiles.loc['ttft_censored', 'p99']
+        tpot_p99 = percentiles.loc['tpot', 'p99']
+    return {
+        'requests': total,
+        'success_rate': succeeded / total if total else 0.0,
+        'achieved_rps': succeeded / duration if duration > 0 else 0.0,
+        # goodput：每秒完成的、同时满足TTFT和TPOT SLO的请求数
+        'goodput': good / duration if duration > 0 else 0.0,
+        'ttft_p99': ttft_p99,
+        'tpot_p99': tpot_p99,
+        'meets_slo': bool(ttft_p99 <= ttft_slo and tpot_p99 <= tpot_slo),
+    }
+
+
+async def run_slo_search(
+    api_key: str,
+    base_url: str,
+    input_file: str,
+    model: str,
+    ttft_slo: float,
+    tpot_slo: float,
+    start_rate: float = 1.0,
+    max_rate: float = 256.0,
+    tolerance: float = 0.05,
+    probe_duration: float = 30.0,
+    min_probe_requests: int = 20,
+    output_dir: str = './output',
+    **test_kwargs
+) -> Dict:
+    """搜索p99 TTFT不超过ttft_slo且p99 TPOT不超过tpot_slo (毫秒) 的最大请求速率
+
+    先从start_rate开始每次将速率加倍，直到违反SLO或达到max_rate，确定SLO边界所在区间；
+    再在区间内二分查找，直到区间宽度不超过上界的tolerance。
+    每个探测点以开环速率模式发送约probe_duration秒的请求 (prompt不足时循环使用)，结果写入goodput曲线
+    """
+    import pandas as pd
+    probes = {}
+    
+    async def probe(rate: float) -> bool:
+        if rate not in probes:
+            # 预热请求不计入统计，额外发送
+            requests = max(min_probe_requests, int(rate * probe_duration)) + test_kwargs.get('warmup_requests', 0)
+            output_file = await run_batch_test(
+                api_key=api_key, base_url=base_url, input_file=input_file, batch_size=1, model=model,
+                request_rate=rate, max_requests=requests, ttft_slo=ttft_slo, tpot_slo=tpot_slo,
+                output_dir=output_dir, **test_kwargs
+            )
+            probes[rate] = {'request_rate': rate, **evaluate_slo(output_file, ttft_slo, tpot_slo)}
+            result = probes[rate]
+            print(f"\n探测 {rate} req/s: p99 TTFT {result['ttft_p99']:.2f} ms, p99 TPOT {result['tpot_p99']:.2f} ms, "
+                  f"goodput {result['goodput']:.2f} req/s -> {'满足' if result['meets_slo'] else '违反'}SLO")
+        return probes[rate]['meets_slo']
+    
+    # 指数增长确定区间 [low, high)，low满足SLO、high违反SLO
+    low, high = 0.0, None
+    rate = start_rate
+    while rate <= max_rate:
+        if not await probe(rate):
+            high = rate
+            break
+        low = rate
+        rate *= 2
+    if high is None:
+        print(f"\n速率达到上限 {max_rate} req/s 时仍满足SLO")
+    else:
+        while low == 0.0 or (high - low) / high > tolerance:
+            middle = round((low + high) / 2, 4)
+            if await probe(middle):
+                low = middle
+            else:
+                high = middle
+            # 起始速率即违反SLO时，区间足够小后停止
+            if high < start_rate * tolerance:
+                break
+    
+    curve = pd.DataFrame(sorted(probes.values(), key=lambda result: result['request_rate']))
+    curve_file = os.path.join(output_dir, 'slo_search_goodput.csv')
+    curve.to_csv(curve_file, index=False)
+    
+    print(f"\nSLO: p99 TTFT <= {ttft_slo} ms, p99 TPOT <= {tpot_slo} ms")
+    print("\nGoodput曲线：")
+    print(curve.round(3).to_string(index=False))
+    if low > 0:
+        print(f"\n满足SLO的最大请求速率: {low:g} req/s (goodput {probes[low]['goodput']:.2f} req/s)")
+    else:
+        print("\n所有探测速率均违反SLO")
+    print(f"Goodput曲线已保存至: {curve_file}")
+    return {'max_rate': low, 'curve_file': curve_file}
+
+
+def _parse_sweep_value(file: str):
+    """从结果文件名中解析扫描维度及取值，如 batch4 -> ('batch_size', 4)"""
+    match = re.search(r'(batch|concurrency|rate|trace)([\d.]+)\.(?:csv|jsonl)$', file)
+    if match is None:
+        raise ValueError(f"无法从文件名解析batch size、并发数或请求速率: {file}")
+    if match.group(1) == 'batch':
+        return 'batch_size', int(match.group(2))
+    if match.group(1) == 'concurrency':
+        return 'concurrency', int(match.group(2))
+    if match.group(1) == 'trace':
+        return 'trace_scale', float(match.group(2))
+    return 'request_rate', float(match.group(2))
+
+def _parse_routing(file: str):
+    """从多端点测试的结果文件名中解析路由策略，单端点测试返回None"""
+    match = re.search(rf"_({'|'.join(ROUTING_POLICIES)})_[a-z]+[\d.]+\.(?:csv|jsonl)$", file)
+    return match.group(1) if match else None
+
+async def run_comparative_analysis(output_files: List[str], ttft_slo: float = None, tpot_slo: float = None,
+                                   output_dir: str = './output'):
+    """对不同batch size (或请求速率) 的结果进行对比分析，指定ttft_slo/tpot_slo时同时对比goodput"""
+    import pandas as pd
     print("\n开始生成对比分析报告...")
     
     # 收集所有batch size的统计数据
     comparative_stats = []
+    sweep_key = 'batch_size'
     for file in output_files:
-        batch_size = int(file.split('batch')[-1].split('.')[0])
-        df = pd.read_csv(file)
+        sweep_key, sweep_value = _parse_sweep_value(file)
+        routing = _parse_routing(file)
         
-        stats = df.agg({
-            'input_tokens': ['mean', 'std', 'min', 'max'],
-            'output_tokens': ['mean', 'std', 'min', 'max'],
-            'ttft': ['mean', 'std', 'min', 'max'],
-            'tpot': ['mean', 'std', 'min', 'max'],
-            'latency': ['mean', 'std', 'min', 'max'],
-            'tps': ['mean', 'std', 'min', 'max'],
-            'rps': ['mean', 'std', 'min', 'max']
-        }).round(2)
+        # 分块读取结果文件并增量汇总，不将整个文件载入内存
+        summary = ResultSummary(SUMMARY_METRICS)
+        for chunk in iter_result_chunks(file, columns=['status', 'warmup', 'error_type', *SUMMARY_METRICS]):
+            summary.add_frame(measured_results(chunk))
+        stats = summary.table(['mean', 'std', 'min', 'max']).round(2)
         
         stats_dict = {
-            'batch_size': batch_size,
-            'sample_size': len(df),
+            **({'routing': routing} if routing else {}),
+            sweep_key: sweep_value,
+            'sample_size': summary.succeeded,
+            'error_rate': summary.failed / summary.total if summary.total else 0.0,
+            **{f"errors_{error_type}": count for error_type, count in summary.error_types.items()},
             **{f"{metric}_{stat}": value 
                for metric, values in stats.items() 
                for stat, value in zip(['mean', 'std', 'min', 'max'], values)}
         }
+        
+        # 合并直方图得到的尾延迟分位数
+        percentiles_file = result_path(file, 'percentiles')
+        if os.path.exists(percentiles_file):
+            percentiles = pd.read_csv(percentiles_file, index_col=0)
+            for metric in percentiles.index:
+                for stat in ('p50', 'p90', 'p99', 'p99.9'):
+                    stats_dict[f"{metric}_{stat}"] = percentiles.loc[metric, stat]
+        
+        # 稳态区间内的整体吞吐量，避免爬坡和排空阶段拉低小并发测试的结果
+        timeline = build_timeline(file, timeline_bin_width(stats_dict.get('latency_p50', stats_dict.get('latency_mean'))),
+                                  ttft_slo=ttft_slo, tpot_slo=tpot_slo)
+        window = timeline.steady_window()
+        for period, throughput in (('overall', timeline.throughput()), ('steady', timeline.throughput(window))):
+            for metric in ('output_tps', 'input_tps', 'rps', 'goodput'):
+                if metric in throughput:
+                    stats_dict[f"{metric}_{period}"] = throughput[metric]
+        stats_dict['steady_duration'] = timeline.throughput(window)['duration']
         comparative_stats.append(stats_dict)
     
     # 创建对比分析DataFrame
     comparative_df = pd.DataFrame(comparative_stats)
-    comparative_df.sort_values('batch_size', inplace=True)
+    error_columns = sorted(column for column in comparative_df.columns if column.startswith('errors_'))
+    comparative_df[error_columns] = comparative_df[error_columns].fillna(0).astype(int)
+    # 对比多个路由策略时，各策略在相同扫描取值下的结果相邻排列
+    id_columns = ['routing', sweep_key] if 'routing' in comparative_df.columns else [sweep_key]
+    comparative_df.sort_values(id_columns[::-1], inplace=True)
     
     # 保存对比分析结果
-    comparison_file = './output/batch_size_comparison.csv'
+    comparison_file = os.path.join(output_dir, f'{sweep_key}_comparison.csv')
     comparative_df.to_csv(comparison_file, index=False)
     
     # 打印关键指标对比
-    print("\n不同batch size的关键性能指标对比：")
+    print(f"\n不同{sweep_key}的关键性能指标对比：")
     print("\n1. 平均延迟 (ms):")
-    print(comparative_df[['batch_size', 'latency_mean', 'latency_std']].to_string(index=False))
+    print(comparative_df[[*id_columns, 'latency_mean', 'latency_std']].to_string(index=False))
     
-    print("\n2. TPS (Tokens Per Second):")
-    print(comparative_df[['batch_size', 'tps_mean', 'tps_std']].to_string(index=False))
+    if 'decode_tps_mean' in comparative_df.columns:
+        print("\n2. 单请求解码速度 (tokens/s):")
+        print(comparative_df[[*id_columns, 'decode_tps_mean', 'decode_tps_std']].to_string(index=False))
     
     print("\n3. TTFT (Time To First Token) (ms):")
-    print(comparative_df[['batch_size', 'ttft_mean', 'ttft_std']].to_string(index=False))
+    print(comparative_df[[*id_columns, 'ttft_mean', 'ttft_std']].to_string(index=False))
+    
+    if 'queue_delay_mean' in comparative_df.columns:
+        print("\n4. 排队延迟 (Queue Delay) (ms):")
+        print(comparative_df[[*id_columns, 'queue_delay_mean', 'queue_delay_max']].to_string(index=False))
+    
+    # 有失败请求时同时列出包含失败请求的尾延迟
+    tail_metrics = ('ttft', 'itl', 'latency', 'ttft_censored', 'latency_censored') if error_columns else \
+        ('ttft', 'itl', 'latency')
+    tail_columns = [f"{metric}_p99" for metric in tail_metrics if f"{metric}_p99" in comparative_df.columns]
+    if tail_columns:
+        print("\n5. 尾延迟 p99 (ms):")
+        print(comparative_df[[*id_columns, *tail_columns]].to_string(index=False))
+    
+    print("\n6. 系统整体吞吐量 (整个测试 / 稳态区间):")
+    throughput_columns = [f"{metric}_{period}" for metric in ('output_tps', 'input_tps', 'rps', 'goodput')
+                          for period in ('overall', 'steady') if f"{metric}_{period}" in comparative_df.columns]
+    print(comparative_df[[*id_columns, *throughput_columns, 'steady_duration']].round(2).to_string(index=False))
+    
+    if error_columns:
+        print("\n7. 失败请求 (错误率及按类型的失败数):")
+        print(comparative_df[[*id_columns, 'error_rate', *error_columns]].round(4).to_string(index=False))
     
     return comparison_file
 
+def sweep_config(runs: List[Dict], test_kwargs: Dict) -> Dict:
+    """进度清单中记录的扫描配置，不包含API Key等与测试结果无关的参数"""
+    return {**{key: test_kwargs.get(key) for key in SWEEP_CONFIG_KEYS}, 'runs': runs}
+
+def sweep_progress(runs: List[Dict], test_kwargs: Dict, output_dir: str = './output') -> Union[int, None]:
+    """存在相同配置的未完成扫描时返回已完成的子测试数，否则返回None"""
+    manifest = RunManifest(os.path.join(output_dir, MANIFEST_FILE))
+    planned_files = [get_output_file(output_dir=output_dir, **run) for run in runs]
+    if manifest.matches(sweep_config(runs, test_kwargs)) and \
+            any(manifest.status(file) != 'completed' for file in planned_files):
+        return sum(manifest.status(file) == 'completed' for file in planned_files)
+    return None
+
+async def run_sweep(runs: List[Dict], test_kwargs: Dict, output_dir: str = './output',
+                    resume: bool = False) -> Dict:
+    """依次运行扫描中的各个子测试并生成对比分析报告
+
+    runs为各子测试的参数 (batch_size、request_rate等)，test_kwargs为所有子测试共用的run_batch_test参数；
+    resume为True且进度清单中的配置相同时，跳过已完成的子测试并继续未完成的子测试
+    """
+    manifest = RunManifest(os.path.join(output_dir, MANIFEST_FILE))
+    config = sweep_config(runs, test_kwargs)
+    planned_files = [get_output_file(output_dir=output_dir, **run) for run in runs]
+    resume = resume and manifest.matches(config)
+    if not resume:
+        manifest.start(config)
+    
+    # 执行所有batch size (或请求速率) 的测试
+    output_files = []
+    for run, output_file in zip(runs, planned_files):
+        if resume and manifest.status(output_file) == 'completed':
+            print(f"\n跳过已完成的测试: {output_file}")
+            output_files.append(output_file)
+            continue
+        
+        manifest.mark(output_file, 'running')
+        try:
+            await run_batch_test(**test_kwargs, **run, output_dir=output_dir, resume=resume)
+        except Exception as e:
+            # 单个子测试失败不影响后续测试，重新运行时可从失败处继续
+            manifest.mark(output_file, 'failed', error=str(e))
+            print(f"\n测试过程中发生错误: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            continue
+        manifest.mark(output_file, 'completed')
+        output_files.append(output_file)
+    
+    comparison_file = None
+    if output_files:
+        # 生成对比分析报告
+        comparison_file = await run_comparative_analysis(
+            output_files, ttft_slo=test_kwargs.get('ttft_slo'), tpot_slo=test_kwargs.get('tpot_slo'),
+            output_dir=output_dir
+        )
+    return {
+        'output_files': output_files,
+        'failed': len(planned_files) - len(output_files),
+        'comparison_file': comparison_file,
+    }
+
 async def main():
+    import pandas as pd
     # 获取用户输入
     print("欢迎使用批量性能测试工具")
     print("请输入测试配置：")
     
-    # 获取API配置
-    # api_key = input("请输入API Key: ").strip()
-    # base_url = input("请输入base URL (直接回车使用默认值): ").strip()
-    # model = input("请输入模型名称 (直接回车使用gpt-3.5-turbo): ").strip() or "gpt-3.5-turbo"
-
-    api_key = "sk-123456"
-    base_url = "http://192.168.10.250:8002/v1"  # 添加自定义endpoint
-    model = "/opt/llm/Qwen/Qwen2-72B-Instruct-GPTQ-Int3"
+    # 获取API配置，默认值来自环境变量 (可写在.env文件中)
+    load_dotenv()
+    api_key = os.getenv('LLM_API_KEY') or input("请输入API Key: ").strip()
+    default_base_url = os.getenv('LLM_BASE_URL', '')
+    base_url = input(f"请输入base URL (直接回车使用{default_base_url or '默认值'}): ").strip() or default_base_url or None
+    default_model = os.getenv('LLM_MODEL', 'gpt-3.5-turbo')
+    model = input(f"请输入模型名称 (直接回车使用{default_model}): ").strip() or default_model
     
-    # 获取batch sizes
+    # 选择负载模式
+    print("\n可选的负载模式：")
+    print("1. 批处理模式 - 按batch size分批发送，等待整批完成后发送下一批")
+    print("2. 开环速率模式 - 按目标请求速率发送，不等待请求完成")
+    print("3. 滑动窗口模式 - 保持固定数量的在途请求，任一请求完成后立即补发")
+    print("4. 轨迹回放模式 - 按生产请求日志中的到达时刻和长度回放")
+    print("5. SLO搜索模式 - 自动搜索满足p99 TTFT/TPOT目标的最大请求速率")
     while True:
-        batch_sizes_input = input("请输入要测试的batch sizes (用逗号分隔，例如: 1,2,4,8): ").strip()
         try:
-            batch_sizes = [int(size.strip()) for size in batch_sizes_input.split(',')]
-            if all(size > 0 for size in batch_sizes):
-                break
-            else:
-                print("错误：batch size必须大于0")
+            load_mode = int(input("请选择负载模式 (1-5，直接回车使用1): ").strip() or 1)
+            if load_mode not in [1, 2, 3, 4, 5]:
+                raise ValueError
+            break
         except ValueError:
-            print("错误：请输入有效的数字，用逗号分隔")
+            print("请输入有效的选项 (1-5)")
     
+    batch_sizes = []
+    request_rates = []
+    trace_scales = []
+    ttft_slo = tpot_slo = None
+    arrival_process = 'poisson'
+    ramp_up = 0.0
     input_file = "./input/short_input_long_output_prompts.csv"
+    if load_mode == 4:
+        while True:
+            input_file = input("请输入请求轨迹文件路径 (CSV或JSONL): ").strip()
+            try:
+                TraceReader(input_file)
+                break
+            except (OSError, ValueError) as e:
+                print(f"错误：{e}")
+        while True:
+            scales_input = input("请输入回放倍速 (用逗号分隔，例如: 1,2，直接回车使用1): ").strip() or '1'
+            try:
+                trace_scales = [float(scale.strip()) for scale in scales_input.split(',')]
+                if all(scale > 0 for scale in trace_scales):
+                    break
+                else:
+                    print("错误：回放倍速必须大于0")
+            except ValueError:
+                print("错误：请输入有效的数字，用逗号分隔")
+    elif load_mode == 5:
+        while True:
+            try:
+                ttft_slo = float(input("请输入p99 TTFT目标 (ms): ").strip())
+                tpot_slo = float(input("请输入p99 TPOT目标 (ms): ").strip())
+                start_rate = float(input("请输入起始请求速率 req/s (直接回车使用1): ").strip() or 1)
+                max_rate = float(input("请输入最大请求速率 req/s (直接回车使用256): ").strip() or 256)
+                probe_duration = float(input("请输入每个探测点的时长 (秒，直接回车使用30): ").strip() or 30)
+                if min(ttft_slo, tpot_slo, start_rate, probe_duration) <= 0 or max_rate < start_rate:
+                    raise ValueError
+                break
+            except ValueError:
+                print("错误：请输入有效的正数，且最大速率不小于起始速率")
+        while True:
+            arrival_process = input("请输入到达过程 (constant/poisson/gamma，直接回车使用poisson): ").strip() or 'poisson'
+            if arrival_process in ARRIVAL_PROCESSES:
+                break
+            print(f"错误：到达过程必须是 {', '.join(ARRIVAL_PROCESSES)} 之一")
+    elif load_mode in [1, 3]:
+        # 获取batch sizes
+        while True:
+            batch_sizes_input = input("请输入要测试的batch sizes (用逗号分隔，例如: 1,2,4,8): ").strip()
+            try:
+                batch_sizes = [int(size.strip()) for size in batch_sizes_input.split(',')]
+                if all(size > 0 for size in batch_sizes):
+                    break
+                else:
+                    print("错误：batch size必须大于0")
+            except ValueError:
+                print("错误：请输入有效的数字，用逗号分隔")
+        
+        if load_mode == 3:
+            while True:
+                try:
+                    ramp_up = float(input("请输入并发爬坡时间 (秒，直接回车不爬坡): ").strip() or 0)
+                    if ramp_up < 0:
+                        raise ValueError
+                    break
+                except ValueError:
+                    print("错误：爬坡时间必须是非负数")
+    else:
+        # 获取请求速率
+        while True:
+            rates_input = input("请输入要测试的请求速率 req/s (用逗号分隔，例如: 0.5,1,2,4): ").strip()
+            try:
+                request_rates = [float(rate.strip()) for rate in rates_input.split(',')]
+                if all(rate > 0 for rate in request_rates):
+                    break
+                else:
+                    print("错误：请求速率必须大于0")
+            except ValueError:
+                print("错误：请输入有效的数字，用逗号分隔")
+        
+        while True:
+            arrival_process = input("请输入到达过程 (constant/poisson/gamma，直接回车使用poisson): ").strip() or 'poisson'
+            if arrival_process in ARRIVAL_PROCESSES:
+                break
+            print(f"错误：到达过程必须是 {', '.join(ARRIVAL_PROCESSES)} 之一")
+    
+    # 获取负载进程数
+    while True:
+        try:
+            workers = int(input("请输入负载生成进程数 (直接回车使用1): ").strip() or 1)
+            if workers <= 0:
+                raise ValueError
+            break
+        except ValueError:
+            print("错误：进程数必须是大于0的整数")
+    
+    # 选择客户端传输层
+    while True:
+        transport = input("请选择客户端传输层 (openai/http，直接回车使用openai): ").strip() or 'openai'
+        if transport in TRANSPORTS:
+            break
+        print(f"错误：传输层必须是 {', '.join(TRANSPORTS)} 之一")
+    
+    # 多端点测试：按路由策略将请求分配到多个副本或模型，可对比多个策略的尾延迟
+    endpoints = None
+    routings = [None]
+    while True:
+        endpoints_file = input("请输入多端点配置文件 (JSON，直接回车只测试单一端点): ").strip()
+        if not endpoints_file:
+            break
+        try:
+            endpoints = load_endpoints(endpoints_file)
+            break
+        except (OSError, ValueError, TypeError) as e:
+            print(f"错误：{e}")
+    while endpoints:
+        routing_input = input(f"请输入路由策略 ({'/'.join(ROUTING_POLICIES)}，用逗号分隔可对比多个，"
+                              f"直接回车使用round_robin): ").strip() or 'round_robin'
+        routings = [routing.strip() for routing in routing_input.split(',')]
+        if not all(routing in ROUTING_POLICIES for routing in routings):
+            print(f"错误：路由策略必须是 {', '.join(ROUTING_POLICIES)} 之一")
+        elif load_mode == 5 and len(routings) > 1:
+            print("错误：SLO搜索模式只能指定一个路由策略")
+        else:
+            break
+    
+    # 吞吐测试通常不需要响应文本，不保存可减少客户端开销和输出文件大小
+    keep_response = input("是否在结果中保存响应文本? (y/n，直接回车使用y): ").strip().lower() != 'n'
+    
+    # 多轮会话数据集 (带session_id列) 以会话为单位调度，轮次之间等待思考时间
+    think_time = 0.0
+    if load_mode != 4 and 'session_id' in pd.read_csv(input_file, nrows=0).columns:
+        while True:
+            try:
+                think_time = float(input("请输入多轮会话的平均思考时间 (秒，直接回车使用0): ").strip() or 0)
+                if think_time < 0:
+                    raise ValueError
+                break
+            except ValueError:
+                print("错误：思考时间必须是非负数")
+    
+    # 测试过程中在本地端口提供Prometheus格式的实时指标
+    while True:
+        port_input = input("请输入实时指标 (/metrics) 端口 (例如: 9400，直接回车不启用): ").strip()
+        try:
+            metrics_port = int(port_input) if port_input else None
+            if metrics_port is None or 0 < metrics_port < 65536:
+                break
+            print("错误：端口必须在1-65535之间")
+        except ValueError:
+            print("错误：请输入有效的端口号")
+    
+    # 采样分析请求处理中的客户端热点，用于排查客户端瓶颈
+    profile = input("是否开启客户端采样分析? (y/n，直接回车使用n): ").strip().lower() == 'y'
+    
+    # 过载时请求可能长时间没有响应，超时的请求由客户端取消并按阶段记为timeout
+    while True:
+        timeout_input = input("请输入请求超时 connect,ttft,stall,total (秒，例如: 5,60,30,600，"
+                              "不限制的阶段留空，直接回车不限制): ").strip()
+        try:
+            values = [value.strip() for value in timeout_input.split(',')] if timeout_input else []
+            if len(values) > len(TIMEOUT_PHASES):
+                raise ValueError
+            timeouts = {phase: float(value) for phase, value in zip(TIMEOUT_PHASES, values) if value}
+            if all(timeout > 0 for timeout in timeouts.values()):
+                break
+            print("错误：超时必须大于0")
+        except ValueError:
+            print("错误：请输入最多4个用逗号分隔的数字")
+    
+    # 满足逐请求TTFT/TPOT目标的请求计入goodput (SLO搜索模式直接使用搜索目标)
+    while load_mode != 5:
+        slo_input = input("请输入计算goodput的TTFT,TPOT目标 (ms，例如: 500,50，直接回车跳过): ").strip()
+        if not slo_input:
+            break
+        try:
+            ttft_slo, tpot_slo = (float(value.strip()) for value in slo_input.split(','))
+            if ttft_slo > 0 and tpot_slo > 0:
+                break
+            print("错误：目标必须大于0")
+        except ValueError:
+            print("错误：请输入两个用逗号分隔的数字")
+        ttft_slo = tpot_slo = None
+    
+    # 预热阶段的请求照常发送并写入结果文件，但不计入统计
+    warmup_requests, warmup_seconds = 0, 0.0
+    while True:
+        warmup = input("请输入预热请求数或预热时长 (如20或30s，直接回车不预热): ").strip().lower()
+        try:
+            if warmup.endswith('s'):
+                warmup_seconds = float(warmup[:-1])
+            elif warmup:
+                warmup_requests = int(warmup)
+            if warmup_requests < 0 or warmup_seconds < 0:
+                raise ValueError
+            break
+        except ValueError:
+            warmup_requests, warmup_seconds = 0, 0.0
+            print("错误：预热请求数必须是非负整数，预热时长必须是非负数")
     
     # 确认开始测试
     print("\n测试配置：")
     print(f"Model: {model}")
     print(f"Base URL: {base_url or '默认'}")
-    print(f"Batch sizes: {batch_sizes}")
+    if endpoints:
+        for endpoint in endpoints:
+            print(f"Endpoint: {endpoint['model']} @ {endpoint['base_url']} (weight {endpoint.get('weight', 1)})")
+        print(f"Routing: {', '.join(routings)}")
+    if load_mode == 1:
+        print(f"Batch sizes: {batch_sizes}")
+    elif load_mode == 3:
+        print(f"Concurrency levels: {batch_sizes} (ramp-up {ramp_up}s)")
+    elif load_mode == 4:
+        print(f"Trace time scales: {trace_scales}")
+    elif load_mode == 5:
+        print(f"SLO: p99 TTFT <= {ttft_slo} ms, p99 TPOT <= {tpot_slo} ms "
+              f"(rate {start_rate}-{max_rate} req/s, {arrival_process}, {probe_duration}s per probe)")
+    else:
+        print(f"Request rates: {request_rates} ({arrival_process})")
+    print(f"Workers: {workers}")
+    print(f"Transport: {transport}")
+    print(f"Keep response: {keep_response}")
+    if think_time:
+        print(f"Think time: {think_time}s")
+    if metrics_port:
+        print(f"Metrics port: {metrics_port}")
+    if profile:
+        print("Client profiling: on")
+    if ttft_slo is not None and load_mode != 5:
+        print(f"Goodput SLO: TTFT <= {ttft_slo} ms, TPOT <= {tpot_slo} ms")
+    if warmup_requests or warmup_seconds:
+        print(f"Warm-up: {f'{warmup_requests} requests' if warmup_requests else f'{warmup_seconds}s'}")
     print(f"Input file: {input_file}")
     
     confirm = input("\n是否开始测试? (y/n): ").strip().lower()
@@ -314,30 +1996,81 @@ async def main():
         print("测试已取消")
         return
     
-    # 执行所有batch size的测试
-    output_files = []
-    try:
-        for batch_size in batch_sizes:
-            output_file = await run_batch_test(
-                api_key=api_key,
-                base_url=base_url,
-                input_file=input_file,
-                batch_size=batch_size,
-                model=model
-            )
-            output_files.append(output_file)
-        
-        # 生成对比分析报告
-        comparison_file = await run_comparative_analysis(output_files)
-        
-        print(f"\n测试完成！")
-        print(f"各批次详细结果已保存至: {', '.join(output_files)}")
-        print(f"对比分析报告已保存至: {comparison_file}")
-        
-    except Exception as e:
-        print(f"\n测试过程中发生错误: {str(e)}")
-        import traceback
-        traceback.print_exc()
+    if load_mode == 5:
+        await run_slo_search(
+            api_key=api_key,
+            base_url=base_url,
+            input_file=input_file,
+            model=model,
+            ttft_slo=ttft_slo,
+            tpot_slo=tpot_slo,
+            start_rate=start_rate,
+            max_rate=max_rate,
+            probe_duration=probe_duration,
+            arrival_process=arrival_process,
+            workers=workers,
+            transport=transport,
+            keep_response=keep_response,
+            think_time=think_time,
+            warmup_requests=warmup_requests,
+            warmup_seconds=warmup_seconds,
+            metrics_port=metrics_port,
+            profile=profile,
+            endpoints=endpoints,
+            routing=routings[0] or 'round_robin',
+            timeouts=timeouts
+        )
+        return
+    
+    # 扫描中的每个子测试，多端点测试时每个路由策略各运行一遍
+    runs = [
+        {'batch_size': batch_size, 'sliding_window': load_mode == 3, 'ramp_up': ramp_up}
+        for batch_size in batch_sizes
+    ] + [
+        {'batch_size': 1, 'request_rate': request_rate, 'arrival_process': arrival_process}
+        for request_rate in request_rates
+    ] + [
+        {'batch_size': 1, 'trace_scale': trace_scale}
+        for trace_scale in trace_scales
+    ]
+    if endpoints:
+        runs = [{**run, 'routing': routing} for routing in routings for run in runs]
+    test_kwargs = {
+        'api_key': api_key,
+        'base_url': base_url,
+        'input_file': input_file,
+        'model': model,
+        'workers': workers,
+        'transport': transport,
+        'keep_response': keep_response,
+        'think_time': think_time,
+        'warmup_requests': warmup_requests,
+        'warmup_seconds': warmup_seconds,
+        'ttft_slo': ttft_slo,
+        'tpot_slo': tpot_slo,
+        'metrics_port': metrics_port,
+        'profile': profile,
+        'endpoints': endpoints,
+        'timeouts': timeouts
+    }
+    
+    # 相同配置的扫描被中断过时，可以从中断处继续
+    resume = False
+    completed = sweep_progress(runs, test_kwargs)
+    if completed is not None:
+        print(f"\n检测到相同配置的未完成测试 (已完成 {completed}/{len(runs)} 个子测试)")
+        resume = input("是否从中断处继续? (y/n): ").strip().lower() == 'y'
+    
+    result = await run_sweep(runs, test_kwargs, resume=resume)
+    if not result['output_files']:
+        print("\n没有成功完成的测试")
+        return
+    
+    print(f"\n测试完成！")
+    print(f"各批次详细结果已保存至: {', '.join(result['output_files'])}")
+    print(f"对比分析报告已保存至: {result['comparison_file']}")
+    if result['failed']:
+        print(f"有 {result['failed']} 个子测试失败，重新运行并选择继续即可补测")
 
 if __name__ == "__main__":
     try:
@@ -17,15 +17,134 @@ Created: October 2024
 License: Apache License 2.0
 """
 
-import pandas as pd
+import argparse
+import os
 import numpy as np
-from modelscope import AutoTokenizer
-from typing import List, Dict
-import json
+from typing import TYPE_CHECKING, List, Dict, Optional
+
+from tokenizer_cache import DEFAULT_TOKENIZER, load_tokenizer
+
+# 只导入LengthDistribution等定义时 (如模拟服务) 不加载pandas
+if TYPE_CHECKING:
+    import pandas as pd
+
+LENGTH_DISTRIBUTIONS = ('fixed', 'uniform', 'normal', 'empirical')
+
+
+class LengthDistribution:
+    """token长度分布，用于指定生成提示词的输入长度和max_tokens"""
+
+    def __init__(self,
+                 kind: str = 'fixed',
+                 value: int = 128,
+                 low: int = None,
+                 high: int = None,
+                 mean: float = None,
+                 std: float = None,
+                 values: List[int] = None,
+                 weights: List[float] = None,
+                 min_value: int = 1,
+                 max_value: int = None):
+        if kind not in LENGTH_DISTRIBUTIONS:
+            raise ValueError(f"不支持的长度分布: {kind}，可选: {', '.join(LENGTH_DISTRIBUTIONS)}")
+        if kind == 'uniform' and (low is None or high is None or low > high):
+            raise ValueError("uniform分布需要指定low <= high")
+        if kind == 'normal' and (mean is None or std is None or std < 0):
+            raise ValueError("normal分布需要指定mean和非负的std")
+        if kind == 'empirical' and not values:
+            raise ValueError("empirical分布需要指定长度样本values")
+
+        self.kind = kind
+        self.value = value
+        self.low = low
+        self.high = high
+        self.mean = mean
+        self.std = std
+        self.values = np.asarray(values, dtype=np.int64) if values is not None else None
+        if weights is not None:
+            weights = np.asarray(weights, dtype=float)
+            weights = weights / weights.sum()
+        self.weights = weights
+        # 采样结果截断到[min_value, max_value]
+        self.min_value = min_value
+        self.max_value = max_value
+
+    @classmethod
+    def from_csv(cls, path: str, column: str = 'input_tokens', weight_column: str = None,
+                 **kwargs) -> 'LengthDistribution':
+        """从线上日志导出的CSV加载经验分布
+
+        每行可以是一个请求的长度样本，也可以是直方图的一个分桶 (由weight_column给出频数)
+        """
+        import pandas as pd
+        df = pd.read_csv(path, usecols=[column] + ([weight_column] if weight_column else []))
+        df = df.dropna()
+        weights = df[weight_column].tolist() if weight_column else None
+        return cls('empirical', values=df[column].astype(int).tolist(), weights=weights, **kwargs)
+
+    @classmethod
+    def from_spec(cls, spec) -> 'LengthDistribution':
+        """从简写或配置项创建长度分布
+
+        支持整数 (固定长度)、字符串 "fixed:128"、"uniform:100,2000"、"normal:1000,200"、
+        "empirical:lengths.csv:column[:weight_column]"，以及包含kind等构造参数的字典 (YAML场景文件)
+        """
+        if isinstance(spec, cls):
+            return spec
+        if isinstance(spec, dict):
+            spec = dict(spec)
+            if 'path' in spec:
+                path = spec.pop('path')
+                spec.pop('kind', None)
+                return cls.from_csv(path, **spec)
+            return cls(**spec)
+        if isinstance(spec, (int, np.integer)):
+            return cls('fixed', value=int(spec))
+        kind, _, args = str(spec).strip().partition(':')
+        if not args and kind.isdigit():
+            return cls('fixed', value=int(kind))
+        if kind == 'fixed':
+            return cls('fixed', value=int(args))
+        if kind == 'uniform':
+            low, high = map(int, args.split(','))
+            return cls('uniform', low=low, high=high)
+        if kind == 'normal':
+            mean, std = map(float, args.split(','))
+            return cls('normal', mean=mean, std=std)
+        if kind == 'empirical':
+            path, column, *weight_column = args.split(':')
+            return cls.from_csv(path, column=column, weight_column=weight_column[0] if weight_column else None)
+        raise ValueError(f"无法解析长度分布: {spec}")
+
+    def sample(self, rng: np.random.Generator, count: int) -> np.ndarray:
+        if self.kind == 'fixed':
+            lengths = np.full(count, self.value)
+        elif self.kind == 'uniform':
+            lengths = rng.integers(self.low, self.high + 1, size=count)
+        elif self.kind == 'normal':
+            lengths = np.rint(rng.normal(self.mean, self.std, size=count))
+        else:
+            lengths = rng.choice(self.values, size=count, p=self.weights)
+        return np.clip(lengths, self.min_value, self.max_value).astype(np.int64)
+
+    def describe(self) -> str:
+        if self.kind == 'fixed':
+            return f"fixed({self.value})"
+        if self.kind == 'uniform':
+            return f"uniform({self.low}, {self.high})"
+        if self.kind == 'normal':
+            return f"normal(mean={self.mean}, std={self.std})"
+        return f"empirical({len(self.values)} bins)"
+
 
 class PromptGenerator:
-    def __init__(self):
-        self.tokenizer = AutoTokenizer.from_pretrained('qwen/Qwen-7B-Chat', trust_remote_code=True)
+    def __init__(self, seed: Optional[int] = None, tokenizer: str = DEFAULT_TOKENIZER):
+        # 首次加载后缓存为本地序列化形式，之后的运行无需modelscope和网络
+        self.tokenizer = load_tokenizer(tokenizer)
+        # 固定seed时生成的数据集可复现
+        self.rng = np.random.default_rng(seed)
+        self._token_cache: Dict[str, int] = {}
+        self._pool_tokens: Optional[List[int]] = None
         
         # 扩展内容库
         self.content_library = {
@@ -134,155 +253,484 @@ class PromptGenerator:
             'long_input_short_output': "请用一句话总结主要观点" 
         }
 
-    def _get_random_content(self, content_type: str) -> str:
-        """从内容库中随机获取内容"""
-        if content_type in self.content_library:
-            return np.random.choice(self.content_library[content_type])
-        return f"[{content_type}]"
-
-    def generate_short_input_long_output(self, count: int) -> List[Dict]:
-        """生成短输入/长输出的提示词"""
-        prompts = []
-        for _ in range(count):
-            topic = np.random.choice(self.content_library['topics'])
-            template = np.random.choice(self.content_library['short_input'])
-            prompt = template.format(topic=topic)
-            
-            tokens = len(self.tokenizer.encode(prompt))
-            prompts.append({
-                'prompt': prompt,
-                'token_count': tokens,
-                'type': 'short_input_long_output',
-                'topic': topic
-            })
-        return prompts
-
-    def generate_long_input_long_output(self, count: int) -> List[Dict]:
-        """生成长输入/长输出的提示词"""
-        prompts = []
-        for _ in range(count):
-            topic = np.random.choice(self.content_library['topics'])
-            prompt = f"""
-以下是一份关于{topic}的详细报告，{self.tasks['long_input_long_output']}：
+    # 长输入模式的提示词模板，占位符为内容库中的类型
+    LONG_INPUT_TEMPLATES = {
+        'long_input_long_output': """
+以下是一份关于{topic}的详细报告，{task}：
 
 背景介绍：
-{self._get_random_content('background')}
+{background}
 
 主要内容：
-{self._get_random_content('main_content')}
+{main_content}
 
 技术细节：
-{self._get_random_content('technical_details')}
+{technical_details}
 
 应用场景：
-{self._get_random_content('applications')}
+{applications}
 
 发展趋势：
-{self._get_random_content('trends')}
+{trends}
 
 问题与挑战：
-{self._get_random_content('challenges')}
-"""
-            
-            tokens = len(self.tokenizer.encode(prompt))
-            prompts.append({
-                'prompt': prompt,
-                'token_count': tokens,
-                'type': 'long_input_long_output',
-                'topic': topic
-            })
-        return prompts
-
-    def generate_long_input_short_output(self, count: int) -> List[Dict]:
-        """生成长输入/短输出的提示词"""
-        prompts = []
-        for _ in range(count):
-            topic = np.random.choice(self.content_library['topics'])
-            prompt = f"""
-请分析以下关于{topic}的详细资料，{self.tasks['long_input_short_output']}：
+{challenges}
+""",
+        'long_input_short_output': """
+请分析以下关于{topic}的详细资料，{task}：
 
 市场背景：
-{self._get_random_content('market_background')}
+{market_background}
 
 技术分析：
-{self._get_random_content('technical_analysis')}
+{technical_analysis}
 
 竞争格局：
-{self._get_random_content('competition')}
+{competition}
 
 用户反馈：
-{self._get_random_content('user_feedback')}
+{user_feedback}
 
 投资数据：
-{self._get_random_content('investment_data')}
-"""
-            
-            tokens = len(self.tokenizer.encode(prompt))
-            prompts.append({
-                'prompt': prompt,
-                'token_count': tokens,
-                'type': 'long_input_short_output',
-                'topic': topic
-            })
-        return prompts
+{investment_data}
+""",
+    }
+    # 多轮会话的追问模板
+    FOLLOW_UP_QUESTIONS = [
+        "请针对你上面提到的第一点展开详细说明，并给出具体案例",
+        "上述分析中哪些结论的不确定性最大？请说明原因",
+        "如果预算有限，应该优先投入哪些方向？请给出理由",
+        "请把上面的内容整理成一份结构化的提纲",
+        "能否从反方的角度，对上面的观点提出质疑并逐一回应？",
+        "请结合{topic}在国内的发展情况，补充相关数据和政策背景",
+        "请估算一下上面提到的各项措施的实施周期和成本",
+        "请用通俗易懂的语言，把上面的内容向非技术背景的管理者解释一遍"
+    ]
+    LONG_INPUT_SECTIONS = {
+        'long_input_long_output': ['background', 'main_content', 'technical_details',
+                                   'applications', 'trends', 'challenges'],
+        'long_input_short_output': ['market_background', 'technical_analysis', 'competition',
+                                    'user_feedback', 'investment_data'],
+    }
+
+    def _count_tokens(self, texts: List[str]) -> np.ndarray:
+        """计算一组文本的token数，相同文本只编码一次"""
+        counts = np.empty(len(texts), dtype=np.int64)
+        for i, text in enumerate(texts):
+            tokens = self._token_cache.get(text)
+            if tokens is None:
+                tokens = len(self.tokenizer.encode(text))
+                self._token_cache[text] = tokens
+            counts[i] = tokens
+        return counts
+
+    def _render(self, prompt_type: str, topic: str, fragments: List[str]) -> str:
+        if prompt_type == 'short_input_long_output':
+            return fragments[0].format(topic=topic)
+        sections = dict(zip(self.LONG_INPUT_SECTIONS[prompt_type], fragments))
+        return self.LONG_INPUT_TEMPLATES[prompt_type].format(
+            topic=topic, task=self.tasks[prompt_type], **sections)
+
+    def generate(self, prompt_type: str, count: int) -> 'pd.DataFrame':
+        """批量生成提示词
+
+        一次性抽取所有主题和内容片段的下标，相同组合只渲染、编码一次，
+        再按下标映射回每条提示词，生成大规模数据集时无需逐条分词
+        """
+        import pandas as pd
+        topics = self.content_library['topics']
+        if prompt_type == 'short_input_long_output':
+            columns = [topics, self.content_library['short_input']]
+        elif prompt_type in self.LONG_INPUT_SECTIONS:
+            columns = [topics] + [self.content_library[content_type]
+                                  for content_type in self.LONG_INPUT_SECTIONS[prompt_type]]
+        else:
+            raise ValueError(f"不支持的提示词类型: {prompt_type}")
+
+        # 每列独立均匀抽样，然后将各列下标按混合进制编码为一个整数，便于去重
+        indices = np.stack([self.rng.integers(len(column), size=count) for column in columns], axis=1)
+        radices = np.cumprod([1] + [len(column) for column in columns[:-1]])
+        codes = indices @ radices
+        _, first_rows, inverse = np.unique(codes, return_index=True, return_inverse=True)
+
+        unique_prompts = [
+            self._render(prompt_type, topics[row[0]], [column[i] for column, i in zip(columns[1:], row[1:])])
+            for row in indices[first_rows]
+        ]
+        unique_tokens = self._count_tokens(unique_prompts)
+
+        return pd.DataFrame({
+            'prompt': np.array(unique_prompts, dtype=object)[inverse],
+            'token_count': unique_tokens[inverse],
+            'type': prompt_type,
+            'topic': np.array(topics, dtype=object)[indices[:, 0]],
+        })
+
+    def _token_pool(self) -> List[int]:
+        """将内容库中的所有文本编码为一个token序列，作为按长度截取提示词的素材"""
+        if self._pool_tokens is None:
+            texts = []
+            for content_type, contents in self.content_library.items():
+                if content_type not in ('topics', 'short_input'):
+                    texts.extend(contents)
+            self._pool_tokens = self.tokenizer.encode("\n".join(texts))
+        return self._pool_tokens
+
+    def _fit_length(self, pool: np.ndarray, offset: int, target: int, max_attempts: int = 8) -> str:
+        """从素材的offset位置截取文本，使其编码后恰好为target个token
+
+        截断处的token解码后可能是不完整的字符，重新编码时BPE也会在边界合并或拆分，
+        长度不符时二分查找编码长度不超过target的最长文本前缀；
+        个别多token字符导致无法恰好命中时，换一个起始位置重试
+        """
+        text = ""
+        for attempt in range(max_attempts):
+            start = offset + attempt * 7
+            tokens = pool[(start + np.arange(target + 2)) % len(pool)].tolist()
+            # 多数情况下直接解码target个token即可命中
+            text = self.tokenizer.decode(tokens[:target]).replace('\ufffd', '')
+            length = len(self.tokenizer.encode(text))
+            if length == target:
+                break
+
+            # 否则在附近二分查找：文本前缀的编码长度随前缀长度单调不减
+            text = self.tokenizer.decode(tokens).replace('\ufffd', '')
+            low = max(0, len(text) * min(length, target) // max(length, 1) - 8)
+            high = len(text)
+            while low < high:
+                middle = (low + high + 1) // 2
+                if len(self.tokenizer.encode(text[:middle])) <= target:
+                    low = middle
+                else:
+                    high = middle - 1
+            text = text[:low]
+            if len(self.tokenizer.encode(text)) == target:
+                break
+        return text
+
+    def generate_with_lengths(self,
+                              count: int,
+                              input_lengths: LengthDistribution,
+                              output_lengths: Optional[LengthDistribution] = None) -> 'pd.DataFrame':
+        """按目标输入长度分布生成提示词，每条提示词的token数精确等于采样得到的长度
+
+        output_lengths不为空时为每条提示词生成max_tokens列，由性能测试作为请求的max_tokens发送
+        """
+        import pandas as pd
+        pool = np.asarray(self._token_pool())
+        targets = input_lengths.sample(self.rng, count)
+        # 各提示词从素材的随机位置开始截取，素材不够长时循环使用
+        offsets = self.rng.integers(len(pool), size=count)
+
+        prompts = []
+        token_counts = np.empty(count, dtype=np.int64)
+        for i, (target, offset) in enumerate(zip(targets, offsets)):
+            prompt = self._fit_length(pool, int(offset), int(target))
+            prompts.append(prompt)
+            token_counts[i] = len(self.tokenizer.encode(prompt))
+
+        df = pd.DataFrame({
+            'prompt': prompts,
+            'token_count': token_counts,
+            'type': 'target_length',
+            'target_tokens': targets,
+        })
+        if output_lengths is not None:
+            df['max_tokens'] = output_lengths.sample(self.rng, count)
+        mismatched = int((df['token_count'] != df['target_tokens']).sum())
+        if mismatched:
+            print(f"警告: {mismatched} 条提示词未能精确达到目标长度")
+        return df
+
+    def generate_shared_prefix(self,
+                               count: int,
+                               prefix_lengths: LengthDistribution,
+                               pool_size: int = 8,
+                               shared_fraction: float = 0.8,
+                               zipf_alpha: float = 1.0,
+                               output_lengths: Optional[LengthDistribution] = None) -> 'pd.DataFrame':
+        """生成共享前缀的提示词，用于测试服务端前缀缓存 (如vLLM APC、SGLang RadixAttention)
+
+        shared_fraction比例的请求从pool_size个长前缀 (系统提示词/文档) 中选择一个，
+        第k个前缀被选中的概率正比于 1/k^zipf_alpha；其余请求使用各不相同的前缀。
+        每条提示词以前缀开头，后接一个随机问题；prefix_id为-1表示不共享前缀
+        """
+        import pandas as pd
+        if not 0 <= shared_fraction <= 1:
+            raise ValueError("shared_fraction必须在0到1之间")
+        if pool_size <= 0:
+            raise ValueError("pool_size必须大于0")
+
+        pool = np.asarray(self._token_pool())
+        popularity = 1.0 / np.arange(1, pool_size + 1) ** zipf_alpha
+        popularity /= popularity.sum()
+
+        shared = self.rng.random(count) < shared_fraction
+        prefix_ids = np.where(shared, self.rng.choice(pool_size, size=count, p=popularity), -1)
+        # 共享前缀和各个独享前缀都从素材的不同位置截取
+        prefix_count = pool_size + int((~shared).sum())
+        prefix_targets = prefix_lengths.sample(self.rng, prefix_count)
+        prefix_offsets = self.rng.integers(len(pool), size=prefix_count)
+        prefixes = [self._fit_length(pool, int(offset), int(target))
+                    for offset, target in zip(prefix_offsets, prefix_targets)]
+        prefix_index = prefix_ids.copy()
+        prefix_index[~shared] = pool_size + np.arange(prefix_count - pool_size)
+
+        topics = self.content_library['topics']
+        questions = self.content_library['short_input']
+        topic_indices = self.rng.integers(len(topics), size=count)
+        question_indices = self.rng.integers(len(questions), size=count)
+        prompts = [
+            f"{prefixes[index]}\n\n{questions[question].format(topic=topics[topic])}"
+            for index, question, topic in zip(prefix_index, question_indices, topic_indices)
+        ]
+
+        df = pd.DataFrame({
+            'prompt': prompts,
+            'token_count': self._count_tokens(prompts),
+            'type': 'shared_prefix',
+            'topic': np.array(topics, dtype=object)[topic_indices],
+            'prefix_id': prefix_ids,
+            'prefix_tokens': prefix_targets[prefix_index],
+        })
+        if output_lengths is not None:
+            df['max_tokens'] = output_lengths.sample(self.rng, count)
+        return df
+
+    def generate_conversations(self,
+                               sessions: int,
+                               turns: LengthDistribution,
+                               output_lengths: Optional[LengthDistribution] = None) -> 'pd.DataFrame':
+        """生成多轮会话数据集，每行为一轮用户消息
+
+        第一轮为短输入问题，之后各轮为追问；性能测试按session_id将各轮组成会话，
+        每轮请求都带上之前所有轮次的用户消息和模型回复，上下文逐轮增长
+        """
+        import pandas as pd
+        topics = self.content_library['topics']
+        questions = self.content_library['short_input']
+        turn_counts = turns.sample(self.rng, sessions)
+        total = int(turn_counts.sum())
+
+        session_ids = np.repeat(np.arange(sessions), turn_counts)
+        # 每行在所属会话中的轮次 (从1开始)
+        turn_numbers = np.arange(total) - np.repeat(np.cumsum(turn_counts) - turn_counts, turn_counts) + 1
+        session_topics = self.rng.integers(len(topics), size=sessions)
+        first_questions = self.rng.integers(len(questions), size=sessions)
+        follow_ups = self.rng.integers(len(self.FOLLOW_UP_QUESTIONS), size=total)
+
+        prompts = []
+        for session_id, turn, follow_up in zip(session_ids, turn_numbers, follow_ups):
+            topic = topics[session_topics[session_id]]
+            template = questions[first_questions[session_id]] if turn == 1 else self.FOLLOW_UP_QUESTIONS[follow_up]
+            prompts.append(template.format(topic=topic))
+
+        df = pd.DataFrame({
+            'prompt': prompts,
+            'token_count': self._count_tokens(prompts),
+            'type': 'conversation',
+            'topic': np.array(topics, dtype=object)[session_topics[session_ids]],
+            'session_id': session_ids,
+            'turn': turn_numbers,
+        })
+        if output_lengths is not None:
+            df['max_tokens'] = output_lengths.sample(self.rng, total)
+        return df
+
+    def generate_short_input_long_output(self, count: int) -> List[Dict]:
+        """生成短输入/长输出的提示词"""
+        return self.generate('short_input_long_output', count).to_dict('records')
+
+    def generate_long_input_long_output(self, count: int) -> List[Dict]:
+        """生成长输入/长输出的提示词"""
+        return self.generate('long_input_long_output', count).to_dict('records')
+
+    def generate_long_input_short_output(self, count: int) -> List[Dict]:
+        """生成长输入/短输出的提示词"""
+        return self.generate('long_input_short_output', count).to_dict('records')
                 
-def main():
+def input_length_distribution(name: str) -> LengthDistribution:
+    """交互式输入一个长度分布"""
+    while True:
+        try:
+            kind = input(f"请选择{name}分布 (fixed/uniform/normal/empirical，默认fixed): ").strip() or 'fixed'
+            if kind == 'fixed':
+                return LengthDistribution('fixed', value=int(input(f"请输入{name}: ")))
+            if kind == 'uniform':
+                low, high = map(int, input(f"请输入{name}范围 (如 100,2000): ").split(','))
+                return LengthDistribution('uniform', low=low, high=high)
+            if kind == 'normal':
+                mean, std = map(float, input(f"请输入{name}的均值和标准差 (如 1000,200): ").split(','))
+                return LengthDistribution('normal', mean=mean, std=std)
+            if kind == 'empirical':
+                path = input("请输入线上日志导出的CSV文件路径: ").strip()
+                column = input("请输入长度列名: ").strip()
+                weight_column = input("请输入频数列名 (每行为一个样本时直接回车): ").strip() or None
+                return LengthDistribution.from_csv(path, column=column, weight_column=weight_column)
+            raise ValueError(f"不支持的长度分布: {kind}")
+        except (ValueError, OSError, KeyError) as e:
+            print(f"输入无效: {e}")
+
+
+# 生成模式及其默认输出文件
+GENERATION_MODES = {
+    'short_input_long_output': './input/short_input_long_output_prompts.csv',
+    'long_input_long_output': './input/long_input_long_output_prompts.csv',
+    'long_input_short_output': './input/long_input_short_output_prompts.csv',
+    'target_length': './input/target_length_prompts.csv',
+    'shared_prefix': './input/shared_prefix_prompts.csv',
+    'conversation': './input/conversation_prompts.csv',
+}
+
+
+def generate_dataset(generator: PromptGenerator,
+                     mode: str,
+                     count: int,
+                     input_lengths=None,
+                     output_lengths=None,
+                     prefix_lengths=None,
+                     pool_size: int = 8,
+                     shared_fraction: float = 0.8,
+                     zipf_alpha: float = 1.0,
+                     turns=None) -> 'pd.DataFrame':
+    """按生成模式生成数据集，长度分布可以是LengthDistribution或LengthDistribution.from_spec支持的写法"""
+    if mode not in GENERATION_MODES:
+        raise ValueError(f"不支持的生成模式: {mode}，可选: {', '.join(GENERATION_MODES)}")
+    output_lengths = LengthDistribution.from_spec(output_lengths) if output_lengths is not None else None
+    if mode == 'target_length':
+        if input_lengths is None:
+            raise ValueError("target_length模式需要指定输入长度分布")
+        return generator.generate_with_lengths(count, LengthDistribution.from_spec(input_lengths), output_lengths)
+    if mode == 'shared_prefix':
+        if prefix_lengths is None:
+            raise ValueError("shared_prefix模式需要指定前缀长度分布")
+        return generator.generate_shared_prefix(count, LengthDistribution.from_spec(prefix_lengths),
+                                                pool_size=pool_size, shared_fraction=shared_fraction,
+                                                zipf_alpha=zipf_alpha, output_lengths=output_lengths)
+    if mode == 'conversation':
+        if turns is None:
+            raise ValueError("conversation模式需要指定每个会话的轮数分布")
+        return generator.generate_conversations(count, LengthDistribution.from_spec(turns), output_lengths)
+    return generator.generate(mode, count)
+
+
+def print_summary(df: 'pd.DataFrame', output_file: str):
+    """打印生成数据集的统计信息和样例"""
+    print(f"\n生成完成！结果已保存至 {output_file}")
+    print("\n统计信息：")
+    print(f"总数量: {len(df)}")
+    print(f"平均token数: {df['token_count'].mean():.2f}")
+    print(f"最小token数: {df['token_count'].min()}")
+    print(f"最大token数: {df['token_count'].max()}")
+    if 'max_tokens' in df.columns:
+        print(f"平均max_tokens: {df['max_tokens'].mean():.2f}")
+    if 'prefix_id' in df.columns:
+        print(f"共享前缀请求比例: {(df['prefix_id'] >= 0).mean():.2%}")
+    if 'session_id' in df.columns:
+        print(f"会话数量: {df['session_id'].nunique()}，平均轮数: {df.groupby('session_id').size().mean():.2f}")
+    
+    # 打印样例
+    print("\n示例提示词：")
+    for i, row in df.head(2).iterrows():
+        print(f"\n示例 {i+1} ({row['token_count']} tokens):")
+        print(f"类型: {row['type']}")
+        if 'topic' in row:
+            print(f"主题: {row['topic']}")
+        print(f"提示词: {row['prompt'][:200]}...")
+
+
+def interactive_main():
     print("欢迎使用LLM测试提示词生成工具")
     print("\n可选的生成模式：")
     print("1. 短输入/长输出 - 适用于生成任务")
     print("2. 长输入/长输出 - 适用于分析任务")
     print("3. 长输入/短输出 - 适用于分类任务")
+    print("4. 指定长度分布 - 精确控制输入token数和max_tokens")
+    print("5. 共享前缀 - 适用于测试服务端前缀缓存")
+    print("6. 多轮会话 - 上下文逐轮增长的对话场景")
     
     while True:
         try:
-            mode = int(input("\n请选择生成模式 (1-3): "))
-            if mode not in [1, 2, 3]:
+            mode = int(input("\n请选择生成模式 (1-6): "))
+            if mode not in [1, 2, 3, 4, 5, 6]:
                 raise ValueError
             break
         except ValueError:
-            print("请输入有效的选项 (1-3)")
+            print("请输入有效的选项 (1-6)")
     
     while True:
         try:
-            count = int(input("请输入需要生成的提示词数量: "))
+            count = int(input("请输入需要生成的提示词数量 (多轮会话模式为会话数量): "))
             if count <= 0:
                 raise ValueError
             break
         except ValueError:
             print("请输入大于0的数字")
     
-    generator = PromptGenerator()
+    seed = input("请输入随机种子 (直接回车则不固定): ").strip()
+    generator = PromptGenerator(seed=int(seed) if seed else None)
     
     # 根据选择生成提示词
-    if mode == 1:
-        prompts = generator.generate_short_input_long_output(count)
-        output_file = "./input/short_input_long_output_prompts.csv"
-    elif mode == 2:
-        prompts = generator.generate_long_input_long_output(count)
-        output_file = "./input/long_input_long_output_prompts.csv"
-    else:
-        prompts = generator.generate_long_input_short_output(count)
-        output_file = "./input/long_input_short_output_prompts.csv"
+    mode = list(GENERATION_MODES)[mode - 1]
+    options = {}
+    if mode == 'target_length':
+        options['input_lengths'] = input_length_distribution("输入token数")
+        if input("是否为每条提示词生成max_tokens？(y/n): ").lower() == 'y':
+            options['output_lengths'] = input_length_distribution("max_tokens")
+    elif mode == 'shared_prefix':
+        options['prefix_lengths'] = input_length_distribution("前缀token数")
+        options['pool_size'] = int(input("请输入共享前缀池大小 (默认8): ") or 8)
+        options['shared_fraction'] = float(input("请输入共享前缀的请求比例 (0-1，默认0.8): ") or 0.8)
+        options['zipf_alpha'] = float(input("请输入前缀热度的Zipf指数 (默认1.0，越大越集中): ") or 1.0)
+    elif mode == 'conversation':
+        options['turns'] = input_length_distribution("每个会话的轮数")
+        if input("是否为每轮生成max_tokens？(y/n): ").lower() == 'y':
+            options['output_lengths'] = input_length_distribution("max_tokens")
+    output_file = GENERATION_MODES[mode]
+    df = generate_dataset(generator, mode, count, **options)
     
     # 保存结果
-    df = pd.DataFrame(prompts)
     df.to_csv(output_file, index=False)
+    print_summary(df, output_file)
+
+
+def main():
+    """不带参数时交互式生成，指定--mode时按命令行参数生成 (可用于定时任务)"""
+    parser = argparse.ArgumentParser(description="生成LLM性能测试用的提示词数据集")
+    parser.add_argument('--mode', choices=list(GENERATION_MODES), help="生成模式，不指定时进入交互模式")
+    parser.add_argument('--count', type=int, default=100, help="提示词数量 (多轮会话模式为会话数量)")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--input-lengths', help="target_length模式的输入token数分布，如 normal:1000,200")
+    parser.add_argument('--output-lengths', help="max_tokens分布，如 fixed:256，不指定时不生成max_tokens")
+    parser.add_argument('--prefix-lengths', help="shared_prefix模式的前缀token数分布")
+    parser.add_argument('--pool-size', type=int, default=8, help="共享前缀池大小")
+    parser.add_argument('--shared-fraction', type=float, default=0.8, help="共享前缀的请求比例")
+    parser.add_argument('--zipf-alpha', type=float, default=1.0, help="前缀热度的Zipf指数")
+    parser.add_argument('--turns', help="conversation模式每个会话的轮数分布，如 uniform:2,6")
+    parser.add_argument('--output', help="输出文件，默认按生成模式保存到input目录")
+    parser.add_argument('--tokenizer', default=DEFAULT_TOKENIZER, help="计算token数的tokenizer (modelscope模型名称或本地目录)")
+    args = parser.parse_args()
     
-    # 打印统计信息
-    print(f"\n生成完成！结果已保存至 {output_file}")
-    print("\n统计信息：")
-    print(f"总数量: {len(df)}")
-    print(f"平均token数: {df['token_count'].mean():.2f}")
-    print(f"最小token数: {df['token_count'].min()}")
-    print(f"最大token数: {df['token_count'].max()}")
+    if args.mode is None:
+        interactive_main()
+        return
+    if args.count <= 0:
+        parser.error("--count必须大于0")
     
-    # 打印样例
-    print("\n示例提示词：")
-    for i, row in df.head(2).iterrows():
-        print(f"\n示例 {i+1} ({row['token_count']} tokens):")
-        print(f"类型: {row['type']}")
-        print(f"主题: {row['topic']}")
-        print(f"提示词: {row['prompt'][:200]}...")
+    generator = PromptGenerator(seed=args.seed, tokenizer=args.tokenizer)
+    try:
+        df = generate_dataset(generator, args.mode, args.count,
+                              input_lengths=args.input_lengths, output_lengths=args.output_lengths,
+                              prefix_lengths=args.prefix_lengths, pool_size=args.pool_size,
+                              shared_fraction=args.shared_fraction, zipf_alpha=args.zipf_alpha, turns=args.turns)
+    except (ValueError, OSError, KeyError) as e:
+        parser.error(str(e))
+    output_file = args.output or GENERATION_MODES[args.mode]
+    directory = os.path.dirname(output_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    df.to_csv(output_file, index=False)
+    print_summary(df, output_file)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM Result Store
+~~~~~~~~~~~~~~~~~~~~~~~~
+
+Append-only storage for per-request results.
+
+Results are written as JSON Lines by a background task while the test is
+running, so memory does not grow with the dataset and an interrupted run
+keeps every request that already finished. Result files (JSONL, or CSV
+from earlier versions) are read back lazily in chunks.
+
+RunManifest records the progress of a multi-run sweep so that an
+interrupted sweep can be resumed without re-sending finished requests.
+
+License: Apache License 2.0
+"""
+
+import asyncio
+import json
+import os
+import shutil
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Set
+
+# 只有读取结果文件时需要pandas，只写入结果的负载进程不导入
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+
+class ResultWriter:
+    """后台写入任务：请求完成后将结果逐条追加写入JSONL文件"""
+
+    def __init__(self, path: str, mode: str = 'w', flush_interval: float = 1.0):
+        self.path = path
+        self.mode = mode
+        # 至少每隔flush_interval秒刷新一次文件缓冲，中断时最多丢失这段时间内的结果
+        self.flush_interval = flush_interval
+        self._file = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, self.mode, encoding='utf-8')
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    def write(self, record: Dict):
+        self._queue.put_nowait(record)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        last_flush = loop.time()
+        closing = False
+        while not closing:
+            records = [await self._queue.get()]
+            # 一次取出队列中积压的所有结果，合并为一次写入
+            while not self._queue.empty():
+                records.append(self._queue.get_nowait())
+            if records[-1] is None:
+                records.pop()
+                closing = True
+
+            if records:
+                data = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+                # 文件写入放到线程中执行，避免阻塞事件循环
+                await loop.run_in_executor(None, self._file.write, data)
+            if closing or loop.time() - last_flush >= self.flush_interval:
+                await loop.run_in_executor(None, self._file.flush)
+                last_flush = loop.time()
+
+    async def close(self):
+        if self._task is None:
+            return
+        self._queue.put_nowait(None)
+        await self._task
+        self._file.close()
+        self._task = None
+
+
+def iter_result_chunks(path: str, chunksize: int = 10000, columns: List[str] = None) -> 'Iterator[pd.DataFrame]':
+    """分块读取结果文件，columns用于只保留需要的列"""
+    import pandas as pd
+    if path.endswith('.jsonl'):
+        if os.path.getsize(path) == 0:
+            return
+        # 不自动把start_time等列解析为日期，保持原始数值
+        reader = pd.read_json(path, lines=True, chunksize=chunksize, convert_dates=False, keep_default_dates=False)
+    else:
+        reader = pd.read_csv(path, chunksize=chunksize,
+                             usecols=(lambda column: column in columns) if columns else None)
+
+    with reader:
+        for chunk in reader:
+            if columns:
+                chunk = chunk[[column for column in columns if column in chunk.columns]]
+            yield chunk
+
+
+def concat_result_files(parts: List[str], path: str, append: bool = False):
+    """将多个进程写出的分片文件按顺序合并为一个结果文件，并删除分片"""
+    with open(path, 'ab' if append else 'wb') as output:
+        for part in parts:
+            with open(part, 'rb') as source:
+                shutil.copyfileobj(source, output)
+            os.remove(part)
+
+
+def repair_result_file(path: str):
+    """截掉进程被强制终止时写了一半的最后一行，使文件可以继续追加"""
+    with open(path, 'rb+') as file:
+        file.seek(0, os.SEEK_END)
+        size = file.tell()
+        if size == 0:
+            return
+        file.seek(size - 1)
+        if file.read(1) == b'\n':
+            return
+
+        # 向前查找最后一个完整行的结尾
+        position = size
+        block = 4096
+        while position > 0:
+            start = max(0, position - block)
+            file.seek(start)
+            data = file.read(position - start)
+            newline = data.rfind(b'\n')
+            if newline != -1:
+                file.truncate(start + newline + 1)
+                return
+            position = start
+        file.truncate(0)
+
+
+def read_completed_indices(path: str) -> Set[int]:
+    """读取结果文件中已写入的请求序号 (无论成功或失败)"""
+    completed = set()
+    for chunk in iter_result_chunks(path, columns=['prompt_index']):
+        if 'prompt_index' in chunk.columns:
+            completed.update(int(index) for index in chunk['prompt_index'].dropna())
+    return completed
+
+
+class RunManifest:
+    """记录一次扫描测试的配置及各个子测试的完成状态"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.config: Dict = {}
+        self.runs: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as file:
+                data = json.load(file)
+            self.config = data.get('config', {})
+            self.runs = data.get('runs', {})
+
+    def matches(self, config: Dict) -> bool:
+        return self.config == config
+
+    def start(self, config: Dict):
+        """开始新的扫描测试，清空之前的记录"""
+        self.config = config
+        self.runs = {}
+        self.save()
+
+    def status(self, output_file: str) -> Optional[str]:
+        run = self.runs.get(output_file)
+        return run['status'] if run else None
+
+    def mark(self, output_file: str, status: str, **extra):
+        self.runs[output_file] = {'status': status, **extra}
+        self.save()
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 先写临时文件再替换，避免中断时留下损坏的清单
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump({'config': self.config, 'runs': self.runs}, file, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.path)
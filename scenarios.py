@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM Benchmark Scenarios
+~~~~~~~~~~~~~~~~~~~~~~~~
+
+Declarative, non-interactive benchmark runs for scheduled (e.g. nightly)
+performance tests.
+
+A YAML scenario file describes a list of scenarios, each with a workload
+(an existing input file or a dataset to generate), a load schedule
+(batch, concurrency, rate, trace or slo_search with the values to sweep),
+endpoints and test options. `defaults` are merged into every scenario, a
+`matrix` expands one scenario into the cartesian product of the listed
+values, and `${VAR}` / `${VAR:-default}` placeholders are filled from the
+environment and `.env` files, so secrets stay out of the scenario file.
+
+Every scenario runs in its own process and writes its results, manifest
+and comparison report to `<output_dir>/<scenario name>/`. Independent
+scenarios run in parallel (`parallel`); `depends_on` orders the others.
+Parallel scenarios that share a `metrics_port` (e.g. from `defaults`) are
+given consecutive ports.
+The command exits non-zero if any scenario fails.
+
+License: Apache License 2.0
+"""
+
+import argparse
+import asyncio
+import copy
+import itertools
+import multiprocessing as mp
+import os
+import re
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import yaml
+from dotenv import load_dotenv
+
+from endpoint_pool import ROUTING_POLICIES, load_endpoints
+from performance_test import run_slo_search, run_sweep
+from prompt_generator import PromptGenerator, generate_dataset
+from tokenizer_cache import DEFAULT_TOKENIZER
+
+# spawn启动的子进程会重新导入本模块，pandas在汇总结果时再导入
+if TYPE_CHECKING:
+    import pandas as pd
+
+# 负载模式及其扫描值对应的子测试参数
+LOAD_MODES = ('batch', 'concurrency', 'rate', 'trace', 'slo_search')
+# 场景中可以直接设置的run_batch_test参数
+TEST_OPTIONS = ('api_key', 'base_url', 'model', 'workers', 'transport', 'keep_response', 'think_time',
+                'max_requests', 'metrics_port', 'profile', 'overhead_threshold', 'timeouts')
+
+_ENV_PATTERN = re.compile(r'\$\{([A-Za-z_][A-Za-z0-9_]*)(?::-([^}]*))?\}')
+
+
+def expand_env(value):
+    """递归替换配置中的 ${VAR} 和 ${VAR:-default}"""
+    if isinstance(value, dict):
+        return {key: expand_env(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [expand_env(item) for item in value]
+    if not isinstance(value, str):
+        return value
+
+    def replace(match):
+        name, default = match.group(1), match.group(2)
+        if name in os.environ:
+            return os.environ[name]
+        if default is not None:
+            return default
+        raise ValueError(f"环境变量 {name} 未设置")
+
+    # 整个值就是一个占位符时，替换结果按YAML解析数字和布尔值
+    match = _ENV_PATTERN.fullmatch(value)
+    if match:
+        text = replace(match)
+        parsed = yaml.safe_load(text) if text else text
+        return parsed if isinstance(parsed, (bool, int, float)) else text
+    return _ENV_PATTERN.sub(replace, value)
+
+
+def _deep_merge(base: Dict, override: Dict) -> Dict:
+    merged = copy.deepcopy(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _deep_merge(merged[key], value)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+
+def _set_path(config: Dict, path: str, value):
+    """按点分路径设置嵌套配置项，如 load.values"""
+    keys = path.split('.')
+    for key in keys[:-1]:
+        config = config.setdefault(key, {})
+    config[keys[-1]] = value
+
+
+def _label(value) -> str:
+    """矩阵取值在场景名称中的写法，文件路径只保留文件名"""
+    if isinstance(value, (list, tuple)):
+        return '_'.join(_label(item) for item in value)
+    if isinstance(value, str) and ('/' in value or os.sep in value):
+        value = os.path.splitext(os.path.basename(value))[0]
+    return re.sub(r'[^\w.-]+', '_', str(value))
+
+
+def expand_matrix(scenario: Dict) -> List[Dict]:
+    """将带matrix的场景展开为各取值组合的场景
+
+    场景名称中的 {key} (key为矩阵项路径的最后一段) 替换为对应取值，没有占位符时依次追加各取值
+    """
+    matrix = scenario.pop('matrix', None)
+    if not matrix:
+        return [scenario]
+    paths = list(matrix)
+    expanded = []
+    for values in itertools.product(*(matrix[path] for path in paths)):
+        variant = copy.deepcopy(scenario)
+        labels = {}
+        for path, value in zip(paths, values):
+            _set_path(variant, path, value)
+            labels[path.split('.')[-1]] = _label(value)
+        name = scenario['name']
+        if '{' in name:
+            variant['name'] = name.format(**labels)
+        else:
+            variant['name'] = '-'.join([name, *labels.values()])
+        expanded.append(variant)
+    return expanded
+
+
+def load_scenarios(path: str) -> Tuple[Dict, List[Dict], Dict[str, Dict]]:
+    """读取场景文件，返回 (全局设置, 展开后的场景列表, 按场景名索引的测试计划)"""
+    # 当前目录及场景文件所在目录的.env文件，已设置的环境变量优先
+    load_dotenv()
+    load_dotenv(os.path.join(os.path.dirname(os.path.abspath(path)), '.env'))
+    with open(path, encoding='utf-8') as file:
+        config = yaml.safe_load(file) or {}
+
+    defaults = config.get('defaults') or {}
+    scenarios = []
+    for scenario in config.get('scenarios') or []:
+        if not scenario.get('name'):
+            raise ValueError(f"场景必须指定name: {scenario}")
+        scenarios.extend(expand_matrix(_deep_merge(defaults, scenario)))
+    if not scenarios:
+        raise ValueError("场景文件中没有场景")
+    scenarios = [expand_env(scenario) for scenario in scenarios]
+
+    names = [scenario['name'] for scenario in scenarios]
+    duplicated = {name for name in names if names.count(name) > 1}
+    if duplicated:
+        raise ValueError(f"场景名称重复: {', '.join(sorted(duplicated))}")
+    settings = {
+        'output_dir': config.get('output_dir', './output'),
+        'parallel': int(config.get('parallel', 1)),
+    }
+    # 加载时即生成测试计划 (端点配置文件只读取一次)，运行场景时直接使用
+    plans = {}
+    for scenario in scenarios:
+        unknown = [name for name in scenario.get('depends_on') or [] if name not in names]
+        if unknown:
+            raise ValueError(f"场景 {scenario['name']} 依赖的场景不存在: {', '.join(unknown)}")
+        plans[scenario['name']] = plan_scenario(scenario, os.path.join(settings['output_dir'], scenario['name']))
+    return settings, scenarios, plans
+
+
+def _parse_warmup(warmup) -> Tuple[int, float]:
+    """预热请求数 (如20) 或预热时长 (如"30s")"""
+    if warmup is None:
+        return 0, 0.0
+    if isinstance(warmup, str) and warmup.strip().lower().endswith('s'):
+        return 0, float(warmup.strip()[:-1])
+    return int(warmup), 0.0
+
+
+def plan_scenario(scenario: Dict, output_dir: str) -> Dict:
+    """将场景配置转换为测试计划：负载模式、所有子测试共用的参数及各子测试的参数"""
+    load = scenario.get('load') or {}
+    mode = load.get('mode', 'batch')
+    if mode not in LOAD_MODES:
+        raise ValueError(f"场景 {scenario['name']} 的负载模式不支持: {mode}，可选: {', '.join(LOAD_MODES)}")
+    workload = scenario.get('workload') or {}
+    if 'input_file' in workload:
+        input_file = workload['input_file']
+    elif 'generate' in workload:
+        input_file = os.path.join(output_dir, 'prompts.csv')
+    else:
+        raise ValueError(f"场景 {scenario['name']} 的workload必须指定input_file或generate")
+
+    test_kwargs = {key: scenario[key] for key in TEST_OPTIONS if key in scenario}
+    test_kwargs['input_file'] = input_file
+    test_kwargs.setdefault('model', 'gpt-3.5-turbo')
+    test_kwargs.setdefault('base_url', None)
+    if 'api_key' not in test_kwargs:
+        raise ValueError(f"场景 {scenario['name']} 未指定api_key")
+    test_kwargs['warmup_requests'], test_kwargs['warmup_seconds'] = _parse_warmup(scenario.get('warmup'))
+    slo = scenario.get('goodput_slo') or {}
+    test_kwargs['ttft_slo'] = slo.get('ttft')
+    test_kwargs['tpot_slo'] = slo.get('tpot')
+
+    endpoints = scenario.get('endpoints')
+    if isinstance(endpoints, str):
+        endpoints = load_endpoints(endpoints)
+    routings = scenario.get('routing') or ['round_robin']
+    if isinstance(routings, str):
+        routings = [routings]
+    unknown = [routing for routing in routings if routing not in ROUTING_POLICIES]
+    if unknown:
+        raise ValueError(f"场景 {scenario['name']} 的路由策略不支持: {', '.join(unknown)}")
+    test_kwargs['endpoints'] = endpoints
+
+    values = load.get('values') or []
+    if not isinstance(values, list):
+        values = [values]
+    if mode == 'slo_search':
+        if load.get('ttft_slo') is None or load.get('tpot_slo') is None:
+            raise ValueError(f"场景 {scenario['name']} 的slo_search需要指定ttft_slo和tpot_slo")
+        if endpoints and len(routings) > 1:
+            raise ValueError(f"场景 {scenario['name']} 的slo_search只能指定一个路由策略")
+        # 搜索的SLO同时作为goodput的目标
+        test_kwargs['ttft_slo'] = load['ttft_slo']
+        test_kwargs['tpot_slo'] = load['tpot_slo']
+        # 每个探测点的请求数由速率和probe_duration决定，忽略场景 (或defaults) 中的max_requests
+        test_kwargs.pop('max_requests', None)
+        search = {key: load[key] for key in ('start_rate', 'max_rate', 'probe_duration', 'arrival_process')
+                  if key in load}
+        if endpoints:
+            search['routing'] = routings[0]
+        return {'mode': mode, 'output_dir': output_dir, 'test_kwargs': test_kwargs, 'search': search}
+
+    if not values:
+        raise ValueError(f"场景 {scenario['name']} 未指定load.values")
+    if mode == 'batch':
+        runs = [{'batch_size': int(value)} for value in values]
+    elif mode == 'concurrency':
+        runs = [{'batch_size': int(value), 'sliding_window': True, 'ramp_up': load.get('ramp_up', 0.0),
+                 **{key: load[key] for key in ('hold', 'ramp_down') if key in load}} for value in values]
+    elif mode == 'rate':
+        runs = [{'batch_size': 1, 'request_rate': float(value),
+                 'arrival_process': load.get('arrival_process', 'poisson')} for value in values]
+    else:
+        runs = [{'batch_size': 1, 'trace_scale': float(value)} for value in values]
+    if endpoints:
+        runs = [{**run, 'routing': routing} for routing in routings for run in runs]
+    return {'mode': mode, 'output_dir': output_dir, 'test_kwargs': test_kwargs, 'runs': runs}
+
+
+def _prepare_workload(scenario: Dict, plan: Dict, resume: bool = False):
+    """按场景的generate配置生成数据集，继续之前的运行时复用已生成的数据集"""
+    generate = dict((scenario.get('workload') or {}).get('generate') or {})
+    if not generate:
+        return
+    input_file = plan['test_kwargs']['input_file']
+    if resume and os.path.exists(input_file):
+        return
+    mode = generate.pop('mode', 'short_input_long_output')
+    count = int(generate.pop('count', 100))
+    generator = PromptGenerator(seed=generate.pop('seed', None), tokenizer=generate.pop('tokenizer', DEFAULT_TOKENIZER))
+    df = generate_dataset(generator, mode, count, **generate)
+    os.makedirs(os.path.dirname(input_file), exist_ok=True)
+    df.to_csv(input_file, index=False)
+    print(f"已生成 {len(df)} 条提示词: {input_file}")
+
+
+async def _run_plan(plan: Dict, resume: bool) -> Dict:
+    if plan['mode'] == 'slo_search':
+        result = await run_slo_search(**plan['test_kwargs'], **plan['search'], output_dir=plan['output_dir'])
+        return {'output_files': [], 'failed': 0, 'comparison_file': result['curve_file'],
+                'max_rate': result['max_rate']}
+    return await run_sweep(plan['runs'], plan['test_kwargs'], output_dir=plan['output_dir'], resume=resume)
+
+
+def run_scenario(scenario: Dict, plan: Dict, resume: bool = False, log: bool = False) -> Dict:
+    """在当前进程中按plan_scenario生成的计划运行一个场景 (由进程池调用)，log为True时输出写入场景目录下的日志文件"""
+    scenario_dir = plan['output_dir']
+    os.makedirs(scenario_dir, exist_ok=True)
+    log_file = os.path.join(scenario_dir, 'scenario.log')
+    if log:
+        # 在文件描述符层面重定向，负载子进程的输出同样写入日志
+        log_fd = os.open(log_file, os.O_WRONLY | os.O_CREAT | os.O_APPEND)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(log_fd, 1)
+        os.dup2(log_fd, 2)
+        os.close(log_fd)
+
+    started = time.time()
+    summary = {'scenario': scenario['name'], 'status': 'completed', 'log_file': log_file if log else None}
+    try:
+        _prepare_workload(scenario, plan, resume)
+        result = asyncio.run(_run_plan(plan, resume))
+        summary.update(result)
+        if not result['output_files'] and plan['mode'] != 'slo_search':
+            summary['status'] = 'failed'
+        elif result['failed']:
+            summary['status'] = 'partial'
+    except Exception as e:
+        traceback.print_exc()
+        summary['status'] = 'failed'
+        summary['error'] = str(e)
+    summary['duration_s'] = round(time.time() - started, 1)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    return summary
+
+
+def assign_metrics_ports(scenarios: List[Dict], plans: Dict[str, Dict]):
+    """并行运行时场景不能绑定同一个Prometheus端口：端口已被之前的场景使用时依次向后取未使用的端口"""
+    used = set()
+    for scenario in scenarios:
+        test_kwargs = plans[scenario['name']]['test_kwargs']
+        port = test_kwargs.get('metrics_port')
+        if not port:
+            continue
+        port = int(port)
+        while port in used:
+            port += 1
+        if port >= 65536:
+            raise ValueError(f"场景 {scenario['name']} 没有可用的metrics_port")
+        used.add(port)
+        test_kwargs['metrics_port'] = port
+
+
+def run_scenarios(path: str, only: List[str] = None, parallel: int = None, resume: bool = False,
+                  dry_run: bool = False) -> 'pd.DataFrame':
+    """运行场景文件中的所有场景 (或only指定的场景)，相互独立的场景最多parallel个同时运行"""
+    import pandas as pd
+    settings, scenarios, plans = load_scenarios(path)
+    if only:
+        missing = [name for name in only if name not in {scenario['name'] for scenario in scenarios}]
+        if missing:
+            raise ValueError(f"场景不存在: {', '.join(missing)}")
+        scenarios = [scenario for scenario in scenarios if scenario['name'] in only]
+    output_dir = settings['output_dir']
+    parallel = parallel or settings['parallel']
+    if parallel > 1:
+        assign_metrics_ports(scenarios, plans)
+
+    print(f"共 {len(scenarios)} 个场景，最多 {parallel} 个并行，结果目录: {output_dir}")
+    for scenario in scenarios:
+        plan = plans[scenario['name']]
+        if 'runs' in plan:
+            runs = f"{len(plan['runs'])} 个子测试"
+        else:
+            runs = f"TTFT目标 {plan['test_kwargs']['ttft_slo']}ms，TPOT目标 {plan['test_kwargs']['tpot_slo']}ms"
+        depends = f"，依赖 {', '.join(scenario['depends_on'])}" if scenario.get('depends_on') else ''
+        port = f"，指标端口 {plan['test_kwargs']['metrics_port']}" if plan['test_kwargs'].get('metrics_port') else ''
+        print(f"- {scenario['name']}: {plan['mode']}，{runs}{depends}{port}")
+    if dry_run:
+        return pd.DataFrame()
+
+    selected = {scenario['name'] for scenario in scenarios}
+    pending = {scenario['name']: scenario for scenario in scenarios}
+    results: Dict[str, Dict] = {}
+    running = {}
+    # 每个场景运行在独立的进程中，互不争用事件循环；spawn方式与多进程负载生成一致
+    with ProcessPoolExecutor(max_workers=parallel, mp_context=mp.get_context('spawn')) as executor:
+        while pending or running:
+            for name, scenario in list(pending.items()):
+                if len(running) >= parallel:
+                    break
+                # 只等待本次运行的场景，未选中的依赖视为已满足
+                depends = [dep for dep in scenario.get('depends_on') or [] if dep in selected]
+                if any(dep not in results for dep in depends):
+                    continue
+                del pending[name]
+                failed = [dep for dep in depends if results[dep]['status'] in ('failed', 'skipped')]
+                if failed:
+                    results[name] = {'scenario': name, 'status': 'skipped',
+                                     'error': f"依赖的场景失败: {', '.join(failed)}"}
+                    print(f"\n跳过场景 {name}: 依赖的场景失败")
+                    continue
+                print(f"\n开始场景 {name}")
+                future = executor.submit(run_scenario, scenario, plans[name], resume, parallel > 1)
+                running[future] = name
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    results[name] = {'scenario': name, 'status': 'failed', 'error': str(e)}
+                print(f"场景 {name} 结束: {results[name]['status']}")
+
+    summary = pd.DataFrame([results[scenario['name']] for scenario in scenarios])
+    if 'output_files' in summary.columns:
+        summary['output_files'] = summary['output_files'].apply(
+            lambda files: ';'.join(files) if isinstance(files, list) else files)
+    os.makedirs(output_dir, exist_ok=True)
+    summary_file = os.path.join(output_dir, 'scenario_summary.csv')
+    summary.to_csv(summary_file, index=False)
+    print("\n场景运行结果：")
+    columns = [column for column in ('scenario', 'status', 'duration_s', 'comparison_file', 'error')
+               if column in summary.columns]
+    print(summary[columns].to_string(index=False))
+    print(f"\n结果汇总已保存至: {summary_file}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按YAML场景文件无人值守地运行性能测试")
+    parser.add_argument('config', help="场景文件 (YAML)")
+    parser.add_argument('--only', help="只运行指定的场景，用逗号分隔")
+    parser.add_argument('--parallel', type=int, default=None, help="同时运行的场景数，覆盖场景文件中的parallel")
+    parser.add_argument('--resume', action='store_true', help="跳过各场景中已完成的子测试，继续之前中断的运行")
+    parser.add_argument('--dry-run', action='store_true', help="只检查场景文件并列出测试计划，不发送请求")
+    args = parser.parse_args()
+
+    try:
+        summary = run_scenarios(args.config, only=args.only.split(',') if args.only else None,
+                                parallel=args.parallel, resume=args.resume, dry_run=args.dry_run)
+    except (OSError, ValueError, yaml.YAMLError) as e:
+        print(f"错误：{e}")
+        sys.exit(2)
+    if len(summary) and (summary['status'] != 'completed').any():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import math
+
+import numpy as np
+import pytest
+
+from compare_runs import bootstrap_percentiles, compare, mann_whitney, order_statistic_index
+
+
+def test_mann_whitney_separated_samples():
+    p_value, superiority = mann_whitney(np.array([1.0, 2.0, 3.0]), np.array([4.0, 5.0, 6.0]))
+    # U = 9，方差 = 3 * 3 / 12 * 7，z = (9 - 4.5 - 0.5) / sqrt(5.25)
+    assert superiority == 1.0
+    assert p_value == pytest.approx(math.erfc(4 / math.sqrt(5.25) / math.sqrt(2)))
+
+
+def test_mann_whitney_is_symmetric():
+    rng = np.random.default_rng(0)
+    baseline, candidate = rng.normal(100, 10, 300), rng.normal(103, 10, 300)
+    p_forward, greater = mann_whitney(baseline, candidate)
+    p_backward, smaller = mann_whitney(candidate, baseline)
+    assert p_forward == pytest.approx(p_backward)
+    assert greater + smaller == pytest.approx(1.0)
+    assert p_forward < 0.01
+
+
+def test_mann_whitney_all_ties():
+    values = np.full(5, 7.0)
+    assert mann_whitney(values, values) == (1.0, 0.5)
+
+
+def test_order_statistic_index():
+    assert order_statistic_index(100, 50) == 50
+    assert order_statistic_index(100, 99.5) == 100
+    assert order_statistic_index(10, 0) == 1
+
+
+def test_bootstrap_returns_sample_values():
+    rng = np.random.default_rng(1)
+    values = np.sort(rng.exponential(10, 500))
+    samples = bootstrap_percentiles(values, (50, 100), 4000, rng)
+    assert samples.shape == (4000, 2)
+    assert np.isin(samples, values).all()
+    # 重采样包含原样本最大值的概率为 1 - (1 - 1/n)^n
+    expected = 1 - (1 - 1 / len(values)) ** len(values)
+    assert (samples[:, 1] == values[-1]).mean() == pytest.approx(expected, abs=0.03)
+    assert np.median(samples[:, 0]) == pytest.approx(np.median(values), rel=0.05)
+
+
+def test_bootstrap_matches_resampling():
+    rng = np.random.default_rng(2)
+    values = np.sort(rng.normal(50, 5, 200))
+    direct = bootstrap_percentiles(values, (90,), 20000, rng)[:, 0]
+    resampled = np.array([
+        np.sort(rng.choice(values, size=len(values)))[order_statistic_index(len(values), 90) - 1]
+        for _ in range(5000)
+    ])
+    assert direct.mean() == pytest.approx(resampled.mean(), rel=0.005)
+    assert direct.std() == pytest.approx(resampled.std(), rel=0.1)
+
+
+def test_compare_flags_regression_beyond_threshold():
+    rng = np.random.default_rng(3)
+    baseline = {'ttft': np.sort(rng.lognormal(5, 0.3, 2000))}
+    slower = {'ttft': np.sort(rng.lognormal(5, 0.3, 2000) * 1.3)}
+    rows = compare(baseline, slower, ['ttft'], threshold=5.0, seed=0)
+    assert [row['percentile'] for row in rows] == ['p50', 'p90', 'p99']
+    assert all(row['regression'] and not row['improvement'] for row in rows)
+    assert rows[0]['change_pct'] == pytest.approx(30, abs=5)
+
+
+def test_compare_ignores_noise():
+    rng = np.random.default_rng(4)
+    baseline = {'output_tps': np.sort(rng.normal(1000, 20, 300))}
+    candidate = {'output_tps': np.sort(rng.normal(1000, 20, 300))}
+    rows = compare(baseline, candidate, ['output_tps'], threshold=5.0, seed=0)
+    assert rows and not any(row['regression'] or row['improvement'] for row in rows)
+
+
+def test_compare_higher_is_better_direction():
+    rng = np.random.default_rng(5)
+    baseline = {'rps': np.sort(rng.normal(100, 2, 300))}
+    faster = {'rps': np.sort(rng.normal(120, 2, 300))}
+    rows = compare(baseline, faster, ['rps'], seed=0)
+    assert all(row['improvement'] and not row['regression'] for row in rows)
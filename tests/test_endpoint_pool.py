@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import collections
+import json
+
+import pytest
+
+from endpoint_pool import EndpointPool, load_endpoints
+
+
+def make_pool(weights, policy, seed=None):
+    endpoints = [{'base_url': f'http://replica{index}:8000/v1', 'model': 'm', 'weight': weight}
+                 for index, weight in enumerate(weights)]
+    # http传输层在第一次请求时才创建连接池，构造端点池不会发起连接
+    return EndpointPool(endpoints, policy=policy, transport='http', api_key='test', seed=seed)
+
+
+def names(pool, endpoints):
+    return [pool.endpoints.index(endpoint) for endpoint in endpoints]
+
+
+def pick(pool, count):
+    chosen = []
+    for _ in range(count):
+        endpoint = pool.acquire()
+        pool.release(endpoint)
+        chosen.append(endpoint)
+    return names(pool, chosen)
+
+
+def test_smooth_weighted_round_robin_sequence():
+    pool = make_pool([5, 1, 1], 'round_robin')
+    # 与nginx平滑加权轮询的序列一致：权重大的端点不会连续集中出现
+    assert pick(pool, 7) == [0, 0, 1, 0, 2, 0, 0]
+    assert collections.Counter(pick(pool, 70)) == {0: 50, 1: 10, 2: 10}
+
+
+def test_least_outstanding_uses_weighted_load():
+    pool = make_pool([1, 2], 'least_outstanding')
+    held = [pool.acquire() for _ in range(3)]
+    # 负载按权重归一化：权重为2的端点承担两倍的在途请求
+    assert [endpoint.outstanding for endpoint in pool.endpoints] == [1, 2]
+    for endpoint in held:
+        pool.release(endpoint)
+
+
+def test_least_outstanding_rotates_ties():
+    pool = make_pool([1, 1, 1], 'least_outstanding')
+    assert pick(pool, 6) == [0, 1, 2, 0, 1, 2]
+
+
+def test_power_of_two_avoids_loaded_endpoint():
+    pool = make_pool([1, 1], 'power_of_two', seed=3)
+    busy = pool.acquire()
+    for _ in range(10):
+        endpoint = pool.acquire()
+        assert endpoint is not busy
+        pool.release(endpoint)
+
+
+def test_power_of_two_follows_weights_when_idle():
+    pool = make_pool([3, 1], 'power_of_two', seed=11)
+    counts = collections.Counter(pick(pool, 4000))
+    assert counts[0] / 4000 == pytest.approx(0.75, abs=0.03)
+
+
+def test_pool_validation(tmp_path):
+    with pytest.raises(ValueError):
+        make_pool([1], 'random')
+    with pytest.raises(ValueError):
+        make_pool([0], 'round_robin')
+    path = tmp_path / 'endpoints.json'
+    path.write_text(json.dumps([{'base_url': 'http://a/v1', 'model': 'm'}] * 2))
+    with pytest.raises(ValueError, match="名称重复"):
+        load_endpoints(str(path))
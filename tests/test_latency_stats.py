@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from latency_stats import LatencyHistogram, ThroughputTimeline
+
+
+def test_percentiles_within_precision():
+    rng = np.random.default_rng(0)
+    values = rng.lognormal(mean=4, sigma=1, size=20000)
+    histogram = LatencyHistogram(precision=0.01)
+    histogram.record_many(values)
+    for q in (50, 90, 99, 99.9):
+        exact = np.percentile(values, q, method='inverted_cdf')
+        assert histogram.percentile(q) == pytest.approx(exact, rel=0.01)
+    assert histogram.count == len(values)
+    assert histogram.mean == pytest.approx(values.mean())
+
+
+def test_record_many_matches_record():
+    values = [0.0005, 0.001, 1.5, 2.5, 100.0, 100.0, 3000.0]
+    single, batch = LatencyHistogram(), LatencyHistogram()
+    for value in values:
+        single.record(value)
+    batch.record_many(values)
+    assert single.counts == batch.counts
+    assert (single.min, single.max, single.count) == (batch.min, batch.max, batch.count)
+
+
+def test_percentile_clamped_to_observed_range():
+    histogram = LatencyHistogram()
+    histogram.record(42.0)
+    assert histogram.percentile(0) == 42.0
+    assert histogram.percentile(100) == 42.0
+
+
+def test_censored_samples_rank_after_observations():
+    histogram = LatencyHistogram()
+    histogram.record_many(np.arange(1, 91, dtype=float))
+    histogram.record_censored(10)
+    assert histogram.percentile(50) == pytest.approx(50, rel=0.01)
+    assert histogram.percentile(90) == pytest.approx(90, rel=0.01)
+    # 第91个及之后的样本没有观测值
+    assert histogram.percentile(91) == math.inf
+    assert histogram.percentile(99) == math.inf
+    assert histogram.summary()['censored'] == 10
+
+
+def test_only_censored_samples():
+    histogram = LatencyHistogram()
+    histogram.record_censored(3)
+    assert histogram.percentile(50) == math.inf
+    assert math.isnan(LatencyHistogram().percentile(50))
+
+
+def test_merge_and_round_trip():
+    first, second = LatencyHistogram(), LatencyHistogram()
+    first.record_many([1.0, 2.0, 3.0])
+    first.record_censored(1)
+    second.record_many([10.0, 20.0])
+    second.record_censored(2)
+    first.merge(second)
+    assert first.count == 5
+    assert first.censored == 3
+    assert (first.min, first.max) == (1.0, 20.0)
+
+    restored = LatencyHistogram.from_dict(first.to_dict())
+    assert restored.counts == first.counts
+    assert restored.censored == 3
+    assert restored.percentile(50) == first.percentile(50)
+
+
+def test_merge_rejects_different_buckets():
+    with pytest.raises(ValueError):
+        LatencyHistogram(precision=0.01).merge(LatencyHistogram(precision=0.05))
+
+
+def _requests(schedule, duration=0.9, status='success'):
+    """schedule为 {开始秒数: 请求数}，每个请求持续duration秒"""
+    rows = []
+    for second, count in schedule.items():
+        for _ in range(count):
+            rows.append({'start_time': 1000.0 + second, 'end_time': 1000.0 + second + duration,
+                         'status': status, 'ttft': 100.0, 'tpot': 10.0,
+                         'input_tokens': 100, 'output_tokens': 80})
+    return pd.DataFrame(rows)
+
+
+def test_steady_window_excludes_ramp_up_and_drain():
+    ramp_up = {second: 2 * (second + 1) for second in range(5)}
+    steady = {second: 10 for second in range(5, 25)}
+    drain = {second: 10 - 2 * (second - 24) for second in range(25, 30)}
+    timeline = ThroughputTimeline()
+    timeline.add_frame(_requests({**ramp_up, **steady, **drain}))
+
+    start, end = timeline.steady_window()
+    assert 4 <= start <= 6
+    assert 24 <= end <= 26
+    throughput = timeline.throughput((start, end))
+    assert throughput['rps'] == pytest.approx(10, rel=0.05)
+
+
+def test_steady_window_needs_enough_bins():
+    timeline = ThroughputTimeline()
+    timeline.add_frame(_requests({0: 5, 1: 5}))
+    assert timeline.steady_window() is None
+
+
+def test_failed_requests_count_as_in_flight_only():
+    timeline = ThroughputTimeline()
+    timeline.add_frame(pd.concat([_requests({0: 4}), _requests({0: 6}, status='failed')]))
+    frame = timeline.frame()
+    assert frame.loc[0.0, 'in_flight'] == 10
+    assert frame.loc[0.0, 'completed'] == 4
+    assert frame.loc[0.0, 'failed'] == 6
+    assert frame.loc[0.0, 'input_tokens'] == 400
+    throughput = timeline.throughput()
+    assert (throughput['requests'], throughput['failed']) == (4, 6)
+
+
+def test_unsent_requests_are_skipped():
+    unsent = pd.DataFrame([{'start_time': None, 'end_time': None, 'status': 'failed'}])
+    timeline = ThroughputTimeline()
+    timeline.add_frame(pd.concat([_requests({0: 1}), unsent]))
+    assert timeline.frame()['in_flight'].max() == 1
+
+
+def test_output_tokens_spread_over_decode_interval():
+    frame = pd.DataFrame([{'start_time': 0.5, 'end_time': 4.5, 'ttft': 500.0, 'status': 'success',
+                           'input_tokens': 10, 'output_tokens': 300}])
+    timeline = ThroughputTimeline()
+    timeline.add_frame(frame)
+    output = timeline.frame()['output_tokens']
+    # 解码区间为1.0s-4.5s，每秒约85.7个token
+    assert output.sum() == pytest.approx(300)
+    assert output.loc[1.0] == pytest.approx(300 / 3.5)
+    assert output.loc[4.0] == pytest.approx(300 / 3.5 / 2)
+
+
+def test_goodput_counts_requests_meeting_slo():
+    frame = _requests({0: 3})
+    frame.loc[0, 'ttft'] = 500.0
+    timeline = ThroughputTimeline(ttft_slo=200)
+    timeline.add_frame(frame)
+    assert timeline.frame()['good'].sum() == 2
+
+
+def test_all_failed_frame_without_token_columns():
+    failed = pd.DataFrame([{'start_time': 0.2, 'end_time': 0.4, 'status': 'failed'}] * 3)
+    timeline = ThroughputTimeline()
+    timeline.add_frame(failed)
+    assert timeline.frame()['in_flight'].max() == 3
+    assert timeline.throughput()['failed'] == 3
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from load_scheduler import ArrivalSchedule, ConcurrencySchedule, TraceSchedule, split_count
+
+
+def test_split_count_distributes_remainder():
+    assert [split_count(10, 3, worker) for worker in range(3)] == [4, 3, 3]
+    with pytest.raises(ValueError):
+        split_count(2, 3, 0)
+
+
+@pytest.mark.parametrize('workers', [1, 2, 3, 4])
+def test_arrival_split_preserves_total_rate(workers):
+    schedule = ArrivalSchedule(request_rate=12.0, arrival_process='gamma', burstiness=0.5, seed=7,
+                               max_concurrency=10)
+    parts = [schedule.split(workers, worker) for worker in range(workers)]
+    assert sum(part.request_rate for part in parts) == pytest.approx(12.0)
+    assert sum(part.max_concurrency for part in parts) == 10
+    assert all(part.arrival_process == 'gamma' and part.burstiness == 0.5 for part in parts)
+    # 各进程使用不同的随机种子
+    assert len({part.seed for part in parts}) == workers
+
+
+def test_split_constant_arrivals_interleave_evenly():
+    schedule = ArrivalSchedule(request_rate=10.0, arrival_process='constant')
+    workers = 4
+    offsets = np.sort(np.concatenate([
+        schedule.split(workers, worker).offsets(25) for worker in range(workers)
+    ]))
+    assert np.allclose(offsets, schedule.offsets(100))
+
+
+def test_poisson_offsets_are_reproducible():
+    schedule = ArrivalSchedule(request_rate=5.0, arrival_process='poisson', seed=1)
+    offsets = schedule.offsets(2000)
+    assert offsets[0] == 0.0
+    assert np.all(np.diff(offsets) >= 0)
+    assert np.array_equal(offsets, ArrivalSchedule(request_rate=5.0, seed=1).offsets(2000))
+    assert 2000 / offsets[-1] == pytest.approx(5.0, rel=0.1)
+
+
+def test_arrival_schedule_validation():
+    with pytest.raises(ValueError):
+        ArrivalSchedule(request_rate=0)
+    with pytest.raises(ValueError):
+        ArrivalSchedule(request_rate=1, arrival_process='uniform')
+    with pytest.raises(ValueError):
+        ArrivalSchedule(request_rate=1, max_concurrency=0)
+
+
+def test_concurrency_split_and_ramp():
+    schedule = ConcurrencySchedule(concurrency=9, ramp_up=10, hold=20, ramp_down=10, start_concurrency=1)
+    assert sum(schedule.split(2, worker).concurrency for worker in range(2)) == 9
+    assert schedule.limit_at(0) == 1
+    assert schedule.limit_at(5) == 5
+    assert schedule.limit_at(15) == 9
+    assert schedule.limit_at(35) == 5
+    assert schedule.limit_at(100) == 1
+
+
+def test_trace_split_owns_every_index_once():
+    schedule = TraceSchedule(time_scale=2.0)
+    parts = [schedule.split(3, worker) for worker in range(3)]
+    for index in range(30):
+        assert sum(part.owns(index) for part in parts) == 1
+    assert parts[0].offset(10.0) == 5.0
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pandas as pd
+import pytest
+
+from load_scheduler import ArrivalSchedule
+from performance_test import BatchProcessor, measured_results
+
+
+def make_processor(**kwargs):
+    # http传输层的连接池在第一次请求时才创建，只读取请求时不会发起连接
+    return BatchProcessor('sk-test', 'http://127.0.0.1:1/v1', model='m', transport='http', **kwargs)
+
+
+@pytest.fixture
+def prompts(tmp_path):
+    path = tmp_path / 'prompts.csv'
+    pd.DataFrame({'prompt': [f'prompt {index}' for index in range(5)], 'prefix_id': [0, 1, 0, 2, 1]}) \
+        .to_csv(path, index=False)
+    return str(path)
+
+
+def write_results(path, rows):
+    with open(path, 'w', encoding='utf-8') as file:
+        for row in rows:
+            file.write(json.dumps(row) + '\n')
+
+
+def result_row(index, warmup=False, **extra):
+    row = {'prompt_index': index, 'status': 'success', 'ttft': 100.0, 'tpot': 10.0, 'latency': 500.0,
+           'queue_delay': 0.0, 'input_tokens': 10, 'output_tokens': 40, 'start_time': 1.0, 'end_time': 1.5}
+    if warmup:
+        row['warmup'] = True
+    row.update(extra)
+    return row
+
+
+def test_load_requests_marks_prefix_cache_expectation(prompts):
+    requests = make_processor().load_requests(prompts)
+    assert [request['expected_cache'] for request in requests] == ['miss', 'miss', 'hit', 'miss', 'hit']
+
+
+def test_max_requests_truncates_closed_loop(prompts):
+    assert len(make_processor(max_requests=3).load_requests(prompts)) == 3
+    assert len(make_processor(max_requests=12).load_requests(prompts)) == 5
+
+
+def test_rate_mode_cycles_prompts_up_to_max_requests(prompts, capsys):
+    processor = make_processor(schedule=ArrivalSchedule(request_rate=10), max_requests=12)
+    requests = processor.load_requests(prompts)
+    assert [request['prompt_index'] for request in requests] == list(range(12))
+    assert [request['prompt'] for request in requests[5:7]] == ['prompt 0', 'prompt 1']
+    assert 'Warning' in capsys.readouterr().out
+
+
+def test_resume_skips_written_requests(prompts, tmp_path):
+    output = str(tmp_path / 'results.jsonl')
+    write_results(output, [result_row(0), result_row(2)])
+    with open(output, 'a', encoding='utf-8') as file:
+        file.write('{"prompt_index": 3, "sta')
+    processor = make_processor()
+    requests = processor.load_requests(prompts, output, resume=True)
+    assert [request['prompt_index'] for request in requests] == [1, 3, 4]
+    assert processor.summary.total == 2
+
+
+def test_resume_after_warmup_does_not_warm_up_again(prompts, tmp_path):
+    output = str(tmp_path / 'results.jsonl')
+    write_results(output, [result_row(0, warmup=True), result_row(1, warmup=True), result_row(2)])
+    processor = make_processor(warmup_requests=2, warmup_seconds=5.0)
+    processor.load_requests(prompts, output, resume=True)
+    assert (processor.warmup_requests, processor.warmup_seconds) == (0, 0.0)
+    assert processor.summary.total == 1
+
+
+def test_resume_during_warmup_sends_remaining_warmup(prompts, tmp_path):
+    output = str(tmp_path / 'results.jsonl')
+    write_results(output, [result_row(0, warmup=True)])
+    processor = make_processor(warmup_requests=3)
+    processor.load_requests(prompts, output, resume=True)
+    assert processor.warmup_requests == 2
+    assert processor.summary.total == 0
+
+
+def test_sessions_grouped_by_turn(tmp_path):
+    path = tmp_path / 'conversations.csv'
+    pd.DataFrame({'prompt': ['a2', 'b1', 'a1'], 'session_id': [0, 1, 0], 'turn': [2, 1, 1]}) \
+        .to_csv(path, index=False)
+    processor = make_processor()
+    sessions = processor.load_requests(str(path))
+    assert [[turn['prompt'] for turn in session['turns']] for session in sessions] == [['a1', 'a2'], ['b1']]
+    assert BatchProcessor.request_prompts(sessions) == ['a1', 'a2', 'b1']
+
+
+def test_cached_prompt_tokens_for_worker(prompts):
+    processor = make_processor()
+    requests = processor.load_requests(prompts)
+    for prompt in processor.request_prompts(requests):
+        processor.prompt_token_cache[processor._prompt_key(prompt)] = len(prompt)
+    cache = processor.cached_prompt_tokens(requests[:2])
+    assert sorted(cache.values()) == [8, 8]
+
+
+def test_measured_results_keeps_rows_without_warmup_flag():
+    chunk = pd.DataFrame([result_row(0, warmup=True), result_row(1), result_row(2)])
+    assert measured_results(chunk)['prompt_index'].tolist() == [1, 2]
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+
+import pandas as pd
+
+from result_store import (
+    ResultWriter,
+    RunManifest,
+    concat_result_files,
+    iter_result_chunks,
+    read_completed_indices,
+    repair_result_file,
+)
+
+
+def write_lines(path, records, tail=''):
+    with open(path, 'w', encoding='utf-8') as file:
+        for record in records:
+            file.write(json.dumps(record) + '\n')
+        file.write(tail)
+
+
+def test_repair_truncates_partial_last_line(tmp_path):
+    path = tmp_path / 'results.jsonl'
+    write_lines(path, [{'prompt_index': 0}, {'prompt_index': 1}], tail='{"prompt_index": 2, "ttf')
+    repair_result_file(str(path))
+    assert path.read_text(encoding='utf-8').endswith('\n')
+    assert read_completed_indices(str(path)) == {0, 1}
+
+
+def test_repair_keeps_complete_file(tmp_path):
+    path = tmp_path / 'results.jsonl'
+    write_lines(path, [{'prompt_index': 3}])
+    before = path.read_bytes()
+    repair_result_file(str(path))
+    assert path.read_bytes() == before
+
+
+def test_repair_single_partial_line(tmp_path):
+    path = tmp_path / 'results.jsonl'
+    path.write_text('{"prompt_index": 0', encoding='utf-8')
+    repair_result_file(str(path))
+    assert path.read_bytes() == b''
+    assert read_completed_indices(str(path)) == set()
+
+
+def test_writer_appends_on_resume(tmp_path):
+    path = str(tmp_path / 'results.jsonl')
+
+    async def write(records, mode):
+        writer = ResultWriter(path, mode=mode)
+        await writer.start()
+        for record in records:
+            writer.write(record)
+        await writer.close()
+
+    asyncio.run(write([{'prompt_index': 0, 'status': 'success'}], 'w'))
+    asyncio.run(write([{'prompt_index': 1, 'status': 'failed'}], 'a'))
+    chunks = list(iter_result_chunks(path, columns=['prompt_index', 'status']))
+    assert pd.concat(chunks)['prompt_index'].tolist() == [0, 1]
+
+
+def test_iter_result_chunks_csv_columns(tmp_path):
+    path = tmp_path / 'results.csv'
+    pd.DataFrame({'prompt_index': range(5), 'ttft': range(5), 'prompt': list('abcde')}).to_csv(path, index=False)
+    chunks = list(iter_result_chunks(str(path), chunksize=2, columns=['prompt_index', 'ttft', 'missing']))
+    assert len(chunks) == 3
+    assert list(chunks[0].columns) == ['prompt_index', 'ttft']
+
+
+def test_concat_result_files(tmp_path):
+    parts = []
+    for index in range(2):
+        part = tmp_path / f'part{index}.jsonl'
+        write_lines(part, [{'prompt_index': index}])
+        parts.append(str(part))
+    output = tmp_path / 'results.jsonl'
+    concat_result_files(parts, str(output))
+    assert read_completed_indices(str(output)) == {0, 1}
+    assert not any((tmp_path / f'part{index}.jsonl').exists() for index in range(2))
+
+
+def test_manifest_round_trip(tmp_path):
+    path = str(tmp_path / 'run_manifest.json')
+    config = {'model': 'm', 'runs': [{'batch_size': 1}, {'batch_size': 2}]}
+    manifest = RunManifest(path)
+    assert not manifest.matches(config)
+    manifest.start(config)
+    manifest.mark('batch1.jsonl', 'completed')
+    manifest.mark('batch2.jsonl', 'failed', error='boom')
+
+    restored = RunManifest(path)
+    assert restored.matches(config)
+    assert restored.status('batch1.jsonl') == 'completed'
+    assert restored.runs['batch2.jsonl'] == {'status': 'failed', 'error': 'boom'}
+    assert restored.status('batch4.jsonl') is None
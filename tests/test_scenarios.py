@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from scenarios import assign_metrics_ports, expand_env, expand_matrix, load_scenarios, plan_scenario
+
+
+def scenario(**overrides):
+    config = {'name': 'test', 'api_key': 'sk-test', 'workload': {'input_file': 'prompts.csv'},
+              'load': {'mode': 'batch', 'values': [1, 4]}}
+    config.update(overrides)
+    return config
+
+
+def test_plan_sweep_runs():
+    plan = plan_scenario(scenario(load={'mode': 'rate', 'values': [2, 4]}, warmup='30s', max_requests=100,
+                                  goodput_slo={'ttft': 500}), 'out/test')
+    assert plan['mode'] == 'rate'
+    assert [run['request_rate'] for run in plan['runs']] == [2.0, 4.0]
+    assert all(run['arrival_process'] == 'poisson' for run in plan['runs'])
+    kwargs = plan['test_kwargs']
+    assert (kwargs['warmup_requests'], kwargs['warmup_seconds']) == (0, 30.0)
+    assert kwargs['max_requests'] == 100
+    assert (kwargs['ttft_slo'], kwargs['tpot_slo']) == (500, None)
+
+
+def test_plan_generated_workload_goes_to_scenario_dir():
+    plan = plan_scenario(scenario(workload={'generate': {'count': 10}}), 'out/test')
+    assert plan['test_kwargs']['input_file'] == 'out/test/prompts.csv'
+
+
+def test_plan_routing_runs_per_policy():
+    endpoints = [{'base_url': 'http://a/v1', 'model': 'm'}, {'base_url': 'http://b/v1', 'model': 'm'}]
+    plan = plan_scenario(scenario(endpoints=endpoints, routing=['round_robin', 'power_of_two'],
+                                  load={'mode': 'concurrency', 'values': [8]}), 'out')
+    assert [(run['routing'], run['batch_size']) for run in plan['runs']] == [('round_robin', 8), ('power_of_two', 8)]
+    assert all(run['sliding_window'] for run in plan['runs'])
+
+
+@pytest.mark.parametrize('overrides, message', [
+    ({'load': {'mode': 'closed_loop', 'values': [1]}}, '负载模式不支持'),
+    ({'workload': {}}, 'input_file或generate'),
+    ({'load': {'mode': 'batch'}}, 'load.values'),
+    ({'routing': 'random'}, '路由策略不支持'),
+    ({'load': {'mode': 'slo_search', 'ttft_slo': 500}}, 'ttft_slo和tpot_slo'),
+    ({'load': {'mode': 'slo_search', 'ttft_slo': 500, 'tpot_slo': 50},
+      'endpoints': [{'base_url': 'http://a/v1', 'model': 'm'}],
+      'routing': ['round_robin', 'least_outstanding']}, '一个路由策略'),
+])
+def test_plan_validation(overrides, message):
+    with pytest.raises(ValueError, match=message):
+        plan_scenario(scenario(**overrides), 'out')
+
+
+def test_plan_requires_api_key():
+    config = scenario()
+    del config['api_key']
+    with pytest.raises(ValueError, match='api_key'):
+        plan_scenario(config, 'out')
+
+
+def test_slo_search_drops_max_requests():
+    plan = plan_scenario(scenario(max_requests=300, load={'mode': 'slo_search', 'ttft_slo': 500, 'tpot_slo': 50,
+                                                          'max_rate': 64}), 'out')
+    assert 'max_requests' not in plan['test_kwargs']
+    assert (plan['test_kwargs']['ttft_slo'], plan['test_kwargs']['tpot_slo']) == (500, 50)
+    assert plan['search'] == {'max_rate': 64}
+
+
+def test_assign_metrics_ports():
+    scenarios = [{'name': name} for name in 'abcd']
+    ports = {'a': 9400, 'b': 9401, 'c': 9400, 'd': None}
+    plans = {name: {'test_kwargs': {'metrics_port': port}} for name, port in ports.items()}
+    assign_metrics_ports(scenarios, plans)
+    assert [plans[name]['test_kwargs']['metrics_port'] for name in 'abcd'] == [9400, 9401, 9402, None]
+
+
+def test_expand_env(monkeypatch):
+    monkeypatch.setenv('BENCH_RATE', '8')
+    monkeypatch.delenv('BENCH_MISSING', raising=False)
+    assert expand_env({'rate': '${BENCH_RATE}', 'url': 'http://${BENCH_HOST:-localhost}:8000'}) == \
+        {'rate': 8, 'url': 'http://localhost:8000'}
+    with pytest.raises(ValueError, match='BENCH_MISSING'):
+        expand_env('${BENCH_MISSING}')
+
+
+def test_expand_matrix_names():
+    variants = expand_matrix(scenario(name='rate-{input_file}', matrix={
+        'workload.input_file': ['./input/short.csv', './input/long.csv']}))
+    assert [variant['name'] for variant in variants] == ['rate-short', 'rate-long']
+    assert variants[1]['workload']['input_file'] == './input/long.csv'
+
+
+def test_load_scenarios_merges_defaults(tmp_path):
+    path = tmp_path / 'scenarios.yaml'
+    path.write_text("""
+output_dir: out
+defaults: {api_key: sk-test, max_requests: 50, metrics_port: 9400}
+scenarios:
+  - name: sweep
+    workload: {input_file: prompts.csv}
+    load: {mode: concurrency, values: [1, 2]}
+  - name: search
+    depends_on: [sweep]
+    workload: {input_file: prompts.csv}
+    load: {mode: slo_search, ttft_slo: 500, tpot_slo: 50}
+""", encoding='utf-8')
+    settings, scenarios, plans = load_scenarios(str(path))
+    assert settings == {'output_dir': 'out', 'parallel': 1}
+    assert plans['sweep']['test_kwargs']['max_requests'] == 50
+    assert 'max_requests' not in plans['search']['test_kwargs']
+    assert plans['search']['output_dir'].endswith('search')
+
+
+def test_load_scenarios_rejects_unknown_dependency(tmp_path):
+    path = tmp_path / 'scenarios.yaml'
+    path.write_text("""
+defaults: {api_key: sk-test}
+scenarios:
+  - {name: a, depends_on: [b], workload: {input_file: p.csv}, load: {mode: batch, values: [1]}}
+""", encoding='utf-8')
+    with pytest.raises(ValueError, match='依赖的场景不存在'):
+        load_scenarios(str(path))
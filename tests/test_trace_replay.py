@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import pandas as pd
+import pytest
+
+from trace_replay import PromptSynthesizer, TraceReader
+
+tiktoken = pytest.importorskip('tiktoken')
+
+# GPT-2的预分词规则："空格+单词"各自成为一段
+PAT_STR = r"""'s|'t|'re|'ve|'m|'ll|'d| ?\p{L}+| ?\p{N}+| ?[^\s\p{L}\p{N}]+|\s+(?!\S)|\s+"""
+WORDS = ['cat', 'dog', 'house', 'tree', 'river', 'stone', 'light', 'cloud']
+
+
+@pytest.fixture(scope='module')
+def encoding():
+    """离线构造的小型BPE编码：单字节token加上各单词 (含前导空格) 的逐步合并"""
+    ranks = {bytes([byte]): byte for byte in range(256)}
+    for word in WORDS:
+        piece = (' ' + word).encode()
+        for end in range(2, len(piece) + 1):
+            ranks.setdefault(piece[:end], len(ranks))
+    return tiktoken.Encoding('test', pat_str=PAT_STR, mergeable_ranks=ranks, special_tokens={})
+
+
+@pytest.mark.parametrize('tokens', [1, 2, 17, 256, 1000])
+def test_prompt_has_exact_token_count(encoding, tokens):
+    synthesizer = PromptSynthesizer(encoding, seed=5)
+    assert len(encoding.encode(synthesizer.prompt(tokens, index=3))) == tokens
+
+
+def test_vocabulary_is_single_token_words(encoding):
+    synthesizer = PromptSynthesizer(encoding)
+    assert {' ' + word for word in WORDS} <= set(synthesizer.words)
+    assert all(len(encoding.encode(word)) == 1 for word in synthesizer.words)
+
+
+def test_prompts_are_deterministic_per_index(encoding):
+    synthesizer = PromptSynthesizer(encoding, seed=1)
+    assert synthesizer.prompt(50, index=7) == PromptSynthesizer(encoding, seed=1).prompt(50, index=7)
+    assert synthesizer.prompt(50, index=7) != synthesizer.prompt(50, index=8)
+    assert synthesizer.prompt(50, index=7) != PromptSynthesizer(encoding, seed=2).prompt(50, index=7)
+
+
+def test_trace_reader_relative_arrivals(tmp_path):
+    path = tmp_path / 'trace.csv'
+    pd.DataFrame({
+        'timestamp': ['2024-01-01 00:00:10.000', '2024-01-01 00:00:10.500', '2024-01-01 00:00:13.000'],
+        'input_length': [100, 200, 300],
+        'output_length': [10, None, 30],
+    }).to_csv(path, index=False)
+    reader = TraceReader(str(path), chunksize=2)
+    requests = [request for chunk in reader.chunks() for request in chunk]
+    assert reader.count() == 3
+    assert [request['arrival'] for request in requests] == [0.0, 0.5, 3.0]
+    assert [request['prompt_index'] for request in requests] == [0, 1, 2]
+    assert [request['input_tokens'] for request in requests] == [100, 200, 300]
+    assert 'max_tokens' not in requests[1]
+
+
+def test_trace_reader_requires_timestamp(tmp_path):
+    path = tmp_path / 'trace.csv'
+    pd.DataFrame({'input_tokens': [1]}).to_csv(path, index=False)
+    with pytest.raises(ValueError):
+        TraceReader(str(path))
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tokenizer Cache
+~~~~~~~~~~~~~~~~~~~~~~~~
+
+Loads client-side tokenizers once and keeps them in a local serialized form,
+so that later runs start without importing modelscope/transformers, without
+running the model's remote code and without network access.
+
+Serialized forms:
+    1. tokenizer.json - a Hugging Face fast tokenizer, loaded with the
+                        `tokenizers` library
+    2. tiktoken.json  - the BPE ranks, split pattern and special tokens of a
+                        tiktoken based tokenizer (e.g. Qwen), loaded with
+                        tiktoken
+
+The first load of a model name downloads it through modelscope and writes
+the serialized form to `~/.cache/llm-inference-testing/tokenizers` (the
+root can be changed with LLM_TOKENIZER_CACHE). A local directory that
+already contains a `tokenizer.json` is loaded directly. Unless
+TIKTOKEN_CACHE_DIR is set, the tiktoken encodings used by the performance
+tester are cached under the same root instead of the system temp directory.
+
+tiktoken, tokenizers and modelscope are imported only when a tokenizer is
+actually loaded, so importing this module costs nothing.
+
+Running this file fills the cache ahead of time, e.g. on a machine with
+network access before copying the cache to an offline test host.
+
+License: Apache License 2.0
+"""
+
+import argparse
+import base64
+import json
+import os
+import re
+import time
+import unicodedata
+from typing import Dict, List
+
+DEFAULT_TOKENIZER = 'qwen/Qwen-7B-Chat'
+# 每个进程中已加载的tokenizer，按名称复用
+_loaded: Dict[str, object] = {}
+
+
+def cache_root() -> str:
+    return os.path.expanduser(os.getenv('LLM_TOKENIZER_CACHE', '~/.cache/llm-inference-testing'))
+
+
+def configure_tiktoken_cache():
+    """tiktoken默认将下载的编码缓存在临时目录，改为缓存在cache_root下，重启后仍可离线使用"""
+    os.environ.setdefault('TIKTOKEN_CACHE_DIR', os.path.join(cache_root(), 'tiktoken'))
+
+
+def load_encoding(model: str):
+    """性能测试器计算token数使用的tiktoken编码，模型没有对应的编码时使用cl100k_base"""
+    import tiktoken
+    configure_tiktoken_cache()
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        print(f"Warning: No specific tokenizer found for {model}, using cl100k_base instead")
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def cache_path(name: str) -> str:
+    return os.path.join(cache_root(), 'tokenizers', re.sub(r'[^\w.-]+', '_', name))
+
+
+class FastTokenizer:
+    """基于tokenizers库的Hugging Face快速tokenizer"""
+
+    def __init__(self, path: str):
+        from tokenizers import Tokenizer
+        self.tokenizer = Tokenizer.from_file(path)
+
+    def encode(self, text: str) -> List[int]:
+        # 与transformers的encode一致，添加模型的特殊token (如BOS)
+        return self.tokenizer.encode(text).ids
+
+    def decode(self, tokens: List[int]) -> str:
+        return self.tokenizer.decode(tokens, skip_special_tokens=False)
+
+
+class TiktokenTokenizer:
+    """以tiktoken.Encoding实现的BPE tokenizer，如Qwen"""
+
+    def __init__(self, path: str):
+        import tiktoken
+        with open(path, encoding='utf-8') as file:
+            spec = json.load(file)
+        ranks = {}
+        with open(os.path.join(os.path.dirname(path), spec['ranks_file']), 'rb') as file:
+            for line in file:
+                if line.strip():
+                    token, rank = line.split()
+                    ranks[base64.b64decode(token)] = int(rank)
+        self.encoding = tiktoken.Encoding(spec['name'], pat_str=spec['pat_str'], mergeable_ranks=ranks,
+                                          special_tokens=spec['special_tokens'])
+        self.normalize = spec.get('normalize')
+
+    def encode(self, text: str) -> List[int]:
+        if self.normalize:
+            text = unicodedata.normalize(self.normalize, text)
+        return self.encoding.encode(text, allowed_special='all')
+
+    def decode(self, tokens: List[int]) -> str:
+        return self.encoding.decode(tokens)
+
+
+def _load_cached(directory: str):
+    """读取目录中的序列化tokenizer，没有时返回None"""
+    if os.path.exists(os.path.join(directory, 'tokenizer.json')):
+        return FastTokenizer(os.path.join(directory, 'tokenizer.json'))
+    if os.path.exists(os.path.join(directory, 'tiktoken.json')):
+        return TiktokenTokenizer(os.path.join(directory, 'tiktoken.json'))
+    return None
+
+
+def serialize_tokenizer(tokenizer, directory: str) -> bool:
+    """将transformers/modelscope的tokenizer序列化到目录，不支持的tokenizer返回False"""
+    os.makedirs(directory, exist_ok=True)
+    if getattr(tokenizer, 'is_fast', False):
+        tokenizer.backend_tokenizer.save(os.path.join(directory, 'tokenizer.json'))
+        return True
+
+    import tiktoken
+    encoding = getattr(tokenizer, 'tokenizer', None)
+    if not isinstance(encoding, tiktoken.Encoding):
+        return False
+    # 先写入词表，再写入描述文件，中断时不会留下不完整的缓存
+    with open(os.path.join(directory, 'tokenizer.tiktoken'), 'wb') as file:
+        for token, rank in sorted(encoding._mergeable_ranks.items(), key=lambda item: item[1]):
+            file.write(base64.b64encode(token) + b' ' + str(rank).encode() + b'\n')
+    spec = {
+        'name': encoding.name,
+        'pat_str': encoding._pat_str,
+        'special_tokens': encoding._special_tokens,
+        'ranks_file': 'tokenizer.tiktoken',
+        # QWenTokenizer在分词前对文本做NFC规范化
+        'normalize': 'NFC' if type(tokenizer).__name__ == 'QWenTokenizer' else None,
+    }
+    temp_path = os.path.join(directory, 'tiktoken.json.tmp')
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(spec, file, ensure_ascii=False)
+    os.replace(temp_path, os.path.join(directory, 'tiktoken.json'))
+    return True
+
+
+def load_tokenizer(name: str = DEFAULT_TOKENIZER):
+    """加载tokenizer：优先读取本地目录或缓存中的序列化形式，都没有时通过modelscope下载并写入缓存
+
+    返回的对象提供encode(text)和decode(tokens)
+    """
+    if name in _loaded:
+        return _loaded[name]
+
+    tokenizer = None
+    if os.path.isdir(name):
+        tokenizer = _load_cached(name)
+    directory = cache_path(name)
+    if tokenizer is None:
+        tokenizer = _load_cached(directory)
+    if tokenizer is None:
+        # modelscope及模型的远程代码导入耗时数秒，只在首次加载时使用
+        from modelscope import AutoTokenizer
+        start = time.perf_counter()
+        original = AutoTokenizer.from_pretrained(name, trust_remote_code=True)
+        if serialize_tokenizer(original, directory):
+            tokenizer = _load_cached(directory)
+            print(f"已缓存tokenizer {name} 至 {directory} (加载耗时 {time.perf_counter() - start:.1f}s)")
+        else:
+            print(f"Warning: tokenizer {name} 不支持序列化，每次运行都需要重新加载")
+            tokenizer = original
+
+    _loaded[name] = tokenizer
+    return tokenizer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预先下载并缓存tokenizer，之后可离线使用")
+    parser.add_argument('names', nargs='*', default=[DEFAULT_TOKENIZER], help="模型名称或本地目录")
+    parser.add_argument('--encodings', default='cl100k_base', help="同时缓存的tiktoken编码，逗号分隔")
+    args = parser.parse_args()
+
+    for name in args.names:
+        start = time.perf_counter()
+        load_tokenizer(name)
+        print(f"{name}: {cache_path(name)} (加载耗时 {time.perf_counter() - start:.3f}s)")
+    import tiktoken
+    configure_tiktoken_cache()
+    for encoding in filter(None, args.encodings.split(',')):
+        tiktoken.get_encoding(encoding.strip())
+        print(f"{encoding}: {os.environ['TIKTOKEN_CACHE_DIR']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM Trace Replay
+~~~~~~~~~~~~~~~~~~~~~~~~
+
+Replay of timestamped production request traces.
+
+A trace is a CSV or JSONL file with one request per line: an arrival time
+and the input/output token counts, plus optionally the prompt text. The
+trace is read lazily in chunks, so traces larger than memory can be
+replayed. Requests without prompt text get a synthesized prompt with the
+traced number of input tokens, and the traced output length is sent as
+`max_tokens`.
+
+License: Apache License 2.0
+"""
+
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional
+
+import numpy as np
+
+# 读取轨迹时才导入pandas
+if TYPE_CHECKING:
+    import pandas as pd
+
+from result_store import iter_result_chunks
+
+# 各字段可接受的列名，按顺序取第一个存在的列
+TIMESTAMP_COLUMNS = ('timestamp', 'arrival_time', 'time', 'created')
+INPUT_COLUMNS = ('input_tokens', 'input_length', 'prompt_tokens')
+OUTPUT_COLUMNS = ('output_tokens', 'output_length', 'completion_tokens')
+PROMPT_COLUMNS = ('prompt',)
+
+
+def _read_header(path: str) -> List[str]:
+    import pandas as pd
+    if path.endswith('.jsonl'):
+        chunk = next(iter_result_chunks(path, chunksize=1), None)
+        return list(chunk.columns) if chunk is not None else []
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def _find_column(columns: List[str], candidates) -> Optional[str]:
+    for candidate in candidates:
+        if candidate in columns:
+            return candidate
+    return None
+
+
+class TraceReader:
+    """分块读取请求轨迹，将每行转换为带到达时刻 (相对第一个请求的秒数) 的请求"""
+
+    def __init__(self, path: str, chunksize: int = 10000):
+        self.path = path
+        self.chunksize = chunksize
+        columns = _read_header(path)
+        self.timestamp_column = _find_column(columns, TIMESTAMP_COLUMNS)
+        self.input_column = _find_column(columns, INPUT_COLUMNS)
+        self.output_column = _find_column(columns, OUTPUT_COLUMNS)
+        self.prompt_column = _find_column(columns, PROMPT_COLUMNS)
+        if self.timestamp_column is None:
+            raise ValueError(f"轨迹文件缺少时间戳列，可选列名: {', '.join(TIMESTAMP_COLUMNS)}")
+        if self.prompt_column is None and self.input_column is None:
+            raise ValueError(f"轨迹文件需要prompt列或输入长度列，可选列名: {', '.join(INPUT_COLUMNS)}")
+
+    def count(self) -> int:
+        """统计轨迹中的请求数 (逐块扫描，不加载整个文件)"""
+        lines = 0
+        with open(self.path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                lines += block.count(b'\n')
+        # CSV第一行为表头
+        return lines if self.path.endswith('.jsonl') else max(0, lines - 1)
+
+    @staticmethod
+    def _to_seconds(values: 'pd.Series') -> np.ndarray:
+        """数值时间戳视为秒，其余按日期时间解析"""
+        import pandas as pd
+        if pd.api.types.is_numeric_dtype(values):
+            return values.to_numpy(dtype=float)
+        return pd.to_datetime(values).to_numpy(dtype='datetime64[ns]').astype(np.int64) / 1e9
+
+    def chunks(self) -> Iterator[List[Dict]]:
+        """逐块返回请求列表，prompt_index为请求在轨迹中的行号"""
+        import pandas as pd
+        columns = [column for column in (self.timestamp_column, self.input_column,
+                                         self.output_column, self.prompt_column) if column]
+        start = None
+        index = 0
+        for chunk in iter_result_chunks(self.path, chunksize=self.chunksize, columns=columns):
+            arrivals = self._to_seconds(chunk[self.timestamp_column])
+            if start is None and len(arrivals):
+                start = arrivals[0]
+            arrivals = arrivals - start
+
+            requests = []
+            for row, arrival in zip(chunk.itertuples(index=False), arrivals):
+                row = row._asdict()
+                request = {'prompt_index': index, 'arrival': float(arrival)}
+                prompt = row.get(self.prompt_column) if self.prompt_column else None
+                if isinstance(prompt, str) and prompt:
+                    request['prompt'] = prompt
+                if self.input_column and pd.notna(row[self.input_column]):
+                    request['input_tokens'] = int(row[self.input_column])
+                if self.output_column and pd.notna(row[self.output_column]):
+                    request['max_tokens'] = int(row[self.output_column])
+                requests.append(request)
+                index += 1
+            yield requests
+
+
+class PromptSynthesizer:
+    """按指定token数合成随机提示词
+
+    从tokenizer词表中挑选编码后恰好为1个token的“空格+单词”，
+    随机拼接n个这样的单词即得到恰好n个token的文本；
+    内容随机，不会意外命中服务端的前缀缓存
+    """
+
+    def __init__(self, encoding, seed: int = 0, vocab_size: int = 2000, scan_limit: int = 50000):
+        self.encoding = encoding
+        self.seed = seed
+        self.words = self._single_token_words(vocab_size, scan_limit)
+        if len(self.words) == 0:
+            raise ValueError("无法从tokenizer词表中找到可用于合成提示词的单词")
+
+    def _single_token_words(self, vocab_size: int, scan_limit: int) -> np.ndarray:
+        words = []
+        for token in range(min(scan_limit, getattr(self.encoding, 'n_vocab', scan_limit))):
+            try:
+                word = self.encoding.decode([token])
+            except Exception:
+                continue
+            if len(word) > 2 and word[0] == ' ' and word[1:].isascii() and word[1:].isalpha():
+                if len(self.encoding.encode(word)) == 1:
+                    words.append(word)
+                    if len(words) >= vocab_size:
+                        break
+        return np.array(words, dtype=object)
+
+    def prompt(self, tokens: int, index: int = 0) -> str:
+        """生成恰好tokens个token的提示词；相同的seed和index总是生成相同的文本"""
+        rng = np.random.default_rng([self.seed, index])
+        return ''.join(self.words[rng.integers(len(self.words), size=max(1, tokens))])
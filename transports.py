@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM Streaming Transports
+~~~~~~~~~~~~~~~~~~~~~~~~
+
+Client transports used by the performance tester to stream chat completions.
+
+Transports:
+    1. openai - the official AsyncOpenAI SDK
+    2. http   - a pooled aiohttp session that parses SSE `data:` lines
+                directly, without building SDK models for every chunk
+
+Both transports yield `(content, usage)` tuples, where `content` is the
+delta text of the chunk (or None) and `usage` is the usage dict carried by
+the final chunk when `stream_options.include_usage` is requested.
+
+When a `phases` dict is passed, the transport records the client clock at
+each request phase it can observe: `first_byte` (response headers received)
+for both transports, plus `connected` and `sent` for the http transport,
+which hooks the aiohttp connection pool through a TraceConfig.
+
+`connect_timeout` bounds connection establishment in both transports; the
+later phases (first token, inter-token stall, total) are enforced by the
+caller, which cancels the request and closes the stream. The SDK's own
+retries are disabled so that every 429/5xx reaches the caller, and
+`classify_error` maps the exceptions of both transports onto one error
+taxonomy (ERROR_TYPES).
+
+The openai SDK takes most of a second to import, so it is only imported
+when an OpenAITransport is created; http-only runs and their worker
+processes never load it.
+
+Running this file benchmarks the client-side CPU cost per chunk of both
+transports against the same endpoint.
+
+License: Apache License 2.0
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from client_timing import clock
+
+TRANSPORTS = ('openai', 'http')
+# 请求各阶段的超时：建立连接、首个token、token间停顿、总时长
+TIMEOUT_PHASES = ('connect', 'ttft', 'stall', 'total')
+# 失败请求的错误类型
+ERROR_TYPES = ('rate_limited', 'server_error', 'client_error', 'connect_error', 'timeout', 'disconnect',
+               'empty_response', 'other')
+# openai SDK在流式读取过程中不包装底层HTTP库 (httpx) 的异常，按类名识别
+_STREAM_TIMEOUT_ERRORS = ('ReadTimeout', 'ConnectTimeout', 'WriteTimeout', 'PoolTimeout')
+_STREAM_NETWORK_ERRORS = ('RemoteProtocolError', 'ReadError', 'WriteError', 'ConnectError', 'CloseError')
+
+StreamEvent = Tuple[Optional[str], Optional[Dict]]
+
+
+class HttpStatusError(Exception):
+    """服务端返回非200状态码"""
+
+    def __init__(self, status: int, body: str):
+        super().__init__(f"HTTP {status}: {body[:500]}")
+        self.status = status
+        self.body = body
+
+
+class RequestTimeoutError(Exception):
+    """请求在某个阶段超时，已由客户端取消"""
+
+    def __init__(self, phase: str, timeout: float):
+        super().__init__(f"{phase} timeout ({timeout:g}s)")
+        self.phase = phase
+        self.timeout = timeout
+
+
+class EmptyResponseError(Exception):
+    """流式响应正常结束，但没有收到任何输出内容"""
+
+    def __init__(self, usage: Dict = None):
+        completion_tokens = (usage or {}).get('completion_tokens')
+        detail = f" (usage.completion_tokens={completion_tokens})" if completion_tokens is not None else ""
+        super().__init__(f"stream ended without output content{detail}")
+        self.usage = usage
+
+
+def classify_error(error: BaseException, phases: Dict = None) -> str:
+    """将请求失败的异常归入ERROR_TYPES之一
+
+    phases中已有first_byte (已收到响应头) 时，连接层面的异常视为流式输出中途断开
+    """
+    status = getattr(error, 'status', None)
+    if status is None:
+        # openai SDK的APIStatusError
+        status = getattr(error, 'status_code', None)
+    if isinstance(status, int):
+        if status == 429:
+            return 'rate_limited'
+        return 'server_error' if status >= 500 else 'client_error'
+    name = type(error).__name__
+    # 超时异常同时也是连接异常的子类，需要先判断
+    timeout_errors = (RequestTimeoutError, asyncio.TimeoutError)
+    network_errors = (aiohttp.ClientError, OSError)
+    # openai未被导入时不可能产生SDK的异常
+    openai = sys.modules.get('openai')
+    if openai is not None:
+        timeout_errors += (openai.APITimeoutError,)
+        network_errors += (openai.APIConnectionError,)
+    if isinstance(error, EmptyResponseError):
+        return 'empty_response'
+    if isinstance(error, timeout_errors) or name in _STREAM_TIMEOUT_ERRORS:
+        return 'timeout'
+    if isinstance(error, network_errors) or name in _STREAM_NETWORK_ERRORS:
+        return 'disconnect' if phases and 'first_byte' in phases else 'connect_error'
+    return 'other'
+
+
+class OpenAITransport:
+    """基于AsyncOpenAI SDK的传输层"""
+
+    name = 'openai'
+
+    def __init__(self, api_key: str, base_url: str = None, connect_timeout: float = None):
+        from openai import AsyncOpenAI, Timeout
+        client_params = {
+            "api_key": api_key,
+            # SDK默认对429和5xx自动重试，会掩盖服务端的错误并拉长测得的延迟
+            "max_retries": 0,
+        }
+        if base_url:
+            client_params["base_url"] = base_url
+        if connect_timeout is not None:
+            # 读取超时保持SDK的默认值，其余阶段的超时由调用方控制
+            client_params["timeout"] = Timeout(600.0, connect=connect_timeout)
+        self.client = AsyncOpenAI(**client_params)
+
+    async def stream_chat(self, model: str, messages: List[Dict], phases: Dict = None,
+                          **params) -> AsyncIterator[StreamEvent]:
+        response = await self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            stream=True,
+            **params
+        )
+        # SDK在收到响应头后返回流对象
+        if phases is not None:
+            phases['first_byte'] = clock()
+        try:
+            async for chunk in response:
+                content = chunk.choices[0].delta.content if chunk.choices else None
+                usage = chunk.usage.model_dump() if chunk.usage is not None else None
+                yield content, usage
+        finally:
+            # 提前结束 (取消或超时) 时关闭响应，释放连接
+            await response.close()
+
+    async def close(self):
+        await self.client.close()
+
+
+class HttpTransport:
+    """基于aiohttp连接池的轻量传输层，直接解析SSE数据行"""
+
+    name = 'http'
+
+    def __init__(self,
+                 api_key: str,
+                 base_url: str,
+                 max_connections: int = 1000,
+                 keepalive_timeout: float = 60.0,
+                 dns_cache_ttl: int = 300,
+                 read_bufsize: int = 2 ** 18,
+                 connect_timeout: float = None):
+        if not base_url:
+            raise ValueError("http传输层必须指定base_url")
+        self.url = base_url.rstrip('/') + '/chat/completions'
+        self.headers = {
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/json',
+            'Accept': 'text/event-stream',
+        }
+        # HTTP/1.1下每个连接同一时刻只承载一个流，max_connections即为在途流数上限
+        self.max_connections = max_connections
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.read_bufsize = read_bufsize
+        # 只限制建立TCP连接的时间，不包括在连接池中等待空闲连接的时间
+        self.connect_timeout = connect_timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @staticmethod
+    def _trace_config() -> aiohttp.TraceConfig:
+        """记录连接建立、请求发送完成和收到响应头的时刻，写入请求的phases"""
+
+        def mark(phase: str, **extra):
+            async def callback(session, context, params):
+                phases = context.trace_request_ctx
+                if phases is not None:
+                    phases[phase] = clock()
+                    phases.update(extra)
+            return callback
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(mark('connected', reused=False))
+        trace_config.on_connection_reuseconn.append(mark('connected', reused=True))
+        # 请求体可能分多个chunk发送，以最后一个为准
+        trace_config.on_request_headers_sent.append(mark('sent'))
+        trace_config.on_request_chunk_sent.append(mark('sent'))
+        trace_config.on_request_end.append(mark('first_byte'))
+        return trace_config
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # session必须在事件循环内创建，因此延迟到第一次请求时初始化
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_connections,
+                keepalive_timeout=self.keepalive_timeout,
+                use_dns_cache=True,
+                ttl_dns_cache=self.dns_cache_ttl,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=self.headers,
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=self.connect_timeout),
+                read_bufsize=self.read_bufsize,
+                trace_configs=[self._trace_config()],
+            )
+        return self._session
+
+    async def stream_chat(self, model: str, messages: List[Dict], phases: Dict = None,
+                          **params) -> AsyncIterator[StreamEvent]:
+        payload = {
+            'model': model,
+            'messages': messages,
+            'stream': True,
+            **params
+        }
+        async with self._get_session().post(self.url, json=payload, trace_request_ctx=phases) as response:
+            if response.status != 200:
+                raise HttpStatusError(response.status, await response.text())
+
+            async for line in response.content:
+                if not line.startswith(b'data:'):
+                    continue
+                data = line[5:].strip()
+                if data == b'[DONE]':
+                    break
+
+                event = json.loads(data)
+                choices = event.get('choices')
+                content = choices[0].get('delta', {}).get('content') if choices else None
+                yield content, event.get('usage')
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+def create_transport(name: str, api_key: str, base_url: str = None, http_options: Dict = None,
+                     connect_timeout: float = None):
+    """按名称创建传输层，http_options为HttpTransport的连接池参数，connect_timeout为建立连接的超时 (秒)"""
+    if name == 'openai':
+        return OpenAITransport(api_key=api_key, base_url=base_url, connect_timeout=connect_timeout)
+    if name == 'http':
+        return HttpTransport(api_key=api_key, base_url=base_url, connect_timeout=connect_timeout,
+                             **(http_options or {}))
+    raise ValueError(f"不支持的传输层: {name}，可选: {', '.join(TRANSPORTS)}")
+
+
+async def measure_client_overhead(transport, model: str, prompt: str, requests: int, concurrency: int) -> Dict:
+    """以给定并发发送requests个流式请求，统计客户端每个chunk消耗的CPU时间"""
+    semaphore = asyncio.Semaphore(concurrency)
+    chunk_count = 0
+
+    async def one_request():
+        nonlocal chunk_count
+        async with semaphore:
+            async for _ in transport.stream_chat(model, [{"role": "user", "content": prompt}]):
+                chunk_count += 1
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(one_request() for _ in range(requests)))
+    wall_time = time.perf_counter() - wall_start
+    cpu_time = time.process_time() - cpu_start
+
+    return {
+        'transport': transport.name,
+        'requests': requests,
+        'chunks': chunk_count,
+        'wall_time_s': round(wall_time, 3),
+        'cpu_time_s': round(cpu_time, 3),
+        'cpu_us_per_chunk': round(cpu_time / chunk_count * 1e6, 2) if chunk_count else None,
+        'chunks_per_s': round(chunk_count / wall_time, 1) if wall_time > 0 else None,
+    }
+
+
+async def benchmark_transports(api_key: str, base_url: str, model: str,
+                               prompt: str, requests: int, concurrency: int) -> List[Dict]:
+    """对比各传输层的客户端开销"""
+    results = []
+    for name in TRANSPORTS:
+        transport = create_transport(name, api_key=api_key, base_url=base_url)
+        try:
+            # 预热：建立连接、完成惰性初始化
+            await measure_client_overhead(transport, model, prompt, min(concurrency, requests), concurrency)
+            results.append(await measure_client_overhead(transport, model, prompt, requests, concurrency))
+        finally:
+            await transport.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比openai SDK与原生HTTP传输层的客户端开销")
+    parser.add_argument('--api-key', default='sk-123456')
+    parser.add_argument('--base-url', required=True)
+    parser.add_argument('--model', required=True)
+    parser.add_argument('--prompt', default='请写一篇关于人工智能的详细技术报告')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=50)
+    args = parser.parse_args()
+
+    results = asyncio.run(benchmark_transports(
+        args.api_key, args.base_url, args.model, args.prompt, args.requests, args.concurrency
+    ))
+
+    print("\n客户端开销对比：")
+    for result in results:
+        print(", ".join(f"{key}: {value}" for key, value in result.items()))
+
+
+if __name__ == "__main__":
+    main()